@@ -0,0 +1,164 @@
+import hashlib
+from datetime import datetime
+from flask import Blueprint, Response, abort, current_app, json, request
+from models import Venue, Artist
+from pagination import paginate
+from queries import (
+    venue_list,
+    artist_list,
+    venue_detail,
+    artist_detail,
+    search_hits,
+    search_page,
+    shows_feed,
+    venue_list_version,
+    artist_list_version,
+    shows_feed_version,
+    venue_page_version,
+    artist_page_version,
+    search_version
+)
+
+# ----------------------------------------------------------------------------#
+# Read-only JSON API.
+#
+# Every response is built from column projections and carries a strong ETag
+# hashed from a version aggregate over the rows it is built from (see "Page
+# versions" in queries.py), so a client that sends the ETag back in
+# If-None-Match gets a 304 after one aggregate query (searches also run the
+# match), before the rows are fetched or any JSON is produced. Listings
+# are keyset-paginated like the HTML pages (per_page, after, before).
+# Detail responses hold all upcoming shows but only the latest
+# PAST_SHOWS_LIMIT past ones, as the detail pages show them.
+# ----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+def version_etag(*parts):
+    """Hash version rows, and any other values the body depends on, into an
+    ETag."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _json(data, status=200):
+    # jsonify pretty-prints in debug mode; the API is always compact.
+    return Response(json.dumps(data, separators=(',', ':')), status=status,
+                    mimetype='application/json')
+
+
+def conditional(etag, build):
+    """Answer 304 if the client already has ``etag``, otherwise the JSON
+    produced by ``build()``."""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = _json(build())
+    response.set_etag(etag)
+    return response
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def record(row):
+    return {key: _value(value) for key, value in row._mapping.items()}
+
+
+def listing_body(page):
+    return {
+        'data': [record(row) for row in page],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    }
+
+
+def search_body(count, page):
+    return {
+        'count': count,
+        'data': page.items,
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    }
+
+
+def detail_body(entity, upcoming, past):
+    data = record(entity)
+    data['upcoming_shows'] = [record(show) for show in upcoming]
+    data['past_shows'] = [record(show) for show in past]
+    return data
+
+
+def _page_response(version, listing):
+    # The window's version covers the extra row fetched past the page, so
+    # it also fixes the cursors in the body.
+    return conditional(version_etag(tuple(paginate(version))),
+                       lambda: listing_body(paginate(listing)))
+
+
+@api.route('/venues')
+def venues():
+    return _page_response(venue_list_version, venue_list)
+
+
+def _search_response(model):
+    count, page = paginate(search_hits, model,
+                           request.args.get('search_term', ''))
+    ids = [hit.id for hit in page.items]
+    etag = version_etag(count, ids, page.next_cursor, page.prev_cursor,
+                        tuple(search_version(model, ids)))
+    return conditional(etag,
+                       lambda: search_body(count, search_page(model, page)))
+
+
+@api.route('/venues/search')
+def search_venues():
+    return _search_response(Venue)
+
+
+def _detail_response(page_version, detail, id):
+    now = datetime.now()
+
+    def build():
+        entity, upcoming, past = detail(
+            id, now, current_app.config['PAST_SHOWS_LIMIT'])
+        if entity is None:
+            abort(404)
+        return detail_body(entity, upcoming, past)
+
+    version = page_version(id, now)
+    if version is None:
+        abort(404)
+    return conditional(version_etag(tuple(version)), build)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _detail_response(venue_page_version, venue_detail, venue_id)
+
+
+@api.route('/artists')
+def artists():
+    return _page_response(artist_list_version, artist_list)
+
+
+@api.route('/artists/search')
+def search_artists():
+    return _search_response(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _detail_response(artist_page_version, artist_detail, artist_id)
+
+
+@api.route('/shows')
+def shows():
+    return _page_response(shows_feed_version, shows_feed)
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def error(error):
+    return _json({'error': error.description}, error.code)
@@ -1,151 +1,236 @@
 # ----------------------------------------------------------------------------#
 # Imports
 # ----------------------------------------------------------------------------#
-import dateutil.parser
-import babel
+import os
 import sys
 from datetime import datetime
 from flask import (
+    Blueprint,
     Flask,
+    abort,
+    current_app,
     render_template,
     request,
     flash,
     redirect,
-    url_for
+    url_for,
+    Response,
+    stream_with_context
 )
-from flask_moment import Moment
 import logging
 from logging import Formatter, FileHandler
-from flask_migrate import Migrate
-from forms import (
-    VenueForm,
-    ArtistForm,
-    ShowForm
-)
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
+from enums import Genres, States
+from geo import geocode
 from models import db, Venue, Artist, Show
+from pagination import InvalidCursor, paginate
+from schedule import check_bookings
+from filters import format_datetime, format_datetimes
+from cache import page_cache, venue_key, artist_key
+from jobs import queue
+from metrics import Metrics
+from templating import TemplateCache
+from freshness import conditional_page
+from api import api
+import assets
+# Imported for the session hooks that keep the show counters current.
+import counters  # noqa: F401
+# Imported for the session hooks that keep suggested matches current.
+import matching  # noqa: F401
+import export
+from queries import (
+    venue_directory,
+    artist_directory,
+    venue_facets,
+    artist_facets,
+    venue_search,
+    artist_search,
+    venues_near,
+    shows_feed,
+    venue_directory_version,
+    artist_directory_version,
+    shows_feed_version,
+    venue_page_version,
+    artist_page_version,
+    venue_matches,
+    artist_matches,
+    venue_shows,
+    artist_shows,
+    venue_past_shows,
+    artist_past_shows
+)
 
 # ----------------------------------------------------------------------------#
 # App Config.
+#
+# create_app() only builds objects: it opens no database connection and
+# starts no thread, so a gunicorn master can preload it and fork workers
+# (see gunicorn.conf.py). Forms, Flask-Migrate and the CLI commands are
+# only imported where they are used.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-app.config.from_object('config')
-moment = Moment(app)
-db.init_app(app)
-migrate = Migrate(app, db)
-csrf = CSRFProtect(app)
-
-# ----------------------------------------------------------------------------#
-# Filters.
-# ----------------------------------------------------------------------------#
-
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+csrf = CSRFProtect()
+metrics = Metrics()
+main = Blueprint('main', __name__)
+
+
+def create_app(config='config'):
+    """Build the app from ``config``, an import path or object as taken by
+    ``app.config.from_object``."""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    csrf.init_app(app)
+    page_cache.init_app(app)
+    queue.init_app(app)
+    metrics.init_app(app)
+    assets.Assets(app)
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    app.jinja_env.filters['datetime'] = format_datetime
+    # Compiling needs every filter, so this comes after them.
+    TemplateCache(app)
+
+    # Set by the flask command, which imports every command plugin
+    # (Flask-Migrate's `db` among them) anyway.
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        import commands
+        Migrate(app, db)
+        commands.init_app(app)
+
+    if not app.debug and app.config['ERROR_LOG']:
+        file_handler = FileHandler(app.config['ERROR_LOG'], delay=True)
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s'
+                + '[in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+    return app
 
 
-app.jinja_env.filters['datetime'] = format_datetime
-
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
+
+def directory_filters():
+    """The genre mask and state selected by ``?genre=...&state=...``,
+    answering 400 for an unknown genre."""
+    try:
+        genre_mask = Genres.mask(request.args.getlist('genre'))
+    except ValueError:
+        abort(400)
+    return genre_mask, request.args.get('state') or None
+
 #  Venues
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues')
+@main.route('/venues')
 def venues():
-    locals = []
-    venues = Venue.query.all()
-
-    places = Venue.query.distinct(Venue.city, Venue.state).all()
-
-    for place in places:
-        locals.append({
-            'city': place.city,
-            'state': place.state,
-            'venues': [{
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': len([show for show in venue.shows if
-                                          show.start_time > datetime.now()])
-            } for venue in venues if
-                venue.city == place.city and venue.state == place.state]
-        })
-    return render_template('pages/venues.html', areas=locals)
-
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    search_term = request.form.get('search_term', '')
+    genre_mask, state = directory_filters()
+    facets = venue_facets(genre_mask, state)
+
+    def render():
+        page = paginate(venue_directory, genre_mask, state)
+        return render_template('pages/venues.html', areas=page.items,
+                               page=page, facets=facets)
+
+    version = paginate(venue_directory_version, genre_mask, state)
+    return conditional_page(tuple(version) + facets.version, render)
 
-    venues = Venue.query.filter(
-             Venue.name.like('%' + search_term + '%')).all()
 
-    venue_data = []
+@main.route('/venues/search', methods=['GET', 'POST'])
+def search_venues():
+    search_term = request.values.get('search_term', '')
 
-    for venue in venues:
-        venue_data.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len([show for show in venue.shows if
-                                       show.start_time > datetime.now()])
-        })
+    count, page = paginate(venue_search, search_term)
 
     search = {
-        "count": len(venues),
-        "data": venue_data
+        "count": count,
+        "data": page.items
     }
     return render_template('pages/search_venues.html', results=search,
-                           search_term=request.form.get('search_term', ''))
-
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    venue_data = []
-
-    venue = Venue.query.filter_by(id=venue_id).first_or_404()
-    shows = db.session.query(Show, Artist, Venue).join(Artist).join(Venue). \
-        filter(
-        Show.venue_id == venue_id,
-        Show.artist_id == Artist.id
-    ). \
-        all()
-
-    past_shows = []
-    upcoming_shows = []
-
-    for show in shows:
-        temp_show = {
-            'artist_id': show.Artist.id,
-            'artist_name': show.Artist.name,
-            'artist_image_link': show.Artist.image_link,
-            'start_time': show.Show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        if show.Show.start_time <= datetime.now():
-            past_shows.append(temp_show)
-        else:
-            upcoming_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(venue)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
+                           search_term=search_term, page=page)
+
+
+def near_origin():
+    """``(label, (latitude, longitude))`` of the place asked for by
+    ?artist_id=, ?city=&state= or ?lat=&lng=. The point is None when the
+    place has no known location and both are None when none was asked
+    for."""
+    args = request.args
+    if 'artist_id' in args:
+        artist = db.session.query(
+            Artist.name, Artist.latitude, Artist.longitude
+        ).filter(Artist.id == args.get('artist_id', type=int)).first()
+        if artist is None:
+            abort(404)
+        point = None
+        if artist.latitude is not None:
+            point = (artist.latitude, artist.longitude)
+        return artist.name, point
+    if args.get('city'):
+        city, state = args['city'], args.get('state', '')
+        return '%s, %s' % (city, state), geocode(city, state)
+    if 'lat' in args or 'lng' in args:
+        latitude = args.get('lat', type=float)
+        longitude = args.get('lng', type=float)
+        if latitude is None or longitude is None \
+                or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            abort(400)
+        return '%.4f, %.4f' % (latitude, longitude), (latitude, longitude)
+    return None, None
+
+
+@main.route('/venues/near')
+def near_venues():
+    config = current_app.config
+    radius = request.args.get('radius', config['NEAR_RADIUS_KM'], type=float)
+    radius = max(1, min(radius, config['MAX_NEAR_RADIUS_KM']))
+    limit = request.args.get('per_page', config['PER_PAGE'], type=int)
+    limit = max(1, min(limit, config['MAX_PER_PAGE']))
+
+    label, origin = near_origin()
+    count, venues = 0, []
+    if origin is not None:
+        count, venues = venues_near(origin[0], origin[1], radius, limit)
+    return render_template('pages/venues_near.html', label=label,
+                           origin=origin, radius=radius, count=count,
+                           venues=venues,
+                           states=[state.value for state in States],
+                           max_radius=config['MAX_NEAR_RADIUS_KM'])
+
+
+def show_tiles(shows, other):
+    """Template dicts for show rows on a venue (``other='artist'``) or
+    artist (``other='venue'``) page."""
+    start_times = format_datetimes([show.start_time for show in shows],
+                                   'full')
+    fields = (other + '_id', other + '_name', other + '_image_link')
+    return [dict({field: getattr(show, field) for field in fields},
+                 start_time=start_time)
+            for show, start_time in zip(shows, start_times)]
+
+
+def build_venue_page(venue_id, now):
+    """Build the show_venue context as of ``now`` and the time at which it
+    next goes stale on its own (when its earliest upcoming show starts)."""
+    venue = Venue.query.options(raiseload(Venue.shows)) \
+        .filter_by(id=venue_id).first_or_404()
+    upcoming, past, past_count = venue_shows(
+        venue_id, now, current_app.config['PAST_SHOWS_LIMIT'])
 
     venue_data = {
         'id': venue.id,
@@ -159,25 +244,63 @@ def show_venue(venue_id):
         'facebook_link': venue.facebook_link,
         'seeking_talent': venue.seeking_talent,
         'seeking_description': venue.seeking_description,
-        'image_link': venue.image_link
+        'image_link': venue.image_link,
+        'past_shows': show_tiles(past, 'artist'),
+        'past_shows_cursor': past.next_cursor,
+        'upcoming_shows': show_tiles(upcoming, 'artist'),
+        'past_shows_count': past_count,
+        'upcoming_shows_count': len(upcoming)
     }
+    return venue_data, upcoming[0].start_time if upcoming else None
+
+
+@main.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    now = datetime.now()
 
-    venue_data.update(data)
-    return render_template('pages/show_venue.html',
-                           venue=venue_data)
+    # Suggestions change without the venue or its shows changing.
+    matches = venue_matches(venue_id)
+
+    def render():
+        venue_data = page_cache.get_or_build(
+            venue_key(venue_id), lambda: build_venue_page(venue_id, now))
+        return render_template('pages/show_venue.html',
+                               venue=venue_data, matches=matches)
+
+    version = venue_page_version(venue_id, now)
+    if version is not None:
+        version = tuple(version) + tuple(matches)
+    return conditional_page(version, render)
+
+
+@main.route('/venues/<int:venue_id>/past_shows')
+def venue_past_shows_batch(venue_id):
+    try:
+        page = venue_past_shows(venue_id, datetime.now(),
+                                current_app.config['PAST_SHOWS_LIMIT'],
+                                request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
+    return render_template('pages/past_shows.html',
+                           shows=show_tiles(page, 'artist'), other='artist',
+                           endpoint='main.venue_past_shows_batch',
+                           cursor=page.next_cursor,
+                           url_args={'venue_id': venue_id})
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
+    from forms import VenueForm
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
+    from forms import VenueForm
     form = VenueForm(request.form, meta={'csrf': True})
     if form.validate():
         try:
@@ -204,104 +327,73 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     try:
-        venue = Venue.query.get(venue_id)
+        # The cascade deletes each show through the ORM.
+        venue = Venue.query.options(selectinload(Venue.shows)) \
+            .get(venue_id)
+        name = venue.name
         db.session.delete(venue)
         db.session.commit()
-        flash('Venue ' + Venue.query.get(venue_id) +
-              ' was successfully deleted.')
-    except Venue:
+        flash('Venue ' + name + ' was successfully deleted.')
+    except Exception:
         flash('An error occurred. Venue ' +
-              Venue.query.get(venue_id) + ' could not be deleted.')
+              venue_id + ' could not be deleted.')
         db.session.rollback()
     finally:
         db.session.close()
-    return redirect(url_for('venues'))
+    return redirect(url_for('main.venues'))
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@main.route('/artists')
 def artists():
-    artists_data = []
-
-    artists = Artist.query.all()
+    genre_mask, state = directory_filters()
+    facets = artist_facets(genre_mask, state)
 
-    for artist in artists:
-        artists_data.append({
-            "id": artist.id,
-            "name": artist.name
-        })
+    def render():
+        page = paginate(artist_directory, genre_mask, state)
 
-    return render_template('pages/artists.html',
-                           artists=artists_data)
+        artists_data = []
+        for artist in page:
+            artists_data.append({
+                "id": artist.id,
+                "name": artist.name
+            })
 
+        return render_template('pages/artists.html',
+                               artists=artists_data, page=page, facets=facets)
 
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
+    version = paginate(artist_directory_version, genre_mask, state)
+    return conditional_page(tuple(version) + facets.version, render)
 
-    search_term = request.form.get('search_term', '')
 
-    artists = Artist.query.filter(
-        Artist.name.like('%' + search_term + '%')).all()
-
-    artist_data = []
+@main.route('/artists/search', methods=['GET', 'POST'])
+def search_artists():
+    search_term = request.values.get('search_term', '')
 
-    for artist in artists:
-        artist_data.append({
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len([show for show in artist.shows if
-                                       show.start_time > datetime.now()])
-        })
+    count, page = paginate(artist_search, search_term)
 
     search = {
-        "count": len(artists),
-        "data": artist_data
+        "count": count,
+        "data": page.items
     }
 
     return render_template('pages/search_artists.html',
-                           results=search, search_term=request.form.get
-                           ('search_term', ''))
+                           results=search, search_term=search_term,
+                           page=page)
 
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    artist_data = []
-
-    artist = Artist.query.filter_by(id=artist_id).first_or_404()
-    shows = db.session.query(Show, Venue).join(Venue). \
-        filter(
-        Show.artist_id == artist_id,
-        Show.venue_id == Venue.id
-    ). \
-        all()
-
-    past_shows = []
-    upcoming_shows = []
-
-    for show in shows:
-        temp_show = {
-            'venue_id': show.Venue.id,
-            'venue_name': show.Venue.name,
-            'venue_image_link': show.Venue.image_link,
-            'start_time': show.Show.start_time.strftime("%m/%d/%Y, %H:%M")
-        }
-        if show.Show.start_time <= datetime.now():
-            past_shows.append(temp_show)
-        else:
-            upcoming_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(artist)
-
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
+def build_artist_page(artist_id, now):
+    """Build the show_artist context as of ``now`` and the time at which it
+    next goes stale on its own (when its earliest upcoming show starts)."""
+    artist = Artist.query.options(raiseload(Artist.shows)) \
+        .filter_by(id=artist_id).first_or_404()
+    upcoming, past, past_count = artist_shows(
+        artist_id, now, current_app.config['PAST_SHOWS_LIMIT'])
 
     artist_data = {
         'id': artist.id,
@@ -314,29 +406,69 @@ def show_artist(artist_id):
         'facebook_link': artist.facebook_link,
         'seeking_venue': artist.seeking_venue,
         'seeking_description': artist.seeking_description,
-        'image_link': artist.image_link
+        'image_link': artist.image_link,
+        'past_shows': show_tiles(past, 'venue'),
+        'past_shows_cursor': past.next_cursor,
+        'upcoming_shows': show_tiles(upcoming, 'venue'),
+        'past_shows_count': past_count,
+        'upcoming_shows_count': len(upcoming)
     }
+    return artist_data, upcoming[0].start_time if upcoming else None
+
+
+@main.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    now = datetime.now()
+
+    # Suggestions change without the artist or its shows changing.
+    matches = artist_matches(artist_id)
 
-    artist_data.update(data)
-    return render_template('pages/show_artist.html',
-                           artist=artist_data)
+    def render():
+        artist_data = page_cache.get_or_build(
+            artist_key(artist_id), lambda: build_artist_page(artist_id, now))
+        return render_template('pages/show_artist.html',
+                               artist=artist_data, matches=matches)
+
+    version = artist_page_version(artist_id, now)
+    if version is not None:
+        version = tuple(version) + tuple(matches)
+    return conditional_page(version, render)
+
+
+@main.route('/artists/<int:artist_id>/past_shows')
+def artist_past_shows_batch(artist_id):
+    try:
+        page = artist_past_shows(artist_id, datetime.now(),
+                                 current_app.config['PAST_SHOWS_LIMIT'],
+                                 request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
+    return render_template('pages/past_shows.html',
+                           shows=show_tiles(page, 'venue'), other='venue',
+                           endpoint='main.artist_past_shows_batch',
+                           cursor=page.next_cursor,
+                           url_args={'artist_id': artist_id})
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.query.filter_by(id=artist_id).first_or_404()
+    from forms import ArtistForm
+    artist = Artist.query.options(raiseload(Artist.shows)) \
+        .filter_by(id=artist_id).first_or_404()
 
     form = ArtistForm(obj=artist)
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-    artist = Artist.query.filter_by(id=artist_id).first_or_404()
+    from forms import ArtistForm
+    artist = Artist.query.options(raiseload(Artist.shows)) \
+        .filter_by(id=artist_id).first_or_404()
     form = ArtistForm(request.form, meta={'csrf': True})
     form.populate_obj(artist)
     if form.validate():
@@ -357,21 +489,25 @@ def edit_artist_submission(artist_id):
             message.append(field + ' ' + '|'.join(err))
         flash('Errors ' + str(message))
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.filter_by(id=venue_id).first_or_404()
+    from forms import VenueForm
+    venue = Venue.query.options(raiseload(Venue.shows)) \
+        .filter_by(id=venue_id).first_or_404()
 
     form = VenueForm(obj=venue)
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    venue = Venue.query.filter_by(id=venue_id).first_or_404()
+    from forms import VenueForm
+    venue = Venue.query.options(raiseload(Venue.shows)) \
+        .filter_by(id=venue_id).first_or_404()
     form = VenueForm(request.form, meta={'csrf': True})
     form.populate_obj(venue)
     if form.validate():
@@ -392,20 +528,22 @@ def edit_venue_submission(venue_id):
             message.append(field + ' ' + '|'.join(err))
         flash('Errors ' + str(message))
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
+    from forms import ArtistForm
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
+    from forms import ArtistForm
     form = ArtistForm(request.form, meta={'csrf': True})
     if form.validate():
         try:
@@ -435,78 +573,116 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows')
+@main.route('/shows')
 def shows():
-    shows_data = []
-    shows = Show.query.all()
-
-    for show in shows:
-        shows_data.append({
-            "venue_id": show.venue_id,
-            "venue_name": Venue.query.filter_by
-            (id=show.venue_id).first().name,
-            "artist_id": show.artist_id,
-            "artist_name": Artist.query.filter_by
-            (id=show.artist_id).first().name,
-            "artist_image_link": Artist.query.filter_by
-            (id=show.artist_id).first().image_link,
-            "start_time": str(show.start_time)
-        })
-
-    return render_template('pages/shows.html', shows=shows_data)
-
-
-@app.route('/shows/create')
+    def render():
+        page = paginate(shows_feed)
+
+        shows_data = []
+        start_times = format_datetimes([show.start_time for show in page],
+                                       'full')
+        for show, start_time in zip(page, start_times):
+            shows_data.append({
+                "venue_id": show.venue_id,
+                "venue_name": show.venue_name,
+                "artist_id": show.artist_id,
+                "artist_name": show.artist_name,
+                "artist_image_link": show.artist_image_link,
+                "start_time": start_time
+            })
+
+        return render_template('pages/shows.html', shows=shows_data,
+                               page=page)
+
+    return conditional_page(paginate(shows_feed_version), render)
+
+
+@main.route('/shows/create')
 def create_shows():
+    from forms import ShowForm
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-    try:
-        artist_id = request.form['artist_id']
-        venue_id = request.form['venue_id']
-        start_time = request.form['start_time']
+def error_message(errors):
+    message = []
+    for field, err in errors.items():
+        message.append(field + ' ' + '|'.join(err))
+    return 'Errors ' + str(message)
 
-        show = Show(artist_id=artist_id, venue_id=venue_id,
-                    start_time=start_time)
 
-        db.session.add(show)
+def _form_id(value):
+    value = (value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+@main.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    from forms import ShowForm
+    form = ShowForm(request.form, meta={'csrf': True})
+    if not form.validate():
+        flash(error_message(form.errors))
+        return render_template('pages/home.html')
+
+    booking = {
+        'artist_id': _form_id(form.artist_id.data),
+        'venue_id': _form_id(form.venue_id.data),
+        'start_time': form.start_time.data,
+        'duration_minutes': form.duration_minutes.data
+    }
+    errors = check_bookings([booking])[0]
+    if errors:
+        flash(error_message(errors))
+        return render_template('pages/home.html')
+
+    try:
+        db.session.add(Show(**booking))
         db.session.commit()
 
         flash('Show was successfully listed!')
-    except show:
+    except IntegrityError:
+        # Booked by a concurrent request since the check; the exclusion
+        # constraints have the last word on Postgres.
         db.session.rollback()
+        flash('An error occurred. Show could not be listed.')
         print(sys.exc_info())
     finally:
         db.session.close()
 
     return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
 
-@app.errorhandler(404)
+@main.route('/export/<any(venues, artists, shows):entity>.ndjson')
+def export_entity(entity):
+    # The generator runs after the view returns; stream_with_context keeps
+    # the app context (and so the session) alive until it is exhausted.
+    chunks = export.ndjson_lines(entity)
+    gzipped = bool(request.accept_encodings['gzip'])
+    if gzipped:
+        chunks = export.gzip_chunks(chunks)
+    response = Response(stream_with_context(chunks),
+                        mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=%s.ndjson' % entity
+    response.vary.add('Accept-Encoding')
+    if gzipped:
+        response.content_encoding = 'gzip'
+    return response
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s'
-            + '[in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
@@ -514,11 +690,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
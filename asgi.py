@@ -0,0 +1,238 @@
+import re
+import time
+from datetime import datetime
+from flask import json
+from werkzeug.exceptions import BadRequest, NotFound
+from werkzeug.http import parse_cookie, parse_etags
+from werkzeug.urls import url_decode
+from app import create_app
+from api import version_etag, listing_body, search_body, detail_body
+from database import PINNED_UNTIL, REPLICA
+from models import Venue, Artist
+from pagination import InvalidCursor
+from repository import AsyncRepository
+
+try:
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+# ----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   uvicorn asgi:application --workers 4
+#
+# The read-only JSON API (/api/...) is answered by the async repository with
+# the same bodies, ETags and 304s as api.py. Everything else (HTML pages,
+# forms, exports, metrics) is handed to the Flask app through uvicorn's WSGI
+# adapter, so one server can front the whole site.
+# ----------------------------------------------------------------------------#
+
+
+class Request(object):
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.args = url_decode(scope.get('query_string', b''))
+        self.headers = {}
+        for name, value in scope.get('headers', ()):
+            self.headers[name.decode('latin-1').lower()] = \
+                value.decode('latin-1')
+
+    def per_page(self):
+        config = app.config
+        try:
+            per_page = int(self.args.get('per_page', config['PER_PAGE']))
+        except ValueError:
+            per_page = config['PER_PAGE']
+        return max(1, min(per_page, config['MAX_PER_PAGE']))
+
+    def cursors(self):
+        return {'after': self.args.get('after'),
+                'before': self.args.get('before')}
+
+    @property
+    def pinned(self):
+        """Whether the visitor's Flask session is pinned to the primary."""
+        if REPLICA not in (app.config['SQLALCHEMY_BINDS'] or {}):
+            return False
+        cookie = parse_cookie(self.headers.get('cookie', '')).get(
+            app.session_cookie_name)
+        serializer = app.session_interface.get_signing_serializer(app)
+        if not cookie or serializer is None:
+            return False
+        try:
+            session = serializer.loads(
+                cookie,
+                max_age=app.permanent_session_lifetime.total_seconds())
+        except Exception:
+            return False
+        return session.get(PINNED_UNTIL, 0) >= time.time()
+
+
+class Response(object):
+
+    def __init__(self, body=None, status=200, etag=None):
+        self.status = status
+        self.body = b'' if body is None else json.dumps(
+            body, separators=(',', ':')).encode('utf-8')
+        self.headers = [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(self.body)).encode())]
+        if etag is not None:
+            self.headers.append((b'etag', ('"%s"' % etag).encode()))
+
+    async def send(self, send, head=False):
+        await send({'type': 'http.response.start', 'status': self.status,
+                    'headers': self.headers})
+        await send({'type': 'http.response.body',
+                    'body': b'' if head else self.body})
+
+
+async def conditional(request, etag, build):
+    """api.conditional for an async ``build``."""
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return Response(status=304, etag=etag)
+    return Response(await build(), etag=etag)
+
+
+def error(exception):
+    """The JSON body api.py's error handler gives ``exception``."""
+    return Response({'error': exception.description}, status=exception.code)
+
+
+class AsyncAPI(object):
+    """Async handlers for the routes of api.py."""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.routes = [
+            (re.compile(r'^/api/venues$'), self.venues),
+            (re.compile(r'^/api/venues/search$'), self.search_venues),
+            (re.compile(r'^/api/venues/(?P<id>\d+)$'), self.venue),
+            (re.compile(r'^/api/artists$'), self.artists),
+            (re.compile(r'^/api/artists/search$'), self.search_artists),
+            (re.compile(r'^/api/artists/(?P<id>\d+)$'), self.artist),
+            (re.compile(r'^/api/shows$'), self.shows),
+        ]
+
+    def match(self, path):
+        for pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match:
+                return handler, match.groupdict()
+        return None, None
+
+    async def _listing(self, request, version, query):
+        per_page, cursors = request.per_page(), request.cursors()
+
+        async def build():
+            return listing_body(await query(per_page, pinned=request.pinned,
+                                            **cursors))
+
+        version = await version(per_page, pinned=request.pinned, **cursors)
+        return await conditional(request, version_etag(tuple(version)),
+                                 build)
+
+    async def _search(self, request, model):
+        repository = self.repository
+        count, page = await repository.search_hits(
+            model, request.args.get('search_term', ''), request.per_page(),
+            pinned=request.pinned, **request.cursors())
+        ids = [hit.id for hit in page.items]
+
+        async def build():
+            return search_body(count, await repository.search_page(
+                model, page, pinned=request.pinned))
+
+        version = await repository.search_version(model, ids,
+                                                  pinned=request.pinned)
+        etag = version_etag(count, ids, page.next_cursor, page.prev_cursor,
+                            tuple(version))
+        return await conditional(request, etag, build)
+
+    async def _detail(self, request, version, query, id):
+        id, now = int(id), datetime.now()
+
+        async def build():
+            entity, upcoming, past = await query(
+                id, now, app.config['PAST_SHOWS_LIMIT'],
+                pinned=request.pinned)
+            if entity is None:
+                raise NotFound()
+            return detail_body(entity, upcoming, past)
+
+        version = await version(id, now, pinned=request.pinned)
+        if version is None:
+            return error(NotFound)
+        return await conditional(request, version_etag(tuple(version)),
+                                 build)
+
+    async def venues(self, request):
+        repository = self.repository
+        return await self._listing(request, repository.venue_list_version,
+                                   repository.venue_list)
+
+    async def artists(self, request):
+        repository = self.repository
+        return await self._listing(request, repository.artist_list_version,
+                                   repository.artist_list)
+
+    async def shows(self, request):
+        repository = self.repository
+        return await self._listing(request, repository.shows_feed_version,
+                                   repository.shows_feed)
+
+    async def search_venues(self, request):
+        return await self._search(request, Venue)
+
+    async def search_artists(self, request):
+        return await self._search(request, Artist)
+
+    async def venue(self, request, id):
+        repository = self.repository
+        return await self._detail(request, repository.venue_page_version,
+                                  repository.venue_detail, id)
+
+    async def artist(self, request, id):
+        repository = self.repository
+        return await self._detail(request, repository.artist_page_version,
+                                  repository.artist_detail, id)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        handler = None
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            handler, kwargs = self.match(scope['path'])
+        if handler is None:
+            if WSGIMiddleware is None:
+                await error(NotFound).send(send)
+            else:
+                await flask_app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        try:
+            response = await handler(request, **kwargs)
+        except InvalidCursor:
+            response = error(BadRequest)
+        except NotFound:
+            # The entity was deleted after its version was read.
+            response = error(NotFound)
+        await response.send(send, head=request.method == 'HEAD')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.repository.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = create_app()
+flask_app = WSGIMiddleware(app) if WSGIMiddleware is not None else None
+application = AsyncAPI(AsyncRepository(app))
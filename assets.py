@@ -0,0 +1,289 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# ----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+# `flask assets build` concatenates the bundles below and minifies them. It
+# copies every file under static/ as well (stylesheets with their url()s
+# pointed at the copies), names each output after a hash of its content
+# and writes .gz (and .br, with the brotli package) siblings into
+# ASSETS_DIRECTORY. A manifest maps the source names to the
+# built names. Templates link assets through asset_url()/asset_urls(). With
+# a manifest those point at ASSETS_URL_PATH. The files there never change,
+# so they are served with a far-future immutable Cache-Control, in the
+# precompressed variant the client accepts. Without a manifest (in
+# development) they are the plain files under /static.
+# ----------------------------------------------------------------------------#
+
+# Bundle name -> source files (relative to static/), in load order.
+BUNDLES = {
+    'css/site.css': ('css/bootstrap.min.css', 'css/layout.main.css',
+                     'css/main.css', 'css/main.responsive.css',
+                     'css/main.quickfix.css'),
+    'js/head.js': ('js/libs/modernizr-2.8.2.min.js',
+                   'js/libs/moment.min.js'),
+    'js/site.js': ('js/script.js', 'js/libs/bootstrap-3.1.1.min.js',
+                   'js/plugins.js'),
+}
+
+MANIFEST = 'manifest.json'
+
+# Content-Encoding -> file suffix, most preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.eot',
+                '.otf', '.ttf')
+
+
+class Manifest(object):
+    """Source name -> built name, plus a version that changes with any
+    built file."""
+
+    def __init__(self, files=None):
+        self.files = files or {}
+        self.version = hashlib.sha1(json.dumps(
+            self.files, sort_keys=True).encode('utf-8')).hexdigest() \
+            if self.files else None
+
+    def get(self, name):
+        return self.files.get(name)
+
+    @classmethod
+    def load(cls, directory):
+        path = os.path.join(directory, MANIFEST)
+        if not os.path.isfile(path):
+            return cls()
+        with open(path) as stream:
+            return cls(json.load(stream))
+
+
+# Minification
+# ----------------------------------------------------------------------------
+
+_CSS_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+# Comments, except /*! ... */ license headers; strings are matched first so
+# a "/*" inside one is left alone.
+_CSS_COMMENT = re.compile(r'(%s)|/\*(?!!).*?\*/' % _CSS_STRING, re.S)
+_CSS_VERBATIM = re.compile(r'(%s|/\*!.*?\*/)' % _CSS_STRING, re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r' ?([{};,>]) ?')
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]*)\1\s*\)')
+_SOURCE_MAP = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.M)
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace. Strings and license
+    comments are kept verbatim, and spaces that may be significant
+    (descendant selectors, calc() operands) are collapsed, not removed."""
+    source = _CSS_COMMENT.sub(lambda match: match.group(1) or '', source)
+    parts = _CSS_VERBATIM.split(source)
+    for i in range(0, len(parts), 2):
+        code = _CSS_SPACE.sub(' ', parts[i])
+        parts[i] = _CSS_PUNCTUATION.sub(r'\1', code).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """Minify with rjsmin when it is installed; without it the source is
+    only stripped of source map references."""
+    source = _SOURCE_MAP.sub('', source)
+    if rjsmin is None:
+        return source.strip()
+    return rjsmin.jsmin(source, keep_bang_comments=True)
+
+
+def rewrite_css_urls(source, name, manifest, url_path, static_url_path):
+    """Point the relative url()s of static/``name`` at their built copies,
+    or at /static when the target was not built, so they still resolve
+    from wherever the bundle is served."""
+    def replace(match):
+        url = match.group(2)
+        if not url or url.startswith(('/', '#', 'data:', 'http:', 'https:')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(
+            posixpath.join(posixpath.dirname(name), path))
+        built = manifest.get(target)
+        if built is not None:
+            return 'url("%s/%s%s")' % (url_path, built, suffix)
+        return 'url("%s/%s%s")' % (static_url_path, target, suffix)
+
+    return _CSS_URL.sub(replace, source)
+
+
+# Building
+# ----------------------------------------------------------------------------
+
+
+def fingerprint(name, content):
+    root, extension = posixpath.splitext(name)
+    return '%s.%s%s' % (root, hashlib.sha256(content).hexdigest()[:12],
+                        extension)
+
+
+def _write(directory, name, content):
+    path = os.path.join(directory, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as stream:
+        stream.write(content)
+    return path
+
+
+def write_asset(directory, name, content):
+    """Write ``content`` under its fingerprinted name, plus compressed
+    siblings where they are smaller. Returns the fingerprinted name."""
+    built = fingerprint(name, content)
+    path = _write(directory, built, content)
+    if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+        # mtime=0 keeps the .gz bytes a function of the content alone.
+        variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                with open(path + suffix, 'wb') as stream:
+                    stream.write(compressed)
+    return built
+
+
+def _sources(static_folder, exclude):
+    for root, directories, files in os.walk(static_folder):
+        directories[:] = sorted(directory for directory in directories
+                                if os.path.join(root, directory) != exclude)
+        for filename in sorted(files):
+            if filename.startswith('.'):
+                continue
+            path = os.path.join(root, filename)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/')
+
+
+def build(app):
+    """Build every static file and bundle into ASSETS_DIRECTORY and write
+    its manifest. Earlier builds are left in place so pages rendered
+    against them keep working. Returns the new Manifest."""
+    config = app.config
+    directory = config['ASSETS_DIRECTORY']
+    static_folder = app.static_folder
+    files = {}
+    # Stylesheets last, so the files they refer to are already built.
+    names = sorted(_sources(static_folder, os.path.abspath(directory)),
+                   key=lambda name: name.endswith('.css'))
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as stream:
+            content = stream.read()
+        if name.endswith('.css'):
+            content = rewrite_css_urls(
+                content.decode('utf-8'), name, files,
+                config['ASSETS_URL_PATH'],
+                app.static_url_path).encode('utf-8')
+        files[name] = write_asset(directory, name, content)
+
+    for bundle, sources in sorted(BUNDLES.items()):
+        parts = []
+        for name in sources:
+            with open(os.path.join(static_folder, name),
+                      encoding='utf-8') as stream:
+                source = stream.read()
+            if bundle.endswith('.css'):
+                parts.append(minify_css(rewrite_css_urls(
+                    source, name, files, config['ASSETS_URL_PATH'],
+                    app.static_url_path)))
+            else:
+                parts.append(minify_js(source))
+        # A file may end without a semicolon; never let the next one
+        # continue its last statement.
+        separator = '\n' if bundle.endswith('.css') else ';\n'
+        content = separator.join(parts).encode('utf-8')
+        files[bundle] = write_asset(directory, bundle, content)
+
+    _write(directory, MANIFEST,
+           json.dumps(files, indent=2, sort_keys=True).encode('utf-8'))
+    manifest = Manifest(files)
+    app.extensions['assets'] = manifest
+    return manifest
+
+
+# Serving
+# ----------------------------------------------------------------------------
+
+
+def asset_url(endpoint, **values):
+    """``url_for`` that sends static files with a built copy to it."""
+    if endpoint == 'static':
+        built = current_app.extensions['assets'].get(values.get('filename'))
+        if built is not None:
+            values['filename'] = built
+            endpoint = 'assets'
+    return url_for(endpoint, **values)
+
+
+def asset_urls(name):
+    """The URLs to include for ``name``: the built bundle, or each of its
+    sources when nothing has been built."""
+    built = current_app.extensions['assets'].get(name)
+    if built is not None:
+        return [url_for('assets', filename=built)]
+    return [asset_url('static', filename=source)
+            for source in BUNDLES.get(name, (name,))]
+
+
+def serve_asset(filename):
+    if filename == MANIFEST:
+        raise NotFound()
+    config = current_app.config
+    directory = config['ASSETS_DIRECTORY']
+    mimetype = mimetypes.guess_type(filename)[0] or \
+        'application/octet-stream'
+    name, encoding = filename, None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate]:
+            path = safe_join(directory, filename + suffix)
+            if path is not None and os.path.isfile(path):
+                name, encoding = filename + suffix, candidate
+                break
+    response = send_from_directory(directory, name, mimetype=mimetype,
+                                   cache_timeout=config['ASSETS_MAX_AGE'])
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+class Assets(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIRECTORY',
+                              os.path.join(app.static_folder, 'dist'))
+        app.config.setdefault('ASSETS_URL_PATH', '/assets')
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        app.extensions['assets'] = Manifest.load(
+            app.config['ASSETS_DIRECTORY'])
+        app.add_url_rule(app.config['ASSETS_URL_PATH'] +
+                         '/<path:filename>', 'assets', serve_asset)
+        app.jinja_env.globals.update(asset_url=asset_url,
+                                     asset_urls=asset_urls)
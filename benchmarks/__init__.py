@@ -0,0 +1,17 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(engine):
+    """Count statements sent to ``engine`` inside the block."""
+    counter = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        counter['queries'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
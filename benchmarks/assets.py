@@ -0,0 +1,76 @@
+"""What a page view costs in static asset requests and bytes.
+
+Usage:
+    python -m benchmarks.assets
+
+Renders the home page through the test client twice, once with the plain
+files under /static and once with a fresh `flask assets build` (written to
+a temporary directory). It then fetches every stylesheet, script and image
+the page links the way a browser would:
+
+- ``first view``: every asset is downloaded, with
+  ``Accept-Encoding: br, gzip``;
+- ``repeat view``: the browser still holds the earlier responses. Immutable
+  assets cost nothing. The others are revalidated with If-None-Match /
+  If-Modified-Since, as happens on a reload or once their max-age (12
+  hours on Flask's static route) has run out.
+
+Third-party URLs (CDN jQuery, Font Awesome kit) are not counted.
+"""
+import re
+import tempfile
+
+from app import create_app
+import assets
+
+app = create_app()
+
+ASSET_URL = re.compile(r'(?:src|href)="(/(?:static|assets)/[^"]+)"')
+ACCEPT = {'Accept-Encoding': 'br, gzip'}
+
+
+def linked_assets(client):
+    html = client.get('/').get_data(as_text=True)
+    # The IE-only script and the jQuery fallback are not normally fetched.
+    html = re.sub(r'<!--\[if.*?<!\[endif\]-->', '', html, flags=re.S)
+    html = re.sub(r'document\.write\(.*?\)', '', html)
+    return [url for url in ASSET_URL.findall(html) if '/ico/' not in url]
+
+
+def page_view(client):
+    first = repeat = requests = 0
+    cached = 0
+    for url in linked_assets(client):
+        response = client.get(url, headers=ACCEPT)
+        if response.status_code != 200:
+            continue
+        first += len(response.get_data())
+        if response.cache_control.immutable:
+            cached += 1
+            continue
+        requests += 1
+        headers = dict(ACCEPT)
+        if response.headers.get('ETag'):
+            headers['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = response.headers['Last-Modified']
+        repeat += len(client.get(url, headers=headers).get_data())
+    return requests + cached, first, requests, repeat
+
+
+def main():
+    client = app.test_client()
+    print('%-10s %10s %12s %14s %12s'
+          % ('', 'requests', 'first bytes', 'repeat reqs', 'repeat bytes'))
+
+    app.extensions['assets'] = assets.Manifest()
+    print('%-10s %10d %12d %14d %12d' % (('plain',) + page_view(client)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        app.config['ASSETS_DIRECTORY'] = directory
+        assets.build(app)
+        print('%-10s %10d %12d %14d %12d' % (('built',) + page_view(client)))
+
+
+if __name__ == '__main__':
+    main()
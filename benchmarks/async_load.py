@@ -0,0 +1,192 @@
+"""Load test of the JSON API: the Flask app against the ASGI app.
+
+Usage:
+    python -m benchmarks.async_load [--size 1000] [--requests 600]
+                                    [--concurrency 1 8 32]
+
+Builds (once) a SQLite catalog of --size venues, --size artists and
+10 * --size shows, then serves it from one process per server:
+
+- ``sync``: app.py on werkzeug's single-threaded server, i.e. one sync
+  worker;
+- ``threaded``: app.py on werkzeug's threaded server;
+- ``async``: asgi.py on uvicorn, one worker.
+
+Each server gets the same mix of /api listings, detail pages and searches
+(fixed seed) at every concurrency level, from an asyncio client that opens
+a new connection per request, and the script reports requests per second
+and latency percentiles (ms).
+
+Set BENCH_DATABASE_URI to run against a migrated Postgres instead (its
+tables are dropped and recreated if the catalog size differs); the async
+server then uses asyncpg.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+SHOWS_PER_SIZE = 10
+SERVERS = ('sync', 'threaded', 'async')
+SEARCH_TERMS = ('blue', 'the', 'hall', 'electric', 'band', 'velvet', 'ro')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build(size):
+    from app import create_app
+    from models import db, Venue, Artist, Show
+    from benchmarks.catalog import generate
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        counts = (db.session.query(Venue.id).count(),
+                  db.session.query(Artist.id).count(),
+                  db.session.query(Show.id).count())
+        if counts != (size, size, size * SHOWS_PER_SIZE):
+            db.drop_all()
+            db.create_all()
+            generate(size, size, size * SHOWS_PER_SIZE)
+        return ([id for id, in db.session.query(Venue.id)],
+                [id for id, in db.session.query(Artist.id)])
+
+
+def urls(venue_ids, artist_ids, count, seed=0):
+    rng = random.Random(seed)
+    choices = [
+        lambda: '/api/venues',
+        lambda: '/api/artists',
+        lambda: '/api/shows',
+        lambda: '/api/venues/%d' % rng.choice(venue_ids),
+        lambda: '/api/venues/%d' % rng.choice(venue_ids),
+        lambda: '/api/artists/%d' % rng.choice(artist_ids),
+        lambda: '/api/artists/%d' % rng.choice(artist_ids),
+        lambda: '/api/venues/search?search_term=%s'
+                % rng.choice(SEARCH_TERMS),
+        lambda: '/api/artists/search?search_term=%s'
+                % rng.choice(SEARCH_TERMS),
+    ]
+    return [rng.choice(choices)() for i in range(count)]
+
+
+def serve(server, port):
+    """Run one server in this process until it is killed."""
+    if server == 'async':
+        import uvicorn
+        uvicorn.run('asgi:application', host='127.0.0.1', port=port,
+                    workers=1, log_level='warning')
+        return
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+    app = create_app()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    make_server('127.0.0.1', port, app, threaded=server == 'threaded',
+                request_handler=QuietHandler).serve_forever()
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Server on port %d did not start' % port)
+
+
+async def fetch(port, url):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(('GET %s HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                  'Connection: close\r\n\r\n' % url).encode('ascii'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b' ', 2)[1])
+    if status != 200:
+        raise RuntimeError('%s answered %d' % (url, status))
+
+
+async def load(port, urls, concurrency):
+    pending = iter(urls)
+    latencies = []
+
+    async def client():
+        for url in pending:
+            started = time.perf_counter()
+            await fetch(port, url)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for i in range(concurrency)])
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=600)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--database', default='/tmp/fyyur-async-bench.db')
+    parser.add_argument('--serve', choices=SERVERS, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # config.py reads DATABASE_URL at import time, here and in the servers.
+    os.environ['DATABASE_URL'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite:///' + os.path.abspath(args.database))
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    venue_ids, artist_ids = build(args.size)
+    mix = urls(venue_ids, artist_ids, args.requests)
+    warmup = urls(venue_ids, artist_ids, 50, seed=1)
+
+    print('%-9s %5s %9s %9s %9s %9s'
+          % ('server', 'conc', 'req/s', 'p50', 'p95', 'p99'))
+    for server in SERVERS:
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.async_load', '--serve',
+             server, '--port', str(port), '--database', args.database])
+        try:
+            wait_for(port)
+            asyncio.run(load(port, warmup, 1))
+            for concurrency in args.concurrency:
+                elapsed, latencies = asyncio.run(
+                    load(port, mix, concurrency))
+                print('%-9s %5d %9.1f %9.1f %9.1f %9.1f'
+                      % (server, concurrency, len(latencies) / elapsed,
+                         percentile(latencies, 0.50) * 1000,
+                         percentile(latencies, 0.95) * 1000,
+                         percentile(latencies, 0.99) * 1000))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
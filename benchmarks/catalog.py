@@ -0,0 +1,186 @@
+"""Deterministic synthetic catalogs for benchmarks.
+
+``generate(venues, artists, shows, seed=0)`` bulk-inserts a catalog into the
+current app's database. The same arguments always produce the same rows:
+
+- cities follow a Zipf-like weighting over real US cities, so a few metros
+  hold most venues and artists;
+- each venue/artist gets one to three genres weighted by popularity;
+- artists sit at their city's centre, as geo.py would place them, and
+  venues are scattered up to METRO_KM around it;
+- shows pick venues and artists with a long-tailed popularity, start in
+  the evening, and spread over the past two years and the next six months
+  (roughly 70% past).
+"""
+import math
+import random
+from itertools import islice
+from datetime import datetime, timedelta
+
+import counters
+import geo
+from enums import Genres
+from models import db, Venue, Artist, Show
+
+CITIES = (
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+    ('Austin', 'TX'), ('Nashville', 'TN'), ('San Francisco', 'CA'),
+    ('Seattle', 'WA'), ('New Orleans', 'LA'), ('Atlanta', 'GA'),
+    ('Denver', 'CO'), ('Boston', 'MA'), ('Philadelphia', 'PA'),
+    ('Portland', 'OR'), ('Minneapolis', 'MN'), ('Detroit', 'MI'),
+    ('Memphis', 'TN'), ('Miami', 'FL'), ('Kansas City', 'MO'),
+    ('Phoenix', 'AZ'), ('Salt Lake City', 'UT'), ('Pittsburgh', 'PA'),
+    ('Columbus', 'OH'), ('Baltimore', 'MD'), ('Raleigh', 'NC'),
+    ('Richmond', 'VA'), ('Albuquerque', 'NM'), ('Omaha', 'NE'),
+    ('Boise', 'ID'), ('Burlington', 'VT'), ('Anchorage', 'AK'),
+)
+CITY_WEIGHTS = [1.0 / rank for rank in range(1, len(CITIES) + 1)]
+
+# Stored as enum names, which is what VenueForm/ArtistForm submit.
+GENRES = [genre.name for genre in Genres]
+GENRE_WEIGHTS = {
+    'Rock_n_Roll': 10, 'Pop': 9, 'HipHop': 8, 'Alternative': 7,
+    'Electronic': 7, 'Jazz': 6, 'Country': 6, 'Folk': 5, 'Blues': 5,
+    'RnB': 5, 'Soul': 4, 'Funk': 4, 'Punk': 4, 'Heavy_Metal': 4,
+    'Reggae': 3, 'Classical': 3, 'Instrumental': 2, 'Musical_Theatre': 2,
+    'Other': 1,
+}
+
+VENUE_WORDS = ('Blue', 'Note', 'Velvet', 'Empire', 'Garden', 'Station',
+               'Hall', 'Room', 'Lounge', 'Stage', 'Theatre', 'Club', 'Park',
+               'Underground', 'Basement', 'Ballroom', 'Tavern', 'Loft',
+               'Dueling', 'Pianos', 'Orpheum', 'Fillmore', 'Crescent',
+               'Harbor', 'Lantern', 'Copper', 'Electric', 'Whiskey')
+ARTIST_WORDS = ('Guns', 'Roses', 'Matt', 'Quevado', 'Wild', 'Sax', 'Band',
+                'The', 'Electric', 'Echo', 'Midnight', 'Rivers', 'Static',
+                'Foxes', 'Lanterns', 'Ghost', 'Honey', 'Thunder', 'Velvet',
+                'Kids', 'Brothers', 'Sisters', 'Collective', 'Trio',
+                'Quartet', 'Orchestra', 'Parade', 'Machine')
+
+BATCH = 5000
+METRO_KM = 30
+PAST_DAYS = 730
+FUTURE_DAYS = 180
+
+
+def _pick_genres(rng):
+    count = rng.choice((1, 1, 2, 2, 3))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(rng.choices(GENRES, weights=[GENRE_WEIGHTS[genre]
+                                                for genre in GENRES])[0])
+    return sorted(chosen)
+
+
+def _name(rng, words, index):
+    return '%s %d' % (' '.join(rng.sample(words, rng.choice((2, 3)))), index)
+
+
+def _phone(rng):
+    return '%03d-%03d-%04d' % (rng.randint(200, 999), rng.randint(200, 999),
+                               rng.randint(0, 9999))
+
+
+def _venue_location(rng, city, state):
+    latitude, longitude = geo.geocode(city, state)
+    latitude += rng.uniform(-METRO_KM, METRO_KM) / geo.KM_PER_DEGREE
+    longitude += rng.uniform(-METRO_KM, METRO_KM) / (
+        geo.KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    return {'latitude': latitude, 'longitude': longitude,
+            'geohash': geo.encode_geohash(latitude, longitude)}
+
+
+def _insert(table, rows):
+    rows = iter(rows)
+    batch = list(islice(rows, BATCH))
+    while batch:
+        db.session.execute(table.insert(), batch)
+        batch = list(islice(rows, BATCH))
+
+
+def venue_rows(count, rng):
+    rows = []
+    for i in range(count):
+        city, state = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+        seeking = rng.random() < 0.3
+        rows.append({
+            'name': _name(rng, VENUE_WORDS, i),
+            'genres': _pick_genres(rng),
+            'address': '%d %s St' % (rng.randint(1, 9999),
+                                     rng.choice(VENUE_WORDS)),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'website_link': 'https://venue%d.example.com' % i,
+            'facebook_link': 'https://www.facebook.com/venue%d' % i,
+            'seeking_talent': seeking,
+            'seeking_description': 'Looking for local acts.' if seeking
+            else None,
+            'image_link': 'https://images.example.com/venues/%d.jpg' % i,
+            **_venue_location(rng, city, state)
+        })
+    return rows
+
+
+def artist_rows(count, rng):
+    rows = []
+    for i in range(count):
+        city, state = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+        seeking = rng.random() < 0.4
+        rows.append({
+            'name': _name(rng, ARTIST_WORDS, i),
+            'genres': _pick_genres(rng),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'website_link': 'https://artist%d.example.com' % i,
+            'facebook_link': 'https://www.facebook.com/artist%d' % i,
+            'seeking_venue': seeking,
+            'seeking_description': 'Looking for shows.' if seeking else None,
+            'image_link': 'https://images.example.com/artists/%d.jpg' % i,
+            **geo.location_columns(city, state)
+        })
+    return rows
+
+
+def show_rows(count, venue_ids, artist_ids, rng, now):
+    # Long-tailed popularity: the first ids are booked far more often.
+    venue_weights = [1.0 / (rank + 10) for rank in range(len(venue_ids))]
+    artist_weights = [1.0 / (rank + 10) for rank in range(len(artist_ids))]
+    venues = rng.choices(venue_ids, weights=venue_weights, k=count)
+    artists = rng.choices(artist_ids, weights=artist_weights, k=count)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # A generator, so millions of shows are inserted without building them
+    # all first.
+    for venue_id, artist_id in zip(venues, artists):
+        day = rng.randint(-PAST_DAYS, FUTURE_DAYS)
+        start_time = midnight + timedelta(days=day,
+                                          hours=rng.choice((18, 19, 20, 21,
+                                                            22)),
+                                          minutes=rng.choice((0, 30)))
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'is_past': start_time <= now,
+        }
+
+
+def generate(venues, artists, shows, seed=0, now=None):
+    """Insert a synthetic catalog and return ``(venue_ids, artist_ids)``."""
+    if now is None:
+        now = datetime.now()
+    rng = random.Random(seed)
+
+    _insert(Venue.__table__, venue_rows(venues, rng))
+    _insert(Artist.__table__, artist_rows(artists, rng))
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in
+                  db.session.query(Artist.id).order_by(Artist.id)]
+    if shows:
+        _insert(Show.__table__, show_rows(shows, venue_ids, artist_ids, rng,
+                                          now))
+    db.session.commit()
+    counters.rebuild(now)
+    return venue_ids, artist_ids
@@ -0,0 +1,53 @@
+"""Micro-benchmark for the ``datetime`` Jinja filter.
+
+Usage:
+    python -m benchmarks.datetime_filter
+
+Compares, for a page worth of show times, the original filter (stringify,
+re-parse with dateutil, babel.dates.format_datetime) against the compiled
+filter on datetime objects and the batch formatter.
+"""
+import timeit
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+
+from filters import FORMATS, format_datetime, format_datetimes
+
+ROWS = 500
+NUMBER = 20
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, FORMATS.get(format, format),
+                                       locale='en')
+
+
+def main():
+    start = datetime(2026, 1, 1, 20, 0)
+    values = [start + timedelta(hours=7 * i) for i in range(ROWS)]
+    strings = [str(value) for value in values]
+
+    assert [legacy_format_datetime(value, 'full') for value in strings] == \
+        format_datetimes(values, 'full')
+
+    cases = [
+        ('legacy: str -> parse -> babel',
+         lambda: [legacy_format_datetime(v, 'full') for v in strings]),
+        ('compiled filter on datetimes',
+         lambda: [format_datetime(v, 'full') for v in values]),
+        ('compiled filter on strings',
+         lambda: [format_datetime(v, 'full') for v in strings]),
+        ('batch format_datetimes',
+         lambda: format_datetimes(values, 'full')),
+    ]
+    print('%d timestamps per call, best of 3 x %d calls' % (ROWS, NUMBER))
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+        print('%-32s %8.2f ms  (%5.1f us/row)'
+              % (name, best * 1000, best * 1e6 / ROWS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Peak memory of the streaming export against loading the whole table.
+
+Usage:
+    python -m benchmarks.export [--shows 1000000] [--database PATH]
+
+Builds (once) a SQLite catalog of 1000 venues, 1000 artists and --shows
+shows, then exports the shows table in a fresh process per mode and
+reports that process's peak RSS:
+
+- ``file``: ``export.write_export`` to /dev/null, as ``flask export`` does;
+- ``http``: ``GET /export/shows.ndjson`` with gzip through the test client,
+  consuming the streamed body;
+- ``all``: ``Show.query.all()`` serialized in one go, the approach the
+  export replaces.
+
+The catalog is reused while it holds --shows shows. Set BENCH_DATABASE_URI
+to run against a migrated Postgres instead (its tables are dropped and
+recreated if the count differs); psycopg2 then streams through a
+server-side cursor.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+VENUES = ARTISTS = 1000
+MODES = ('file', 'http', 'all')
+
+
+def peak_rss_mib():
+    # Prefer VmHWM: Linux carries ru_maxrss over from the parent across
+    # exec, which would hide the child's own peak. Both are in KiB.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def configure(uri):
+    from app import create_app
+    app = create_app()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    return app
+
+
+def build(uri, shows):
+    from models import db, Show
+    from benchmarks.catalog import generate
+
+    app = configure(uri)
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Show.id).count() == shows:
+            return
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        generate(VENUES, ARTISTS, shows)
+        print('Generated %d shows in %.1f s'
+              % (shows, time.perf_counter() - started))
+
+
+def measure(uri, mode):
+    """Run one export mode in this process and print a JSON result."""
+    import export
+    from models import db, Show
+
+    app = configure(uri)
+    baseline = peak_rss_mib()
+    started = time.perf_counter()
+    with app.app_context():
+        if mode == 'file':
+            with open(os.devnull, 'wb') as stream:
+                rows = export.write_export('shows', stream)
+            size = None
+        elif mode == 'http':
+            response = app.test_client().get(
+                '/export/shows.ndjson', buffered=False,
+                headers={'Accept-Encoding': 'gzip'})
+            size = 0
+            for chunk in response.response:
+                size += len(chunk)
+            response.close()
+            rows = db.session.query(Show.id).count()
+        else:
+            columns = [column.name for column in export.ENTITIES['shows'][0]]
+            shows = Show.query.order_by(Show.id).all()
+            body = ''.join(
+                json.dumps({name: getattr(show, name) for name in columns},
+                           default=str) + '\n'
+                for show in shows)
+            rows, size = len(shows), len(body)
+    print(json.dumps({
+        'rows': rows,
+        'seconds': time.perf_counter() - started,
+        'baseline_mib': baseline,
+        'peak_mib': peak_rss_mib(),
+        'bytes': size,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--database', default='/tmp/fyyur-export-bench.db')
+    parser.add_argument('--measure', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    uri = os.environ.get('BENCH_DATABASE_URI',
+                         'sqlite:///' + os.path.abspath(args.database))
+    if args.measure:
+        measure(uri, args.measure)
+        return
+
+    build(uri, args.shows)
+    print('%-6s %10s %9s %14s %12s %12s'
+          % ('mode', 'rows', 'seconds', 'baseline MiB', 'peak MiB',
+             'body bytes'))
+    for mode in MODES:
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks.export', '--measure', mode,
+             '--database', args.database])
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print('%-6s %10d %9.1f %14.1f %12.1f %12s'
+              % (mode, result['rows'], result['seconds'],
+                 result['baseline_mib'], result['peak_mib'],
+                 result['bytes'] if result['bytes'] is not None else '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Cost of the venue directory's genre/state facets as the catalog grows.
+
+Usage:
+    python -m benchmarks.facets [venues ...]
+
+For each size (default 10000 100000 300000) seeds that many venues with the
+catalog generator, then times, for a few selections:
+
+- ``scan``: reading every venue's genres and state and counting in Python,
+  which is what the facets cost without the genre bitmask;
+- ``facets``: ``queries.venue_facets``, one query grouped by
+  (state, genre_mask);
+- ``page``: one filtered page of ``queries.venue_directory``.
+
+Runs against in-memory SQLite; set BENCH_DATABASE_URI to a migrated
+Postgres database instead.
+"""
+import os
+import sys
+import time
+
+from app import create_app
+from enums import Genres
+from models import db, Venue
+from queries import venue_directory, venue_facets
+from benchmarks.catalog import generate
+
+app = create_app()
+
+SIZES = (10000, 100000, 300000)
+REPEAT = 5
+PER_PAGE = 20
+SELECTIONS = (
+    ('none', [], None),
+    ('Jazz', ['Jazz'], None),
+    ('Rock+Pop, NY', ['Rock_n_Roll', 'Pop'], 'NY'),
+)
+
+
+def scan(genres, state):
+    """Facet counts from the genre arrays, without the bitmask."""
+    selected = set(genres)
+    genre_counts = {}
+    state_counts = {}
+    for venue_genres, venue_state in db.session.query(Venue.genres,
+                                                      Venue.state):
+        venue_genres = set(venue_genres)
+        if not selected <= venue_genres:
+            continue
+        state_counts[venue_state] = state_counts.get(venue_state, 0) + 1
+        if state is None or venue_state == state:
+            for genre in venue_genres:
+                genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    return genre_counts, state_counts
+
+
+def timed(function, *args):
+    best = None
+    for i in range(REPEAT):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    print('%8s  %-14s %10s %10s %10s   (ms, best of %d)'
+          % ('venues', 'selection', 'scan', 'facets', 'page', REPEAT))
+    with app.app_context():
+        for size in sizes:
+            db.drop_all()
+            db.create_all()
+            generate(size, 0, 0)
+            for label, genres, state in SELECTIONS:
+                mask = Genres.mask(genres)
+                scan_time, (genre_counts, _) = timed(scan, genres, state)
+                facets_time, facets = timed(venue_facets, mask, state)
+                page_time, _ = timed(venue_directory, mask, state, PER_PAGE)
+                assert {value.name: value.count
+                        for value in facets.genres} == genre_counts
+                print('%8d  %-14s %10.2f %10.2f %10.2f'
+                      % (size, label, scan_time * 1000, facets_time * 1000,
+                         page_time * 1000))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Cost of a /venues/near radius search as the number of venues grows.
+
+Usage:
+    python -m benchmarks.geo [venues ...]
+
+For each size (default 10000 100000) seeds that many venues with the
+catalog generator, scattered around 30 US cities, then times radius
+searches (nearest PER_PAGE venues) around a busy and a quiet city:
+
+- ``scan``: reading every venue's coordinates and measuring each
+  distance, which is what a search costs without an index;
+- ``box``: the bounding box as a plain SQL filter on latitude and
+  longitude, which has no index to use;
+- ``near``: ``queries.venues_near``, which reads the geohash ranges that
+  cover the box.
+
+Runs against in-memory SQLite; set BENCH_DATABASE_URI to a migrated
+Postgres database instead.
+"""
+import os
+import sys
+import time
+
+from app import create_app
+from geo import bounding_box, distance_km, geocode
+from models import db, Venue
+from queries import venues_near
+from benchmarks.catalog import generate
+
+app = create_app()
+
+SIZES = (10000, 100000)
+REPEAT = 5
+PER_PAGE = 30
+SEARCHES = (
+    ('New York', 'NY', 5),
+    ('New York', 'NY', 25),
+    ('New York', 'NY', 100),
+    ('Boise', 'ID', 25),
+    ('Boise', 'ID', 500),
+)
+
+
+def scan(latitude, longitude, radius_km):
+    hits = []
+    for id, venue_latitude, venue_longitude in db.session.query(
+            Venue.id, Venue.latitude, Venue.longitude):
+        distance = distance_km(latitude, longitude, venue_latitude,
+                               venue_longitude)
+        if distance <= radius_km:
+            hits.append((distance, id))
+    hits.sort()
+    return len(hits)
+
+
+def box(latitude, longitude, radius_km):
+    south, west, north, east = bounding_box(latitude, longitude, radius_km)
+    hits = []
+    for id, venue_latitude, venue_longitude in db.session.query(
+            Venue.id, Venue.latitude, Venue.longitude).filter(
+            Venue.latitude.between(south, north),
+            Venue.longitude.between(west, east)):
+        distance = distance_km(latitude, longitude, venue_latitude,
+                               venue_longitude)
+        if distance <= radius_km:
+            hits.append((distance, id))
+    hits.sort()
+    return len(hits)
+
+
+def near(latitude, longitude, radius_km):
+    return venues_near(latitude, longitude, radius_km, PER_PAGE)[0]
+
+
+def timed(function, *args):
+    best = None
+    for i in range(REPEAT):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    print('%8s  %-16s %8s %10s %10s %10s   (ms, best of %d)'
+          % ('venues', 'search', 'found', 'scan', 'box', 'near', REPEAT))
+    with app.app_context():
+        for size in sizes:
+            db.drop_all()
+            db.create_all()
+            generate(size, 0, 0)
+            for city, state, radius in SEARCHES:
+                latitude, longitude = geocode(city, state)
+                times = []
+                counts = set()
+                for function in (scan, box, near):
+                    elapsed, count = timed(function, latitude, longitude,
+                                           radius)
+                    times.append(elapsed * 1000)
+                    counts.add(count)
+                assert len(counts) == 1, counts
+                print('%8d  %-16s %8d %10.2f %10.2f %10.2f'
+                      % ((size, '%s %d km' % (city, radius), counts.pop())
+                         + tuple(times)))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Import time and per-worker memory of the web app.
+
+Usage:
+    python -m benchmarks.imports [--runs 5] [--workers 4] [--top 12]
+                                 [--statement STATEMENT] [--database PATH]
+
+Import time: runs STATEMENT (default: create the app as a worker does)
+under ``python -X importtime`` --runs times. It reports the median total
+and the packages that cost the most, summing each package's own import
+time over all its modules.
+
+Memory: forks --workers workers from a master that has already run
+STATEMENT (gunicorn's preload_app), and also starts the same number of
+workers that each run it themselves. Every worker serves /, /venues and
+/shows once and then reports:
+
+- RSS: its resident memory;
+- private: the part of RSS that is not shared with other processes
+  (Private_Clean + Private_Dirty from /proc/self/smaps_rollup). This is
+  what each extra worker really costs.
+
+STATEMENT must leave the WSGI app in a variable named ``app``; pass
+``--statement 'from app import app'`` to measure an older tree. Builds
+(once) a small SQLite catalog; set BENCH_DATABASE_URI to use a migrated
+Postgres instead. Linux only.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+STATEMENT = 'from app import create_app; app = create_app()'
+ROUTES = ('/', '/venues', '/shows')
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def import_profile(statement, env):
+    """Return ``(total_us, {package: self_us})`` for one run."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement], env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    packages = defaultdict(int)
+    total = 0
+    for line in process.stderr.decode('utf-8').splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own = int(match.group(1))
+            packages[match.group(4).split('.')[0]] += own
+            total += own
+    return total, packages
+
+
+def memory_kib():
+    """``(rss, private)`` of this process in KiB."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            fields = line.split()
+            if fields[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[fields[0]] = int(fields[1])
+    return (values['Rss:'],
+            values['Private_Clean:'] + values['Private_Dirty:'])
+
+
+def serve(app):
+    client = app.test_client()
+    for route in ROUTES:
+        response = client.get(route)
+        assert response.status_code == 200, (route, response.status_code)
+
+
+def fork_workers(workers, run):
+    """Fork ``workers`` children calling ``run()``, which returns a JSON
+    serializable result, and collect their results."""
+    children = []
+    for i in range(workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            with os.fdopen(write, 'w') as stream:
+                json.dump(run(), stream)
+            os._exit(0)
+        os.close(write)
+        children.append((pid, read))
+    results = []
+    for pid, read in children:
+        with os.fdopen(read) as stream:
+            results.append(json.load(stream))
+        os.waitpid(pid, 0)
+    return results
+
+
+def measure_memory(statement, workers):
+    """Print a JSON result for both worker models (run in a subprocess, so
+    the master starts from a clean interpreter)."""
+    def lazy():
+        namespace = {}
+        exec(statement, namespace)
+        serve(namespace['app'])
+        return memory_kib()
+
+    results = {'lazy': fork_workers(workers, lazy)}
+    namespace = {}
+    exec(statement, namespace)
+    results['master'] = [memory_kib()]
+
+    def preloaded():
+        serve(namespace['app'])
+        return memory_kib()
+
+    results['preload'] = fork_workers(workers, preloaded)
+    print(json.dumps(results))
+
+
+def build(uri):
+    from app import create_app
+    from models import db, Show
+    from benchmarks.catalog import generate
+    app = create_app()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Show.id).count() == 0:
+            generate(200, 200, 2000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--statement', default=STATEMENT)
+    parser.add_argument('--database', default='/tmp/fyyur-startup-bench.db')
+    parser.add_argument('--measure', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure_memory(args.statement, args.workers)
+        return
+
+    uri = os.environ.get('BENCH_DATABASE_URI',
+                         'sqlite:///' + os.path.abspath(args.database))
+    if args.statement == STATEMENT:
+        build(uri)
+    # A worker, not the flask command: no FLASK_RUN_FROM_CLI.
+    env = {key: value for key, value in os.environ.items()
+           if key != 'FLASK_RUN_FROM_CLI'}
+    env.update(DATABASE_URL=uri, PYTHONPATH=os.getcwd())
+
+    profiles = [import_profile(args.statement, env)
+                for i in range(args.runs)]
+    print('import time: %.1f ms (median of %d)'
+          % (statistics.median(total for total, _ in profiles) / 1000.0,
+             args.runs))
+    names = set()
+    for _, packages in profiles:
+        names.update(packages)
+    costs = sorted(((statistics.median(packages.get(name, 0)
+                                       for _, packages in profiles), name)
+                    for name in names), reverse=True)
+    for cost, name in costs[:args.top]:
+        print('  %-24s %8.1f ms' % (name, cost / 1000.0))
+
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.imports', '--measure',
+         '--statement', args.statement, '--workers', str(args.workers)],
+        env=env)
+    results = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    print()
+    print('%-8s %12s %14s   (per worker, median of %d)'
+          % ('model', 'RSS MiB', 'private MiB', args.workers))
+    for model in ('lazy', 'master', 'preload'):
+        rss = statistics.median(rss for rss, _ in results[model])
+        private = statistics.median(private for _, private in results[model])
+        print('%-8s %12.1f %14.1f' % (model, rss / 1024.0, private / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
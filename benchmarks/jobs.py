@@ -0,0 +1,110 @@
+"""Write latency with post-commit work queued as jobs, and queue overhead.
+
+Usage:
+    python -m benchmarks.jobs [size ...]
+
+For each size (default 1000 10000; N venues, N artists, 10 * N shows from
+benchmarks.catalog, suggested matches built) edits a seeking venue's and a
+seeking artist's genres REQUESTS times and reports, in ms:
+
+- ``request``: the POST, which queues a matches.refresh job;
+- ``job``: running that job afterwards (``jobs.run_pending``);
+- ``inline``: their sum, what the request cost when the refresh ran in it.
+
+Then times NOOP_JOBS jobs that do nothing through ``enqueue`` (one
+transaction each) and ``run_pending``, which is the queue's own cost per
+job.
+
+Jobs are run in the benchmark's thread (JOBS_WORKERS = 0). Runs against
+in-memory SQLite unless BENCH_DATABASE_URI points at another database.
+"""
+import os
+import sys
+import time
+
+import jobs
+import matching
+from models import db, Artist, Venue
+from benchmarks.catalog import generate
+from benchmarks.routes import Driver, app, percentile
+
+SIZES = (1000, 10000)
+SHOWS_PER_SIZE = 10
+REQUESTS = 20
+NOOP_JOBS = 2000
+GENRES = (['Jazz', 'Blues'], ['Jazz', 'Folk'])
+
+
+@jobs.queue.handler('bench.noop')
+def noop():
+    pass
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def edits(driver, size):
+    venue = Venue.query.filter(Venue.seeking_talent).first().id
+    artist = Artist.query.filter(Artist.seeking_venue).first().id
+    db.session.remove()
+    for label, url, form in (
+            ('venue', '/venues/%d/edit' % venue, driver.venue_form),
+            ('artist', '/artists/%d/edit' % artist, driver.artist_form)):
+        request_times, job_times = [], []
+        for i in range(REQUESTS):
+            data = form('Edited %d' % i)
+            data['genres'] = GENRES[i % 2]
+            elapsed, response = timed(
+                lambda: driver.client.post(url, data=data))
+            assert response.status_code < 400, response.status_code
+            request_times.append(elapsed)
+            elapsed, (succeeded, failed) = timed(jobs.run_pending)
+            assert succeeded and not failed
+            job_times.append(elapsed)
+        inline = [a + b for a, b in zip(request_times, job_times)]
+        print('%8d  %-7s %12.1f %12.1f %12.1f'
+              % (size, label, percentile(request_times, 0.5),
+                 percentile(job_times, 0.5), percentile(inline, 0.5)))
+
+
+def overhead():
+    started = time.perf_counter()
+    for i in range(NOOP_JOBS):
+        jobs.enqueue(db.session, 'bench.noop')
+        db.session.commit()
+    queued = time.perf_counter() - started
+    started = time.perf_counter()
+    succeeded, failed = jobs.run_pending()
+    ran = time.perf_counter() - started
+    assert succeeded == NOOP_JOBS and not failed
+    print('%d no-op jobs: enqueue + commit %.2f ms each, claim + run + '
+          'record %.2f ms each' % (NOOP_JOBS, queued * 1000 / NOOP_JOBS,
+                                   ran * 1000 / NOOP_JOBS))
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    app.config['WTF_CSRF_ENABLED'] = True
+    app.config['JOBS_WORKERS'] = 0
+    client = app.test_client()
+    print('%8s  %-7s %12s %12s %12s   (ms, median of %d)'
+          % ('size', 'edit', 'request', 'job', 'inline', REQUESTS))
+    with app.app_context():
+        for size in sizes:
+            db.drop_all()
+            db.create_all()
+            generate(size, size, size * SHOWS_PER_SIZE)
+            matching.rebuild_matches()
+            edits(Driver(client, [], []), size)
+        overhead()
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Cost of scoring seeking artists against seeking venues.
+
+Usage:
+    python -m benchmarks.matching [entities ...]
+
+Two parts:
+
+- ``score``: for each size (default 10000 50000) encodes that many random
+  artists and venues with ``matching.encode`` and finds both sides' best
+  MATCHES_PER_ENTITY with ``matching.score_all``, i.e. the whole
+  size x size score matrix, one block of artists at a time. ``loop`` times
+  the same scoring as a Python loop over pairs on a sample of artists and
+  extrapolates.
+- ``db``: seeds DB_SIZE venues and artists (about a third of them seeking)
+  with the catalog generator, then times ``flask matches rebuild`` and the
+  refreshes that follow editing one artist's genres, then its state.
+
+Runs against in-memory SQLite; set BENCH_DATABASE_URI to a migrated
+Postgres database instead.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import matching
+from app import create_app
+from enums import Genres, States
+from models import db, Artist
+from benchmarks.catalog import generate
+
+app = create_app()
+
+SIZES = (10000, 50000)
+K = 10
+BLOCK = 1024
+LOOP_SAMPLE = 20
+DB_SIZE = 20000
+DB_SHOWS = 100000
+
+
+def features(rng, count, artists):
+    masks = np.zeros(count, np.int64)
+    for i in range(3):
+        masks |= 1 << rng.integers(0, len(Genres), count)
+    states = rng.integers(0, len(States), count)
+    history = rng.poisson(0.5, (count, len(Genres))).astype(np.float32)
+    return matching.encode(masks, states, history, artists)
+
+
+def loop(artists, venues):
+    """Seconds a Python loop over pairs takes for LOOP_SAMPLE artists."""
+    artists = artists[:LOOP_SAMPLE].tolist()
+    venues = venues.tolist()
+    started = time.perf_counter()
+    for artist in artists:
+        scores = [sum(a * v for a, v in zip(artist, venue))
+                  for venue in venues]
+        sorted(range(len(scores)), key=scores.__getitem__)[-K:]
+    return time.perf_counter() - started
+
+
+def score(sizes):
+    rng = np.random.default_rng(1)
+    print('%8s %12s %12s %14s' % ('entities', 'encode s', 'score s',
+                                  'loop s (est.)'))
+    for size in sizes:
+        started = time.perf_counter()
+        artists = features(rng, size, True)
+        venues = features(rng, size, False)
+        encoded = time.perf_counter() - started
+        started = time.perf_counter()
+        matching.score_all(artists, venues, K, BLOCK)
+        scored = time.perf_counter() - started
+        estimate = loop(artists, venues) * size / LOOP_SAMPLE
+        print('%8d %12.2f %12.2f %14.0f' % (size, encoded, scored, estimate))
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def database():
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(DB_SIZE, DB_SIZE, DB_SHOWS)
+        rebuild_time, stored = timed(matching.rebuild_matches)
+        print('rebuild  %d venues, %d artists, %d shows: %d matches in '
+              '%.2f s' % (DB_SIZE, DB_SIZE, DB_SHOWS, stored, rebuild_time))
+        artist = Artist.query.filter(Artist.seeking_venue).first()
+        artist.genres = ['Jazz', 'Blues']
+        app.config['MATCH_REFRESH'] = False
+        db.session.commit()
+        refresh_time, redone = timed(matching.refresh_matches, [artist.id])
+        print('refresh  one artist\'s genres edited: %d lists in %.2f s'
+              % (redone, refresh_time))
+        artist.state = 'TX' if artist.state != 'TX' else 'CA'
+        db.session.commit()
+        # As queued by the commit hook: the partners' histories stand.
+        refresh_time, redone = timed(matching.refresh_matches, [artist.id],
+                                     [], [], [])
+        print('refresh  one artist\'s state edited: %d lists in %.2f s'
+              % (redone, refresh_time))
+        db.session.remove()
+        db.drop_all()
+
+
+def main():
+    score([int(size) for size in sys.argv[1:]] or SIZES)
+    database()
+
+
+if __name__ == '__main__':
+    main()
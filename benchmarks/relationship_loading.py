@@ -0,0 +1,110 @@
+"""Per-route query count, rows fetched and latency for the read routes.
+
+Usage:
+    python -m benchmarks.relationship_loading
+
+Rows are counted by replaying every SELECT a route issued as
+``SELECT count(*) FROM (...)`` after the request, so they include rows
+pulled in by eager relationship loads. Set BENCH_DATABASE_URI to run
+against Postgres instead of in-memory SQLite.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app import create_app
+from models import db, Venue, Artist, Show
+
+app = create_app()
+
+VENUES = 200
+ARTISTS = 200
+SHOWS = 5000
+REPEAT = 20
+
+
+def seed(rng):
+    now = datetime.now()
+    venues = [Venue(name='Venue %d' % i, genres=['Jazz'], address='1 Main',
+                    city='City %d' % (i % 20), state='NY')
+              for i in range(VENUES)]
+    artists = [Artist(name='Artist %d' % i, genres=['Jazz'], city='Austin',
+                      state='TX')
+               for i in range(ARTISTS)]
+    db.session.add_all(venues + artists)
+    db.session.flush()
+    db.session.add_all([
+        Show(venue_id=rng.choice(venues).id, artist_id=rng.choice(artists).id,
+             start_time=now + timedelta(days=rng.randint(-365, 365)))
+        for _ in range(SHOWS)
+    ])
+    db.session.commit()
+
+
+def busiest(model, foreign_key):
+    return db.session.query(foreign_key).group_by(foreign_key).order_by(
+        db.func.count(Show.id).desc()).limit(1).scalar()
+
+
+def profile(client, url, engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, (url, response.status_code)
+
+    with engine.connect() as connection:
+        rows = sum(connection.exec_driver_sql(
+            'SELECT count(*) FROM (%s) AS q' % statement, parameters
+        ).scalar() for statement, parameters in statements)
+
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        client.get(url)
+    elapsed = (time.perf_counter() - started) * 1000 / REPEAT
+    return len(statements), rows, elapsed
+
+
+def main():
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    client = app.test_client()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(random.Random(0))
+        venue_id = busiest(Venue, Show.venue_id)
+        artist_id = busiest(Artist, Show.artist_id)
+        urls = [
+            '/venues',
+            '/artists',
+            '/shows',
+            '/venues/search?search_term=Venue',
+            '/artists/search?search_term=Artist',
+            '/venues/%d' % venue_id,
+            '/artists/%d' % artist_id,
+            '/venues/%d/edit' % venue_id,
+            '/artists/%d/edit' % artist_id,
+        ]
+
+        print('%d venues, %d artists, %d shows' % (VENUES, ARTISTS, SHOWS))
+        print('%-36s %8s %8s %10s' % ('route', 'queries', 'rows', 'ms'))
+        for url in urls:
+            queries, rows, elapsed = profile(client, url, db.engine)
+            print('%-36s %8d %8d %10.2f' % (url, queries, rows, elapsed))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
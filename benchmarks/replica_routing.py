@@ -0,0 +1,66 @@
+"""Show read-replica routing with two SQLite files standing in for the
+primary and the replica.
+
+Usage:
+    python -m benchmarks.replica_routing [--pin-seconds 1]
+
+Both files get the schema; the "replica" is never written, so any venue
+created through the app is only visible when a read goes to the primary.
+The script creates a venue, then reads /api/venues straight away (pinned
+to the primary: the venue is there), after the pin expires (replica: it is
+not) and with a fresh client that never wrote (replica).
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pin-seconds', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='fyyur-replica-')
+    primary = os.path.join(directory, 'primary.db')
+    replica = os.path.join(directory, 'replica.db')
+    # config.py reads these at import time.
+    os.environ['DATABASE_URL'] = 'sqlite:///' + primary
+    os.environ['DATABASE_REPLICA_URL'] = 'sqlite:///' + replica
+    os.environ['DB_READ_YOUR_WRITES_SECONDS'] = str(args.pin_seconds)
+
+    from app import create_app
+    from models import db
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = True
+
+    with app.app_context():
+        db.create_all()
+        db.Model.metadata.create_all(db.get_engine(app, bind='replica'))
+
+    def venue_names(client):
+        data = client.get('/api/venues').get_json()['data']
+        return [venue['name'] for venue in data]
+
+    writer = app.test_client()
+    html = writer.get('/venues/create').data.decode('utf-8')
+    token = re.search(r'name="csrf_token"[^>]*value="([^"]+)"',
+                      html).group(1)
+    writer.post('/venues/create', data={
+        'csrf_token': token, 'name': 'Primary Only', 'city': 'Austin',
+        'state': 'TX', 'address': '1 Main St', 'phone': '512-555-0100',
+        'genres': ['Jazz'], 'image_link': 'https://example.com/v.jpg',
+        'facebook_link': 'https://facebook.com/v',
+        'website_link': 'https://example.com'})
+
+    print('primary: %s' % primary)
+    print('replica: %s' % replica)
+    print('writer, right after POST:    %s' % venue_names(writer))
+    time.sleep(args.pin_seconds + 0.5)
+    print('writer, after pin expired:   %s' % venue_names(writer))
+    print('other visitor, never wrote:  %s' % venue_names(app.test_client()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Drive every route in app.py at several catalog sizes.
+
+Usage:
+    python -m benchmarks.routes [--sizes 100 1000 10000] [--requests 30]
+
+A size of N means N venues, N artists and 10 * N shows from
+benchmarks.catalog. For each route the report shows latency percentiles
+(ms), mean queries per request and peak Python memory allocated while
+serving it (tracemalloc, which also inflates latencies somewhat; compare
+runs with each other rather than with production timings).
+
+Runs against in-memory SQLite unless BENCH_DATABASE_URI points at another
+database (Postgres must already be migrated; its tables are dropped and
+recreated).
+"""
+import argparse
+import os
+import re
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app import create_app
+from cache import page_cache
+from models import db
+from benchmarks import count_queries
+from benchmarks.catalog import generate
+
+app = create_app()
+
+SHOWS_PER_SIZE = 10
+FIRST_FREE_SLOT = datetime(2030, 1, 1, 20)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Driver(object):
+
+    def __init__(self, client, venue_ids, artist_ids):
+        self.client = client
+        self.venue_ids = venue_ids
+        self.artist_ids = artist_ids
+        html = client.get('/venues/create').data.decode('utf-8')
+        self.csrf_token = re.search(
+            r'name="csrf_token"[^>]*value="([^"]+)"', html).group(1)
+        self.created = 0
+
+    def revalidate(self, url):
+        """Conditional GET with the ETag of a fresh response."""
+        etag = self.client.get(url).headers['ETag']
+        return lambda i: self.client.get(url,
+                                         headers={'If-None-Match': etag})
+
+    def form(self, **fields):
+        fields['csrf_token'] = self.csrf_token
+        return fields
+
+    def venue_form(self, name):
+        return self.form(name=name, city='Austin', state='TX',
+                         address='1 Bench St', phone='512-555-0100',
+                         genres=['Jazz', 'Blues'],
+                         image_link='https://example.com/v.jpg',
+                         facebook_link='https://facebook.com/v',
+                         website_link='https://example.com',
+                         seeking_talent='y', seeking_description='Bench')
+
+    def artist_form(self, name):
+        return self.form(name=name, city='Austin', state='TX',
+                         phone='512-555-0100', genres=['Jazz'],
+                         image_link='https://example.com/a.jpg',
+                         facebook_link='https://facebook.com/a',
+                         website_link='https://example.com',
+                         seeking_venue='y', seeking_description='Bench')
+
+    def requests(self):
+        """(label, callable) for every route; each callable issues one
+        request and takes the iteration number."""
+        client = self.client
+        venue = self.venue_ids[0]
+        artist = self.artist_ids[0]
+        deletable = list(reversed(self.venue_ids[1:]))
+
+        def name(i):
+            self.created += 1
+            return 'Bench %d' % self.created
+
+        return [
+            ('GET /', lambda i: client.get('/')),
+            ('GET /venues', lambda i: client.get('/venues')),
+            ('GET /venues (304)', self.revalidate('/venues')),
+            ('GET /venues?genre&state', lambda i: client.get(
+                '/venues?genre=Rock_n_Roll&genre=Pop&state=NY')),
+            ('GET /venues/search', lambda i: client.get(
+                '/venues/search?search_term=blue')),
+            ('POST /venues/search', lambda i: client.post(
+                '/venues/search', data=self.form(search_term='club'))),
+            ('GET /venues/<id>', lambda i: client.get('/venues/%d' % venue)),
+            ('GET /venues/<id> (304)', self.revalidate('/venues/%d' % venue)),
+            ('GET /venues/create', lambda i: client.get('/venues/create')),
+            ('POST /venues/create', lambda i: client.post(
+                '/venues/create', data=self.venue_form(name(i)))),
+            ('GET /venues/<id>/edit', lambda i: client.get(
+                '/venues/%d/edit' % venue)),
+            ('POST /venues/<id>/edit', lambda i: client.post(
+                '/venues/%d/edit' % venue,
+                data=self.venue_form('Edited %d' % i))),
+            ('GET /artists', lambda i: client.get('/artists')),
+            ('GET /artists?genre', lambda i: client.get(
+                '/artists?genre=Jazz')),
+            ('GET /artists/search', lambda i: client.get(
+                '/artists/search?search_term=velvet')),
+            ('POST /artists/search', lambda i: client.post(
+                '/artists/search', data=self.form(search_term='band'))),
+            ('GET /artists/<id>', lambda i: client.get(
+                '/artists/%d' % artist)),
+            ('GET /artists/create', lambda i: client.get('/artists/create')),
+            ('POST /artists/create', lambda i: client.post(
+                '/artists/create', data=self.artist_form(name(i)))),
+            ('GET /artists/<id>/edit', lambda i: client.get(
+                '/artists/%d/edit' % artist)),
+            ('POST /artists/<id>/edit', lambda i: client.post(
+                '/artists/%d/edit' % artist,
+                data=self.artist_form('Edited %d' % i))),
+            ('GET /shows', lambda i: client.get('/shows')),
+            ('GET /shows/create', lambda i: client.get('/shows/create')),
+            # One show a day after the catalog ends, so none conflicts.
+            ('POST /shows/create', lambda i: client.post(
+                '/shows/create', data=self.form(
+                    artist_id=str(artist), venue_id=str(venue),
+                    start_time=(FIRST_FREE_SLOT + timedelta(days=i))
+                    .strftime('%Y-%m-%d %H:%M:%S')))),
+            ('GET /api/venues', lambda i: client.get('/api/venues')),
+            ('GET /api/venues/<id>', lambda i: client.get(
+                '/api/venues/%d' % venue)),
+            ('GET /api/artists/<id>', lambda i: client.get(
+                '/api/artists/%d' % artist)),
+            ('GET /api/shows', lambda i: client.get('/api/shows')),
+            ('DELETE /venues/<id>', lambda i: client.delete(
+                '/venues/%d' % deletable.pop(),
+                headers={'X-CSRFToken': self.csrf_token})),
+        ]
+
+
+def measure(label, request, iterations, engine):
+    latencies = []
+    queries = 0
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(iterations):
+        with count_queries(engine) as counter:
+            started = time.perf_counter()
+            response = request(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries += counter['queries']
+        assert response.status_code < 400, (label, response.status_code)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'queries': float(queries) / iterations,
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def run(size, iterations):
+    client = app.test_client()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        app.extensions.pop('search', None)
+        page_cache.backend.clear()
+
+        started = time.perf_counter()
+        venue_ids, artist_ids = generate(size, size, size * SHOWS_PER_SIZE)
+        print('\n%d venues, %d artists, %d shows (generated in %.1f s)'
+              % (size, size, size * SHOWS_PER_SIZE,
+                 time.perf_counter() - started))
+        print('%-26s %9s %9s %9s %8s %10s'
+              % ('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries',
+                 'peak KiB'))
+
+        driver = Driver(client, venue_ids, artist_ids)
+        for label, request in driver.requests():
+            stats = measure(label, request, iterations, db.engine)
+            print('%-26s %9.2f %9.2f %9.2f %8.1f %10.1f'
+                  % (label, stats['p50'], stats['p95'], stats['p99'],
+                     stats['queries'], stats['peak_kib']))
+        db.session.remove()
+        db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    app.config['WTF_CSRF_ENABLED'] = True
+    # Writes are timed without their queued jobs running alongside.
+    app.config['JOBS_WORKERS'] = 0
+    tracemalloc.start()
+    for size in args.sizes:
+        run(size, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Cost of a booking conflict check as a venue's schedule grows.
+
+Usage:
+    python -m benchmarks.schedule [shows ...]
+
+For each size (default 10000 100000 1000000) seeds that many back-to-back
+shows over 10 venues and 10 artists, then times:
+
+- ``scan``: fetching the venue's and the artist's shows and comparing each
+  with the proposal, which is what a check without an index costs;
+- ``check``: ``schedule.find_conflicts`` for one proposal;
+- ``batch``: ``find_conflicts`` for 5000 proposals at once, per proposal.
+
+Against SQLite the in-memory interval trees are measured (their one-off
+build is reported separately); set BENCH_DATABASE_URI to a migrated
+Postgres database to measure the exclusion constraints' GiST indexes.
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from models import db, Venue, Artist, Show
+from schedule import find_conflicts, get_schedule
+
+app = create_app()
+
+VENUES = ARTISTS = 10
+SLOT = timedelta(hours=3)
+FIRST_SHOW = datetime(2020, 1, 1, 18)
+REPEAT = 200
+SCAN_REPEAT = 5
+BATCH = 5000
+
+
+def seed(shows):
+    db.session.execute(Venue.__table__.insert(), [
+        {'name': 'Venue %d' % i, 'genres': ['Jazz'], 'city': 'Austin',
+         'state': 'TX', 'address': '%d Main St' % i}
+        for i in range(VENUES)])
+    db.session.execute(Artist.__table__.insert(), [
+        {'name': 'Artist %d' % i, 'genres': ['Jazz'], 'city': 'Austin',
+         'state': 'TX'}
+        for i in range(ARTISTS)])
+    batch = []
+    for i in range(shows):
+        # Venue i % 10 and artist i % 10 each play every tenth slot.
+        batch.append({'venue_id': i % VENUES + 1,
+                      'artist_id': i % ARTISTS + 1,
+                      'start_time': FIRST_SHOW + (i // VENUES) * SLOT,
+                      'duration_minutes': 120,
+                      'is_past': True})
+        if len(batch) == 10000:
+            db.session.execute(Show.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Show.__table__.insert(), batch)
+    db.session.commit()
+
+
+def proposals(shows, count, rng):
+    last = FIRST_SHOW + (shows // VENUES) * SLOT
+    span = int((last - FIRST_SHOW).total_seconds() // 60)
+    return [{'venue_id': rng.randint(1, VENUES),
+             'artist_id': rng.randint(1, ARTISTS),
+             'start_time': FIRST_SHOW + timedelta(
+                 minutes=rng.randrange(0, span, 30)),
+             'duration_minutes': 60} for i in range(count)]
+
+
+def scan(booking):
+    start = booking['start_time']
+    end = start + timedelta(minutes=booking['duration_minutes'])
+    rows = db.session.query(Show.start_time, Show.duration_minutes).filter(
+        (Show.venue_id == booking['venue_id']) |
+        (Show.artist_id == booking['artist_id'])).all()
+    return [row for row in rows if row.start_time < end and
+            row.start_time + timedelta(minutes=row.duration_minutes) > start]
+
+
+def per_call_us(func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - started) * 1e6 / len(items)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    rng = random.Random(0)
+
+    print('%10s %10s %10s %10s %10s   %s'
+          % ('shows', 'build ms', 'scan us', 'check us', 'batch us',
+             'backend'))
+    with app.app_context():
+        for shows in sizes:
+            db.drop_all()
+            db.create_all()
+            app.extensions.pop('schedule', None)
+            seed(shows)
+            schedule = get_schedule()
+
+            started = time.perf_counter()
+            find_conflicts(proposals(shows, 1, rng))
+            build_ms = (time.perf_counter() - started) * 1000
+
+            scan_us = per_call_us(scan, proposals(shows, SCAN_REPEAT, rng))
+            check_us = per_call_us(lambda booking: find_conflicts([booking]),
+                                   proposals(shows, REPEAT, rng))
+            batch = proposals(shows, BATCH, rng)
+            started = time.perf_counter()
+            find_conflicts(batch)
+            batch_us = (time.perf_counter() - started) * 1e6 / BATCH
+
+            print('%10d %10.1f %10.1f %10.1f %10.1f   %s'
+                  % (shows, build_ms, scan_us, check_us, batch_us,
+                     type(schedule).__name__))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare venue search against the legacy ``name LIKE '%term%'`` scan.
+
+Usage:
+    python -m benchmarks.search [rows]
+
+Seeds ``rows`` venues (default 100000) and times both paths for a handful
+of terms. Against SQLite the in-memory inverted index is measured; set
+BENCH_DATABASE_URI to a migrated Postgres database to measure the
+tsvector/pg_trgm path instead.
+"""
+import os
+import random
+import sys
+import time
+
+from app import create_app
+from models import db, Venue
+from search import get_backend
+
+app = create_app()
+
+WORDS = ('Blue', 'Note', 'Jazz', 'Club', 'Hall', 'Room', 'Stage', 'Park',
+         'Dueling', 'Pianos', 'Musical', 'Hop', 'Bar', 'Lounge', 'Garden',
+         'Empire', 'Velvet', 'Underground', 'Fillmore', 'Station')
+CITIES = (('New York', 'NY'), ('San Francisco', 'CA'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'))
+GENRES = ('Jazz', 'Blues', 'Rock n Roll', 'Folk', 'Classical', 'Hip-Hop')
+TERMS = ('jazz', 'blue note', 'fillmor', 'austin', 'velv', 'nothing here')
+REPEAT = 5
+
+
+def seed(rows, rng):
+    batch = []
+    for i in range(rows):
+        city, state = rng.choice(CITIES)
+        batch.append({
+            'name': ' '.join(rng.sample(WORDS, 3)) + ' %d' % i,
+            'genres': rng.sample(GENRES, 2),
+            'address': '%d Main St' % i,
+            'city': city,
+            'state': state
+        })
+        if len(batch) == 10000:
+            db.session.execute(Venue.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Venue.__table__.insert(), batch)
+    db.session.commit()
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000 / REPEAT
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(rows, random.Random(0))
+        backend = get_backend()
+        print('%d venues, backend %s' % (rows, type(backend).__name__))
+
+        started = time.perf_counter()
+        backend.search(Venue, 'warmup', 1)
+        print('first search (includes any index build): %.1f ms'
+              % ((time.perf_counter() - started) * 1000))
+
+        print('%-14s %12s %8s %12s %8s'
+              % ('term', 'LIKE ms', 'hits', 'search ms', 'hits'))
+        for term in TERMS:
+            def like():
+                for _ in range(REPEAT):
+                    found = db.session.query(Venue.id, Venue.name).filter(
+                        Venue.name.like('%' + term + '%')).all()
+                return len(found)
+
+            def search():
+                for _ in range(REPEAT):
+                    count, page = backend.search(Venue, term, 30)
+                return count
+
+            like_hits, like_ms = timed(like)
+            hits, search_ms = timed(search)
+            print('%-14s %12.2f %8d %12.2f %8d'
+                  % (term, like_ms, like_hits, search_ms, hits))
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Worker cold start: time until the first responses of a fresh process.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--database PATH]
+
+Each run starts a new interpreter, imports the app and requests /, /venues
+and /shows once each through the test client, as a freshly spawned worker
+would. It reports the median over --runs of:
+
+- ``startup``: importing app.py and calling create_app(), including any
+  template warmup;
+- the latency of each route's first request;
+- ``ready``: startup plus the three first requests.
+
+Modes:
+
+- ``lazy``: no bytecode cache, no warmup. Each template compiles on its
+  first use, which was the behaviour before the cache existed;
+- ``warmup``: no bytecode cache, every template compiled at startup;
+- ``cold``: warmup with an empty bytecode cache (the first worker after a
+  deploy, which fills the cache);
+- ``warm``: warmup with a filled bytecode cache (every later worker);
+- ``cached``: a filled bytecode cache but no warmup.
+
+Builds (once) a small SQLite catalog; set BENCH_DATABASE_URI to use a
+migrated Postgres instead.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROUTES = ('/', '/venues', '/shows')
+MODES = ('lazy', 'warmup', 'cold', 'warm', 'cached')
+
+
+def build(uri):
+    from app import create_app
+    from models import db, Show
+    from benchmarks.catalog import generate
+    app = create_app()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Show.id).count() == 0:
+            generate(200, 200, 2000)
+
+
+def measure():
+    """Start the app in this process and print a JSON result."""
+    started = time.perf_counter()
+    from app import create_app
+    app = create_app()
+    startup = time.perf_counter() - started
+    client = app.test_client()
+    result = {'startup': startup}
+    for route in ROUTES:
+        request_started = time.perf_counter()
+        response = client.get(route)
+        assert response.status_code == 200, (route, response.status_code)
+        result[route] = time.perf_counter() - request_started
+    result['ready'] = time.perf_counter() - started
+    print(json.dumps(result))
+
+
+def run(uri, cache_dir, warmup):
+    env = dict(os.environ, DATABASE_URL=uri,
+               JINJA_BYTECODE_CACHE_DIR=cache_dir,
+               TEMPLATE_WARMUP='1' if warmup else '0')
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.startup', '--measure'], env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--database', default='/tmp/fyyur-startup-bench.db')
+    parser.add_argument('--measure', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure()
+        return
+
+    uri = os.environ.get('BENCH_DATABASE_URI',
+                         'sqlite:///' + os.path.abspath(args.database))
+    build(uri)
+    columns = ('startup',) + ROUTES + ('ready',)
+    print('%-7s' % 'mode' + ''.join('%11s' % column for column in columns)
+          + '   (ms, median of %d)' % args.runs)
+    cache_dir = tempfile.mkdtemp(prefix='fyyur-jinja-')
+    try:
+        for mode in MODES:
+            results = []
+            for i in range(args.runs):
+                if mode == 'cold':
+                    shutil.rmtree(cache_dir)
+                    os.makedirs(cache_dir)
+                results.append(run(
+                    uri, '' if mode in ('lazy', 'warmup') else cache_dir,
+                    warmup=mode not in ('lazy', 'cached')))
+            print('%-7s' % mode + ''.join(
+                '%11.1f' % (statistics.median(
+                    result[column] for result in results) * 1000)
+                for column in columns))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
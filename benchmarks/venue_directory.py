@@ -0,0 +1,68 @@
+"""Check that /venues issues a constant number of queries.
+
+Usage:
+    python -m benchmarks.venue_directory
+
+Set BENCH_DATABASE_URI to run against Postgres instead of in-memory SQLite.
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from models import db, Venue, Artist, Show
+from benchmarks import count_queries
+
+app = create_app()
+
+SIZES = (10, 100, 1000, 5000)
+
+
+def seed(num_venues, rng):
+    now = datetime.now()
+    artist = Artist(name='Bench Artist', genres=['Jazz'], city='Austin',
+                    state='TX')
+    db.session.add(artist)
+    db.session.flush()
+    venues = [Venue(name='Venue %d' % i, genres=['Jazz'], address='1 Main',
+                    city='City %d' % (i % 50), state='TX')
+              for i in range(num_venues)]
+    db.session.add_all(venues)
+    db.session.flush()
+    db.session.add_all([
+        Show(artist_id=artist.id, venue_id=venue.id,
+             start_time=now + timedelta(days=rng.randint(-365, 365)))
+        for venue in venues for _ in range(3)
+    ])
+    db.session.commit()
+
+
+def main():
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'BENCH_DATABASE_URI', 'sqlite://')
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    rng = random.Random(0)
+    counts = []
+
+    with app.app_context():
+        for size in SIZES:
+            db.drop_all()
+            db.create_all()
+            seed(size, rng)
+            with count_queries(db.engine) as counter:
+                started = time.perf_counter()
+                response = client.get('/venues')
+                elapsed = time.perf_counter() - started
+            assert response.status_code == 200, response.status_code
+            counts.append(counter['queries'])
+            print('%6d venues: %2d queries, %8.2f ms'
+                  % (size, counter['queries'], elapsed * 1000))
+        db.drop_all()
+
+    assert len(set(counts)) == 1, 'query count grows with catalog: %r' % counts
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+from models import Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Detail page cache.
+#
+# Caches the context built for show_venue()/show_artist() keyed by entity
+# id. Rendered HTML is not cached because every page embeds the visitor's
+# CSRF token and flashed messages. Entries are dropped after commits that
+# touch the entity (see the session hooks below), when their TTL runs out,
+# or when their earliest upcoming show starts.
+# ----------------------------------------------------------------------------#
+
+
+class CacheBackend(object):
+    """Interface for cache stores. Values must be plain JSON-like data so a
+    shared store (Redis, memcached) can be dropped in through the
+    PAGE_CACHE_BACKEND setting.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocalCache(CacheBackend):
+    """In-process LRU with per-entry expiry. Each worker has its own copy,
+    so invalidations only reach the worker that handled the write; the TTL
+    bounds staleness elsewhere.
+    """
+
+    def __init__(self, max_entries):
+        super(LocalCache, self).__init__(max_entries)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def venue_key(venue_id):
+    return 'venue:%s' % venue_id
+
+
+def artist_key(artist_id):
+    return 'artist:%s' % artist_id
+
+
+class PageCache(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'cache.LocalCache')
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('PAGE_CACHE_TTL', 300)
+        backend = app.config['PAGE_CACHE_BACKEND']
+        if isinstance(backend, str):
+            backend = import_string(backend)
+        app.extensions['page_cache'] = backend(
+            app.config['PAGE_CACHE_MAX_ENTRIES'])
+
+    @property
+    def backend(self):
+        return current_app.extensions['page_cache']
+
+    def get_or_build(self, key, build):
+        """Return the cached value for ``key`` or call ``build()``, which
+        returns ``(value, next_change)``. ``next_change`` is the datetime at
+        which the value goes stale on its own (e.g. the next upcoming show
+        starts) or None.
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+
+        value, next_change = build()
+        ttl = current_app.config['PAGE_CACHE_TTL']
+        if next_change is not None:
+            ttl = min(ttl, (next_change - datetime.now()).total_seconds())
+        if ttl > 0:
+            self.backend.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+
+page_cache = PageCache()
+
+# ----------------------------------------------------------------------------#
+# Invalidation.
+#
+# A venue page lists its shows' artist names and images; an artist page
+# lists its shows' venue names and images. Any commit that changes one of
+# those, or adds/removes a show, drops the pages that display it.
+# ----------------------------------------------------------------------------#
+
+DISPLAYED_ON_OTHER_PAGES = ('name', 'image_link')
+
+shows = Show.__table__
+
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stale_pages(session, flush_context):
+    stale = session.info.setdefault('stale_pages', set())
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Show):
+            stale.add(venue_key(obj.venue_id))
+            stale.add(artist_key(obj.artist_id))
+        elif isinstance(obj, Venue):
+            stale.add(venue_key(obj.id))
+            if obj in session.dirty and \
+                    _changed(obj, DISPLAYED_ON_OTHER_PAGES):
+                stale.update(artist_key(artist_id) for artist_id, in
+                             session.connection().execute(
+                                 select([shows.c.artist_id]).where(
+                                     shows.c.venue_id == obj.id).distinct()))
+        elif isinstance(obj, Artist):
+            stale.add(artist_key(obj.id))
+            if obj in session.dirty and \
+                    _changed(obj, DISPLAYED_ON_OTHER_PAGES):
+                stale.update(venue_key(venue_id) for venue_id, in
+                             session.connection().execute(
+                                 select([shows.c.venue_id]).where(
+                                     shows.c.artist_id == obj.id).distinct()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_stale_pages(session):
+    stale = session.info.pop('stale_pages', None)
+    if stale and has_app_context() and \
+            'page_cache' in current_app.extensions:
+        page_cache.invalidate(*stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_pages(session):
+    session.info.pop('stale_pages', None)
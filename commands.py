@@ -0,0 +1,183 @@
+import time
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+import assets
+import counters
+import export
+import geo
+import importer
+import jobs
+import matching
+
+# ----------------------------------------------------------------------------#
+# Commands.
+#
+# Registered by create_app() only when the app is loaded by the flask
+# command, so web workers never import the importer or its forms.
+# ----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters',
+                        help='Maintain upcoming/past show counters.')
+
+
+@counters_cli.command('roll')
+def roll_counters():
+    """Move shows that have started from upcoming to past."""
+    moved = counters.roll_forward()
+    click.echo('Moved %d shows from upcoming to past.' % moved)
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters():
+    """Recount every venue and artist from the shows table."""
+    counters.rebuild()
+    click.echo('Show counters rebuilt.')
+
+
+assets_cli = AppGroup('assets', help='Build static assets.')
+
+
+@assets_cli.command('build')
+def build_assets():
+    """Bundle, minify, fingerprint and precompress static/."""
+    manifest = assets.build(current_app._get_current_object())
+    click.echo('Built %d assets into %s.'
+               % (len(manifest.files),
+                  current_app.config['ASSETS_DIRECTORY']))
+
+
+geo_cli = AppGroup('geo', help='Place venues and artists on the map.')
+
+
+@geo_cli.command('geocode')
+@click.option('--overwrite', is_flag=True,
+              help='Re-locate rows that already have coordinates.')
+def geocode(overwrite):
+    """Set coordinates from the bundled city table."""
+    located, unknown = geo.geocode_all(overwrite=overwrite)
+    click.echo('Located %d venues and artists; %d are in cities missing '
+               'from %s.' % (located, unknown, geo.CITIES_PATH))
+
+
+matches_cli = AppGroup('matches',
+                       help='Maintain suggested artist-venue matches.')
+
+
+@matches_cli.command('rebuild')
+def rebuild_matches():
+    """Score every seeking artist against every seeking venue."""
+    stored = matching.rebuild_matches()
+    click.echo('Stored %d matches.' % stored)
+
+
+jobs_cli = AppGroup('jobs', help='Inspect and run background jobs.')
+
+
+def _seconds(summary):
+    if summary is None:
+        return '-'
+    return 'mean %(mean).3f s, p50 %(p50).3f s, p95 %(p95).3f s, ' \
+        'max %(max).3f s' % summary
+
+
+@jobs_cli.command('stats')
+def job_stats():
+    """Show queue depth and recent wait and run times."""
+    stats = jobs.stats()
+    for state in jobs.STATES:
+        counts = stats['depth'].get(state, {})
+        click.echo(('%-8s %6d  %s' % (
+            state, sum(counts.values()),
+            ', '.join('%s: %d' % item for item in sorted(counts.items()))
+        )).rstrip())
+    if stats['oldest_due_seconds'] is not None:
+        click.echo('Oldest due job waiting %.1f s.'
+                   % stats['oldest_due_seconds'])
+    click.echo('Finished in the last %s: %d'
+               % (jobs.STATS_WINDOW, stats['finished']))
+    click.echo('  wait: %s' % _seconds(stats['wait']))
+    click.echo('  run:  %s' % _seconds(stats['run']))
+
+
+@jobs_cli.command('work')
+@click.option('--once', is_flag=True,
+              help='Run the jobs due now, then exit.')
+def work(once):
+    """Run jobs in the foreground until interrupted."""
+    while True:
+        succeeded, failed = jobs.run_pending()
+        if succeeded or failed:
+            click.echo('Ran %d jobs, %d failed.' % (succeeded + failed,
+                                                    failed))
+        if once:
+            return
+        time.sleep(current_app.config['JOBS_POLL_SECONDS'])
+
+
+@jobs_cli.command('retry')
+def retry_jobs():
+    """Queue failed jobs again."""
+    click.echo('Queued %d failed jobs again.' % jobs.retry_failed())
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=7, show_default=True,
+              help='Keep done jobs finished this recently.')
+def purge_jobs(days):
+    """Delete old done jobs."""
+    deleted = jobs.purge(timedelta(days=days))
+    click.echo('Deleted %d done jobs.' % deleted)
+
+
+@click.command('import-data')
+@click.argument('entity', type=click.Choice(sorted(importer.ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=importer.BATCH_SIZE, show_default=True,
+              help='Rows validated and written per transaction.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows '
+                   '(default: <path>.rejects.<ext>).')
+@with_appcontext
+def import_data(entity, path, batch_size, rejects_path):
+    """Bulk load venues, artists or shows from a CSV or JSONL file."""
+    def progress(stats):
+        click.echo('%d rows read, %d loaded, %d rejected (%.0f rows/s)'
+                   % (stats.read, stats.loaded, stats.rejected,
+                      stats.rows_per_second))
+
+    stats = importer.import_file(entity, path, rejects_path=rejects_path,
+                                 batch_size=batch_size, progress=progress)
+    click.echo('Imported %d %s in %.1f s (%.0f rows/s).'
+               % (stats.loaded, entity, stats.elapsed,
+                  stats.rows_per_second))
+    if stats.rejects_path:
+        click.echo('%d rejected rows written to %s.'
+                   % (stats.rejected, stats.rejects_path))
+    if stats.loaded:
+        click.echo('Run `flask matches rebuild` to update suggested '
+                   'matches.')
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(sorted(export.ENTITIES)))
+@click.option('--output', '-o', type=click.Path(dir_okay=False),
+              help='File to write (default: stdout). Gzipped if it ends in '
+                   '.gz.')
+@click.option('--gzip', 'compress', is_flag=True,
+              help='Gzip the output.')
+@with_appcontext
+def export_data(entity, output, compress):
+    """Stream venues, artists or shows as newline-delimited JSON."""
+    compress = compress or bool(output and output.endswith('.gz'))
+    with click.open_file(output or '-', 'wb') as stream:
+        count = export.write_export(entity, stream, compress=compress)
+    if output:
+        click.echo('Exported %d %s to %s.' % (count, entity, output))
+
+
+def init_app(app):
+    for command in (counters_cli, assets_cli, geo_cli, matches_cli, jobs_cli,
+                    import_data, export_data):
+        app.cli.add_command(command)
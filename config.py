@@ -1,5 +1,6 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Set SECRET_KEY when running several workers, so they share sessions
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -9,6 +10,104 @@ DEBUG = True
 # Disable csrf protection
 # WTF_CSRF_ENABLED = False
 
-# Connect to the database
-SQLALCHEMY_DATABASE_URI = 'postgresql://zmunisi:@localhost:5432/fyyur'
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url(value):
+    # Heroku still hands out postgres:// URLs, which SQLAlchemy 1.4 rejects.
+    if value and value.startswith('postgres://'):
+        return 'postgresql://' + value[len('postgres://'):]
+    return value
+
+
+# Connect to the database. Reads in GET requests go to DATABASE_REPLICA_URL
+# when it is set (see database.py)
+SQLALCHEMY_DATABASE_URI = database_url(os.environ.get(
+    'DATABASE_URL', 'postgresql://zmunisi:@localhost:5432/fyyur'))
+SQLALCHEMY_BINDS = {}
+if os.environ.get('DATABASE_REPLICA_URL'):
+    SQLALCHEMY_BINDS['replica'] = database_url(
+        os.environ['DATABASE_REPLICA_URL'])
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per engine and per worker process: size the pool so
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays under max_connections
+DB_POOL_SIZE = env_int('DB_POOL_SIZE', 5)
+DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+# Seconds after which a connection is replaced; -1 keeps them forever
+DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+DB_POOL_PRE_PING = env_flag('DB_POOL_PRE_PING', True)
+# Postgres statement_timeout in milliseconds; 0 disables it
+DB_STATEMENT_TIMEOUT_MS = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+# How long a visitor reads from the primary after writing
+DB_READ_YOUR_WRITES_SECONDS = env_int('DB_READ_YOUR_WRITES_SECONDS', 5)
+
+# Rows per page on paginated listings; clients may ask for fewer or more
+# with ?per_page= up to MAX_PER_PAGE
+PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+# /venues/near searches this many km around the origin unless asked for a
+# different radius, up to MAX_NEAR_RADIUS_KM
+NEAR_RADIUS_KM = 50
+MAX_NEAR_RADIUS_KM = 500
+
+# Suggested matches (see matching.py): each seeking artist and venue keeps
+# its best MATCHES_PER_ENTITY, scored MATCH_BLOCK_SIZE rows at a time.
+# MATCH_REFRESH queues a job to update them after each commit that affects
+# them; without it, run `flask matches rebuild`
+MATCHES_PER_ENTITY = env_int('MATCHES_PER_ENTITY', 10)
+MATCH_BLOCK_SIZE = env_int('MATCH_BLOCK_SIZE', 1024)
+MATCH_REFRESH = env_flag('MATCH_REFRESH', True)
+
+# Background jobs (see jobs.py): each process runs up to JOBS_WORKERS at a
+# time, 0 leaving them to `flask jobs work`. A failed job is retried after
+# JOBS_BACKOFF_SECONDS, doubled per attempt up to JOBS_MAX_BACKOFF_SECONDS,
+# and given up after JOBS_MAX_ATTEMPTS; one running for longer than
+# JOBS_TIMEOUT_SECONDS is assumed lost and queued again
+JOBS_WORKERS = env_int('JOBS_WORKERS', 2)
+JOBS_POLL_SECONDS = env_int('JOBS_POLL_SECONDS', 5)
+JOBS_MAX_ATTEMPTS = env_int('JOBS_MAX_ATTEMPTS', 5)
+JOBS_BACKOFF_SECONDS = env_int('JOBS_BACKOFF_SECONDS', 2)
+JOBS_MAX_BACKOFF_SECONDS = env_int('JOBS_MAX_BACKOFF_SECONDS', 600)
+JOBS_TIMEOUT_SECONDS = env_int('JOBS_TIMEOUT_SECONDS', 600)
+
+# Detail page cache (see cache.py); point PAGE_CACHE_BACKEND at a shared
+# store implementation when running several workers
+PAGE_CACHE_BACKEND = 'cache.LocalCache'
+PAGE_CACHE_MAX_ENTRIES = 1024
+PAGE_CACHE_TTL = 300
+
+# Past shows listed on a venue or artist page; "Load more" fetches the next
+# batch
+PAST_SHOWS_LIMIT = 12
+
+# Add a Server-Timing header (db, render, total) to every response
+METRICS_SERVER_TIMING = False
+
+# Set JINJA_BYTECODE_CACHE_DIR to a writable directory to cache compiled
+# templates on disk (see templating.py), shared by every worker on the
+# host; by default each worker keeps them in memory only. TEMPLATE_WARMUP
+# compiles every template when the app starts
+JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', '')
+TEMPLATE_WARMUP = env_flag('TEMPLATE_WARMUP', False)
+
+# Built static assets (see assets.py): `flask assets build` writes them to
+# ASSETS_DIRECTORY and they are served from ASSETS_URL_PATH, cached by
+# browsers for ASSETS_MAX_AGE seconds
+ASSETS_DIRECTORY = os.path.join(basedir, 'static', 'dist')
+ASSETS_URL_PATH = '/assets'
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# Outside debug mode, log INFO and above here; empty to log only to stderr
+ERROR_LOG = os.environ.get('ERROR_LOG', 'error.log')
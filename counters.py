@@ -0,0 +1,130 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import bindparam, event, func, select
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Upcoming/past show counters.
+#
+# ``Venue`` and ``Artist`` carry ``upcoming_shows_count`` and
+# ``past_shows_count`` so listings can read one integer per row. Each show
+# records which of the two it was counted in (``Show.is_past``). Inserts and
+# deletes adjust the counters in the same flush; ``roll_forward`` moves shows
+# whose start time has passed from upcoming to past and should run
+# periodically (``flask counters roll`` from cron).
+# ----------------------------------------------------------------------------#
+
+venues = Venue.__table__
+artists = Artist.__table__
+shows = Show.__table__
+
+ROLL_BATCH = 1000
+
+
+def _adjust(table, key, upcoming, past):
+    return table.update().where(table.c.id == key).values(
+        upcoming_shows_count=table.c.upcoming_shows_count + upcoming,
+        past_shows_count=table.c.past_shows_count + past
+    )
+
+
+def _counted(target):
+    return (0, 1) if target.is_past else (1, 0)
+
+
+@event.listens_for(Show, 'before_insert')
+def _classify_show(mapper, connection, target):
+    start_time = target.start_time
+    if isinstance(start_time, str):
+        import dateutil.parser
+        start_time = target.start_time = dateutil.parser.parse(start_time)
+    target.is_past = start_time <= datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_show(mapper, connection, target):
+    upcoming, past = _counted(target)
+    connection.execute(_adjust(venues, target.venue_id, upcoming, past))
+    connection.execute(_adjust(artists, target.artist_id, upcoming, past))
+
+
+@event.listens_for(Show, 'after_delete')
+def _uncount_show(mapper, connection, target):
+    upcoming, past = _counted(target)
+    connection.execute(_adjust(venues, target.venue_id, -upcoming, -past))
+    connection.execute(_adjust(artists, target.artist_id, -upcoming, -past))
+
+
+def roll_forward(now=None):
+    """Move shows that have started since the last run from the upcoming to
+    the past counters. Returns the number of shows moved.
+    """
+    if now is None:
+        now = datetime.now()
+
+    due = db.session.query(Show.id, Show.venue_id, Show.artist_id).filter(
+        Show.is_past.is_(False),
+        Show.start_time <= now
+    ).with_for_update().all()
+    if not due:
+        db.session.commit()
+        return 0
+
+    adjust_params = [
+        (venues, Counter(show.venue_id for show in due)),
+        (artists, Counter(show.artist_id for show in due))
+    ]
+    for table, counts in adjust_params:
+        stmt = _adjust(table, bindparam('key'), -bindparam('moved'),
+                       bindparam('moved'))
+        db.session.execute(stmt, [{'key': key, 'moved': moved}
+                                  for key, moved in counts.items()])
+
+    ids = [show.id for show in due]
+    for i in range(0, len(ids), ROLL_BATCH):
+        db.session.execute(shows.update().where(
+            shows.c.id.in_(ids[i:i + ROLL_BATCH])).values(is_past=True))
+    db.session.commit()
+    return len(ids)
+
+
+def count_inserted(rows):
+    """Add shows inserted outside the ORM to the counters. ``rows`` are
+    dicts with ``venue_id``, ``artist_id`` and ``is_past``; the update runs
+    in the caller's transaction.
+    """
+    for table, key in ((venues, 'venue_id'), (artists, 'artist_id')):
+        totals = defaultdict(lambda: [0, 0])
+        for row in rows:
+            totals[row[key]][1 if row['is_past'] else 0] += 1
+        stmt = _adjust(table, bindparam('key'), bindparam('upcoming'),
+                       bindparam('past'))
+        db.session.execute(stmt, [
+            {'key': id, 'upcoming': upcoming, 'past': past}
+            for id, (upcoming, past) in totals.items()
+        ])
+
+
+def rebuild(now=None):
+    """Reclassify every show and recount every venue and artist from
+    scratch, for bulk loads that bypass the ORM or to repair drift.
+    """
+    if now is None:
+        now = datetime.now()
+
+    db.session.execute(shows.update().values(
+        is_past=shows.c.start_time <= now))
+    for table, foreign_key in ((venues, shows.c.venue_id),
+                               (artists, shows.c.artist_id)):
+        def count(is_past):
+            return select([func.count(shows.c.id)]).where(
+                foreign_key == table.c.id
+            ).where(
+                shows.c.is_past.is_(is_past)
+            ).scalar_subquery()
+
+        db.session.execute(table.update().values(
+            upcoming_shows_count=count(False),
+            past_shows_count=count(True)
+        ))
+    db.session.commit()
@@ -0,0 +1,103 @@
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+
+# ----------------------------------------------------------------------------#
+# Engine tuning and read-replica routing.
+#
+# Pool settings and the statement timeout come from the DB_* config keys
+# (see config.py) and are applied per engine, so an in-memory SQLite URL in
+# the benchmarks does not receive Postgres pool options.
+#
+# When a "replica" bind is configured, sessions inside GET/HEAD/OPTIONS
+# requests read from it and everything else uses the primary. After a
+# request writes, the visitor's session is pinned to the primary for
+# DB_READ_YOUR_WRITES_SECONDS so they see their own changes despite
+# replication lag.
+# ----------------------------------------------------------------------------#
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PINNED_UNTIL = '_db_pinned_until'
+
+
+def _reading():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    if g.get('db_wrote'):
+        return False
+    return session.get(PINNED_UNTIL, 0) < time.time()
+
+
+def engine_options(config, drivername):
+    """Pool and connection options from the DB_* settings for an engine
+    using ``drivername``."""
+    options = {}
+    # SQLite is a local file on a static or null pool: nothing to size,
+    # and no connection that can go away.
+    if not drivername.startswith('sqlite'):
+        options.update(
+            pool_pre_ping=config['DB_POOL_PRE_PING'],
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+        )
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout and drivername == 'postgresql+asyncpg':
+        options['connect_args'] = {
+            'server_settings': {'statement_timeout': str(timeout)}}
+    elif timeout and drivername.startswith('postgresql'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout=%d' % timeout}
+    return options
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends reads in read-only requests to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self._flushing and _reading():
+            state = self.app.extensions['sqlalchemy']
+            if REPLICA in (self.app.config['SQLALCHEMY_BINDS'] or {}):
+                return state.db.get_engine(self.app, bind=REPLICA)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _record_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def init_app(self, app):
+        app.config.setdefault('DB_POOL_SIZE', 5)
+        app.config.setdefault('DB_MAX_OVERFLOW', 10)
+        app.config.setdefault('DB_POOL_TIMEOUT', 30)
+        app.config.setdefault('DB_POOL_RECYCLE', -1)
+        app.config.setdefault('DB_POOL_PRE_PING', False)
+        app.config.setdefault('DB_STATEMENT_TIMEOUT_MS', 0)
+        app.config.setdefault('DB_READ_YOUR_WRITES_SECONDS', 5)
+        super(RoutingSQLAlchemy, self).init_app(app)
+
+        @app.after_request
+        def pin_after_write(response):
+            if g.get('db_wrote') and \
+                    REPLICA in (app.config['SQLALCHEMY_BINDS'] or {}):
+                session[PINNED_UNTIL] = \
+                    time.time() + app.config['DB_READ_YOUR_WRITES_SECONDS']
+            return response
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        sa_url, options = super(RoutingSQLAlchemy, self).apply_driver_hacks(
+            app, sa_url, options)
+        for key, value in engine_options(app.config,
+                                         sa_url.drivername).items():
+            options.setdefault(key, value)
+        return sa_url, options
@@ -2,7 +2,11 @@ from enum import Enum
 
 
 class Genres(Enum):
-    """Holds Enum values for genres"""
+    """Holds Enum values for genres
+
+    Each genre is also a bit of the ``genre_mask`` column of venues and
+    artists, in declaration order: only ever append new genres.
+    """
 
     Alternative = 'Alternative'
     Blues = 'Blues'
@@ -28,6 +32,22 @@ class Genres(Enum):
     def choices(cls):
         return [(choice.name, choice.value) for choice in cls]
 
+    @property
+    def bit(self):
+        return 1 << list(type(self)).index(self)
+
+    @classmethod
+    def mask(cls, names):
+        """The bitmask of genre ``names``. Raises ValueError for a name
+        that is not a genre."""
+        mask = 0
+        for name in names or ():
+            try:
+                mask |= cls[name].bit
+            except KeyError:
+                raise ValueError('Unknown genre %r' % name) from None
+        return mask
+
 
 class States(Enum):
     AL = 'AL'
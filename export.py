@@ -0,0 +1,89 @@
+import json
+import zlib
+from datetime import datetime
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Streaming export.
+#
+# Dumps venues, artists or shows as newline-delimited JSON, one object per
+# row, for the warehouse. Rows are read with ``yield_per`` so the driver
+# uses a server-side cursor where it has one (psycopg2) and the ORM never
+# holds more than one batch; lines are produced by generators so the whole
+# export is never in memory, whether it goes to a file (``flask export``) or
+# over HTTP (``/export/<entity>.ndjson``).
+# ----------------------------------------------------------------------------#
+
+YIELD_PER = 1000
+# Flush compressed output roughly this often, so chunks stay reasonably
+# large without buffering the export.
+GZIP_CHUNK = 64 * 1024
+
+
+def _columns(model):
+    # These are derived from the other columns.
+    return [column for column in model.__table__.columns
+            if column.name not in ('search_vector', 'genre_mask', 'geohash')]
+
+
+ENTITIES = {
+    'venues': (_columns(Venue), Venue.id),
+    'artists': (_columns(Artist), Artist.id),
+    'shows': (_columns(Show), Show.id),
+}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def export_rows(entity, yield_per=YIELD_PER):
+    """Yield ``entity`` rows as plain dicts, in id order."""
+    columns, order = ENTITIES[entity]
+    names = [column.name for column in columns]
+    query = db.session.query(*columns).order_by(order).yield_per(yield_per)
+    for row in query:
+        yield dict(zip(names, row))
+
+
+def ndjson_lines(entity, yield_per=YIELD_PER):
+    """Yield one encoded JSON line per ``entity`` row."""
+    encode = json.JSONEncoder(default=_default, ensure_ascii=False,
+                              separators=(',', ':')).encode
+    for row in export_rows(entity, yield_per):
+        yield (encode(row) + '\n').encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip a stream of byte strings without collecting it."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(compressor.compress(chunk))
+        size += len(pending[-1])
+        if size >= GZIP_CHUNK:
+            yield b''.join(pending)
+            pending = []
+            size = 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def write_export(entity, stream, compress=False):
+    """Write ``entity`` to a binary ``stream``. Returns the number of rows
+    written."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for line in ndjson_lines(entity):
+            count += 1
+            yield line
+
+    chunks = gzip_chunks(counted()) if compress else counted()
+    for chunk in chunks:
+        stream.write(chunk)
+    return count
@@ -0,0 +1,89 @@
+from collections import namedtuple
+from sqlalchemy import func
+from enums import Genres
+from models import db
+
+# ----------------------------------------------------------------------------#
+# Faceted browsing.
+#
+# Venues and artists carry their genres as a bitmask (models.genre_mask), so
+# "has all of these genres" is ``genre_mask & selected = selected``. The
+# counts shown next to each filter come from one query grouped by
+# (state, genre_mask), read from the index on those columns; a directory
+# has far fewer distinct groups than rows, and the per-genre and per-state
+# counts are summed from the groups.
+# ----------------------------------------------------------------------------#
+
+FacetValue = namedtuple('FacetValue', 'name label count selected')
+
+
+def filter_directory(query, model, genre_mask, state):
+    """Restrict ``query`` to ``model`` rows with every genre in
+    ``genre_mask`` and, if given, in ``state``."""
+    if genre_mask:
+        query = query.filter(model.genre_mask.op('&')(genre_mask)
+                             == genre_mask)
+    if state:
+        query = query.filter(model.state == state)
+    return query
+
+
+class Facets(object):
+    """Filter counts for a directory given the current selection.
+
+    A genre's count is the number of matches if it were (or, when
+    selected, while it is) part of the selection. A state's count is the
+    number of matches in that state, whichever state is selected.
+    """
+
+    def __init__(self, groups, genre_mask, state):
+        self.genre_mask = genre_mask
+        self.state = state
+        self.total = 0
+        genre_counts = [0] * len(Genres)
+        state_counts = {}
+        for mask, group_state, count in groups:
+            if group_state:
+                state_counts[group_state] = \
+                    state_counts.get(group_state, 0) + count
+            if state and group_state != state:
+                continue
+            self.total += count
+            for i in range(len(genre_counts)):
+                if mask & (1 << i):
+                    genre_counts[i] += count
+
+        self.selected_genres = [genre.name for genre in Genres
+                                if genre_mask & genre.bit]
+        self.genres = [
+            FacetValue(genre.name, genre.value, count,
+                       bool(genre_mask & genre.bit))
+            for genre, count in zip(Genres, genre_counts)
+            if count or genre_mask & genre.bit]
+        self.states = [FacetValue(name, name, count, name == state)
+                       for name, count in sorted(state_counts.items())]
+        if state and state not in state_counts:
+            self.states.append(FacetValue(state, state, 0, True))
+
+    @property
+    def version(self):
+        """The counts the page shows, for its version (see freshness.py)."""
+        return (self.total,
+                tuple((value.name, value.count) for value in self.genres),
+                tuple((value.name, value.count) for value in self.states))
+
+    def toggle(self, name):
+        """The selected genre names with ``name`` added or removed, in
+        enum order so each selection has one URL."""
+        names = set(self.selected_genres) ^ {name}
+        return [genre.name for genre in Genres if genre.name in names]
+
+
+def facet_counts(model, genre_mask, state):
+    """Facets for ``model``'s directory, from one grouped query. The state
+    filter is applied while summing, as state counts ignore it."""
+    query = db.session.query(model.genre_mask, model.state, func.count()) \
+        .group_by(model.state, model.genre_mask) \
+        .order_by(model.state, model.genre_mask)
+    groups = filter_directory(query, model, genre_mask, None).all()
+    return Facets(groups, genre_mask, state)
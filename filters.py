@@ -0,0 +1,43 @@
+from datetime import datetime
+from functools import lru_cache
+
+# ----------------------------------------------------------------------------#
+# Date formatting.
+#
+# Babel patterns and locales are parsed once per (format, locale) and the
+# compiled pattern is applied directly. Naive datetimes are formatted as-is,
+# exactly as babel.dates.format_datetime does with its default UTC tzinfo.
+# Babel and dateutil are imported on first use, not when the app starts.
+# ----------------------------------------------------------------------------#
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_format(format, locale):
+    from babel import Locale
+    from babel.dates import parse_pattern
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    import dateutil.parser
+    return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    """Jinja ``datetime`` filter. Accepts datetimes or parseable strings."""
+    pattern, locale = compiled_format(format, locale)
+    return pattern.apply(_as_datetime(value), locale)
+
+
+def format_datetimes(values, format='medium', locale='en'):
+    """Format a whole list of timestamps with one pattern lookup, for views
+    that pre-format rows before rendering."""
+    pattern, locale = compiled_format(format, locale)
+    return [pattern.apply(_as_datetime(value), locale) for value in values]
@@ -5,10 +5,12 @@ from wtforms import (
     SelectField,
     SelectMultipleField,
     DateTimeField,
-    BooleanField
+    BooleanField,
+    IntegerField
 )
 from wtforms.validators import (
     DataRequired,
+    NumberRange,
     URL
 )
 from enums import Genres, States
@@ -27,6 +29,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
 
 
 class VenueForm(Form):
@@ -0,0 +1,77 @@
+import hashlib
+import time
+from datetime import datetime
+from flask import current_app, make_response, request, session
+
+# ----------------------------------------------------------------------------#
+# Conditional GET for HTML pages.
+#
+# Pages are versioned by a cheap aggregate over the rows they show (see
+# "Page versions" in queries.py). The ETag hashes the whole aggregate, so a
+# revalidation costs one query and no rendering. Last-Modified is only the
+# newest updated_at in it and stays put when rows leave the page, so it is
+# sent for information but never answers a revalidation on its own.
+#
+# Every page also embeds a CSRF token for the visitor's session, so the
+# validators cover the session's CSRF secret and the current half of the
+# token lifetime: a browser never keeps reusing a page whose token has
+# expired, and responses are private to the browser. The ETag also covers
+# the static asset build, as pages link assets by their fingerprinted names.
+# ----------------------------------------------------------------------------#
+
+
+def _csrf_epoch():
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not limit:
+        return None
+    step = max(1, int(limit) // 2)
+    return datetime.utcfromtimestamp(int(time.time()) // step * step)
+
+
+def validators(version):
+    """Return ``(last_modified, etag)`` for a page version row."""
+    epoch = _csrf_epoch()
+    stamps = [value for value in version if isinstance(value, datetime)]
+    if epoch is not None:
+        stamps.append(epoch)
+    last_modified = max(stamps).replace(microsecond=0) if stamps else None
+    secret = session.get(current_app.config.get('WTF_CSRF_FIELD_NAME',
+                                                'csrf_token'))
+    assets = current_app.extensions['assets'].version
+    etag = hashlib.sha1(repr((tuple(version), epoch, secret,
+                              assets)).encode('utf-8')).hexdigest()
+    return last_modified, etag
+
+
+def _not_modified(etag):
+    return etag in request.if_none_match
+
+
+def _set_validators(response, last_modified, etag):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def conditional_page(version, render):
+    """Answer 304 if the client's copy of the page at ``version`` is
+    current, otherwise ``render()`` it with validators attached.
+
+    ``version`` is None when the page's subject does not exist; ``render``
+    then runs without validators (and normally 404s).
+    """
+    if version is None:
+        return render()
+    # Flashed messages are shown once, by the next full render.
+    if '_flashes' not in session:
+        last_modified, etag = validators(version)
+        if _not_modified(etag):
+            response = current_app.response_class(status=304)
+            return _set_validators(response, last_modified, etag)
+    response = make_response(render())
+    # Rendering may have given the session its CSRF secret.
+    return _set_validators(response, *validators(version))
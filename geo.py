@@ -0,0 +1,241 @@
+import csv
+import math
+import os
+import re
+from sqlalchemy import and_, event, inspect, or_
+from models import db, Venue, Artist
+
+# ----------------------------------------------------------------------------#
+# Locations.
+#
+# Venues and artists are placed at the centre of their city, looked up in a
+# bundled table (data/cities.csv, "city,state,latitude,longitude"), so
+# geocoding needs no network service. Rows get their coordinates when they
+# are written through the ORM or the importer; `flask geo geocode` fills in
+# the rest.
+#
+# Venues also store a geohash of their position. Nearby cells share a
+# prefix, and a prefix is a contiguous range of the geohash index, so a
+# radius search reads a handful of index ranges around the origin, then
+# trims them to the bounding box and the exact radius. Its cost follows the
+# number of venues in the area, not the size of the table.
+# ----------------------------------------------------------------------------#
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'data', 'cities.csv')
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Prefixes read per search: enough to keep the covered area close to the
+# bounding box, few enough to stay a small OR of index ranges.
+MAX_CELLS = 16
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_cities = None
+
+
+# Geocoding
+# ----------------------------------------------------------------------------
+
+
+def _city_key(city, state):
+    city = re.sub(r'\s+', ' ', (city or '').strip().lower())
+    city = re.sub(r'^st\.? ', 'saint ', city)
+    return city, (state or '').strip().upper()
+
+
+def cities():
+    """``{(city, state): (latitude, longitude)}`` from the bundled table,
+    read once per process."""
+    global _cities
+    if _cities is None:
+        with open(CITIES_PATH, newline='') as stream:
+            _cities = {
+                _city_key(row['city'], row['state']):
+                    (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(stream)}
+    return _cities
+
+
+def geocode(city, state):
+    """``(latitude, longitude)`` of a city, or None if it is not in the
+    table."""
+    return cities().get(_city_key(city, state))
+
+
+def location_columns(city, state, geohash=False):
+    """The location columns for a row in ``city``, ``state``; all None for
+    a city that is not in the table."""
+    point = geocode(city, state)
+    latitude, longitude = point if point else (None, None)
+    values = {'latitude': latitude, 'longitude': longitude}
+    if geohash:
+        values['geohash'] = (encode_geohash(latitude, longitude)
+                             if point else None)
+    return values
+
+
+def _locate(target, geohash):
+    for column, value in location_columns(target.city, target.state,
+                                          geohash).items():
+        setattr(target, column, value)
+
+
+def _moved(target):
+    state = inspect(target)
+    return any(state.attrs[key].history.has_changes()
+               for key in ('city', 'state'))
+
+
+@event.listens_for(Venue, 'before_insert')
+def _locate_new_venue(mapper, connection, target):
+    _locate(target, geohash=True)
+
+
+@event.listens_for(Venue, 'before_update')
+def _locate_venue(mapper, connection, target):
+    if _moved(target):
+        _locate(target, geohash=True)
+
+
+@event.listens_for(Artist, 'before_insert')
+def _locate_new_artist(mapper, connection, target):
+    _locate(target, geohash=False)
+
+
+@event.listens_for(Artist, 'before_update')
+def _locate_artist(mapper, connection, target):
+    if _moved(target):
+        _locate(target, geohash=False)
+
+
+def geocode_all(overwrite=False):
+    """Set the coordinates of every venue and artist without them (every
+    one with ``overwrite``) from the city table, with one UPDATE per city.
+    Returns ``(located, unknown)`` row counts."""
+    located = unknown = 0
+    for model in (Venue, Artist):
+        query = db.session.query(model.city, model.state,
+                                 db.func.count()).group_by(model.city,
+                                                           model.state)
+        if not overwrite:
+            query = query.filter(model.latitude.is_(None))
+        for city, state, count in query.all():
+            values = location_columns(city, state,
+                                      geohash=model is Venue)
+            if values['latitude'] is None:
+                unknown += count
+                if not overwrite:
+                    continue
+            else:
+                located += count
+            update = model.__table__.update().where(and_(
+                model.city == city, model.state == state)).values(**values)
+            if not overwrite:
+                update = update.where(model.latitude.is_(None))
+            db.session.execute(update)
+    db.session.commit()
+    return located, unknown
+
+
+# Geohash
+# ----------------------------------------------------------------------------
+
+
+def _cell_bits(precision):
+    """Bits spent on (latitude, longitude) by a geohash of ``precision``
+    characters; longitude takes the odd one."""
+    bits = 5 * precision
+    return bits // 2, bits - bits // 2
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = ((lng_range, longitude) if even
+                                else (lat_range, latitude))
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value = bits = 0
+    return ''.join(chars)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """``(south, west, north, east)`` around a circle, clamped to the
+    poles and the antimeridian."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    south = max(-90.0, latitude - lat_delta)
+    north = min(90.0, latitude + lat_delta)
+    widest = max(abs(south), abs(north))
+    if widest >= 90.0:
+        return south, -180.0, north, 180.0
+    lng_delta = radius_km / (KM_PER_DEGREE * math.cos(math.radians(widest)))
+    return (south, max(-180.0, longitude - lng_delta),
+            north, min(180.0, longitude + lng_delta))
+
+
+def _cell_range(low, high, size, origin):
+    first = int(math.floor((low - origin) / size))
+    last = int(math.floor((min(high, -origin - 1e-9) - origin) / size))
+    return range(first, last + 1)
+
+
+def covering_prefixes(south, west, north, east, max_cells=MAX_CELLS):
+    """The geohash prefixes of the smallest cells, at most ``max_cells`` of
+    them, that together cover the box."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lng_bits = _cell_bits(precision)
+        height = 180.0 / (1 << lat_bits)
+        width = 360.0 / (1 << lng_bits)
+        rows = _cell_range(south, north, height, -90.0)
+        columns = _cell_range(west, east, width, -180.0)
+        if len(rows) * len(columns) <= max_cells or precision == 1:
+            return sorted({
+                encode_geohash(-90.0 + (row + 0.5) * height,
+                               -180.0 + (column + 0.5) * width, precision)
+                for row in rows for column in columns})
+
+
+def _prefix_end(prefix):
+    """The first geohash after every one starting with ``prefix``, or None
+    for the last prefix of its length."""
+    while prefix and prefix[-1] == _BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + _BASE32[_BASE32.index(prefix[-1]) + 1]
+
+
+def prefix_ranges(column, prefixes):
+    """Match ``column`` against geohash prefixes as index range scans.
+    Both bounds are geohashes, so the ranges hold under any collation
+    (``LIKE 'abc%'`` needs a pattern operator class on Postgres)."""
+    ranges = []
+    for prefix in prefixes:
+        end = _prefix_end(prefix)
+        ranges.append(column >= prefix if end is None
+                      else and_(column >= prefix, column < end))
+    return or_(*ranges)
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(latitude), math.radians(other_latitude)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(other_longitude - longitude)
+    a = (math.sin(d_phi / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,13 @@
+# gunicorn settings: `gunicorn -c gunicorn.conf.py`
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '5000')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+
+# create_app() opens no database connection, file or thread, so the master
+# builds the app once (imports, config, compiled templates) and the workers
+# share those pages instead of each building its own copy.
+preload_app = True
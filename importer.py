@@ -0,0 +1,373 @@
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+import counters
+from enums import Genres
+from geo import location_columns
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from schedule import InMemorySchedule, find_conflicts, get_schedule
+
+# ----------------------------------------------------------------------------#
+# Bulk import.
+#
+# Streams CSV or JSON Lines files and loads them in large batches. Venue and
+# artist rows go through VenueForm/ArtistForm so they obey exactly the rules
+# of the HTML forms. Show rows go through ShowForm and reference venues and
+# artists by id (venue_id/artist_id) or by exact name (venue_name/
+# artist_name), resolved one batch at a time, and must not overlap another
+# booking of their venue or artist (see schedule.py). Rows that fail are
+# written, with their errors, to a rejects file next to the input.
+#
+# CSV list fields (genres) are separated by ';'. Venue and artist rows are
+# written with their genre_mask and location (see geo.py), which COPY
+# cannot fill in.
+# ----------------------------------------------------------------------------#
+
+BATCH_SIZE = 5000
+
+VENUE_COLUMNS = ('name', 'genres', 'address', 'city', 'state', 'phone',
+                 'website_link', 'facebook_link', 'seeking_talent',
+                 'seeking_description', 'image_link')
+ARTIST_COLUMNS = ('name', 'genres', 'city', 'state', 'phone', 'website_link',
+                  'facebook_link', 'seeking_venue', 'seeking_description',
+                  'image_link')
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time', 'duration_minutes',
+                'is_past')
+
+# Columns derived from the validated ones.
+VENUE_DERIVED = ('genre_mask', 'latitude', 'longitude', 'geohash')
+ARTIST_DERIVED = ('genre_mask', 'latitude', 'longitude')
+
+LIST_FIELDS = ('genres',)
+
+
+class ImportStats(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.loaded = 0
+        self.rejected = 0
+        self.rejects_path = None
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.read / elapsed if elapsed else 0.0
+
+
+# Readers and writers
+# ----------------------------------------------------------------------------
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    return 'jsonl' if extension in ('.jsonl', '.ndjson') else 'csv'
+
+
+def read_rows(stream, format):
+    """Yield ``(row, errors)`` for each input row, one line at a time. A
+    JSON line that is not an object is yielded as ``{'line': ...}`` with
+    its errors, so it can be rejected without ending the import; errors is
+    None otherwise."""
+    if format == 'jsonl':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield ({'line': line.rstrip('\r\n')},
+                       {'line': ['Line %d is not valid JSON: %s'
+                                 % (number, error)]})
+                continue
+            if not isinstance(row, dict):
+                yield ({'line': line.rstrip('\r\n')},
+                       {'line': ['Line %d is not a JSON object.' % number]})
+                continue
+            yield row, None
+    else:
+        for row in csv.DictReader(stream):
+            for field in LIST_FIELDS:
+                if row.get(field) is not None:
+                    row[field] = [value.strip()
+                                  for value in row[field].split(';')
+                                  if value.strip()]
+            yield row, None
+
+
+class RejectWriter(object):
+    """Writes failed rows in the input format, plus an ``errors`` field.
+    The file is only created once the first row is rejected."""
+
+    def __init__(self, path, format):
+        self.path = path
+        self.format = format
+        self.stream = None
+        self.writer = None
+
+    def write(self, row, errors):
+        row = dict(row, errors=errors)
+        if self.stream is None:
+            self.stream = open(self.path, 'w', newline='')
+        if self.format == 'jsonl':
+            self.stream.write(json.dumps(row, default=str) + '\n')
+            return
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.stream, fieldnames=list(row),
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+        for field in LIST_FIELDS:
+            if isinstance(row.get(field), list):
+                row[field] = ';'.join(row[field])
+        row['errors'] = json.dumps(errors)
+        self.writer.writerow(row)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+
+# Validation
+# ----------------------------------------------------------------------------
+
+
+def _formdata(row):
+    formdata = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            formdata.setlist(key, [str(item) for item in value])
+        elif isinstance(value, bool):
+            # BooleanField treats any submitted value but 'false' as checked.
+            if value:
+                formdata[key] = 'y'
+        elif value is not None:
+            formdata[key] = str(value)
+    return formdata
+
+
+def validate_with(form_class, columns, geohash=False):
+    def validate(row):
+        form = form_class(formdata=_formdata(row), meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        values = {column: form.data[column] for column in columns}
+        values['genre_mask'] = Genres.mask(values['genres'])
+        values.update(location_columns(values['city'], values['state'],
+                                       geohash=geohash))
+        return values, None
+    return validate
+
+
+def resolve_show_batch(rows):
+    """Validate a batch of show rows, resolve their venue and artist
+    references with one query per referenced table and check the batch for
+    booking conflicts in one pass. Returns ``(valid, rejected)`` where
+    rejected holds ``(row, errors)``.
+    """
+    now = datetime.now()
+    parsed = []
+    rejected = []
+    for row in rows:
+        form = ShowForm(formdata=_formdata(row), meta={'csrf': False})
+        if not form.validate():
+            rejected.append((row, form.errors))
+        else:
+            parsed.append((row, form.start_time.data,
+                           form.duration_minutes.data))
+
+    lookups = {}
+    for model, key in ((Venue, 'venue'), (Artist, 'artist')):
+        ids = {int(row[key + '_id']) for row, _, _ in parsed
+               if str(row.get(key + '_id') or '').isdigit()}
+        names = {row[key + '_name'] for row, _, _ in parsed
+                 if not row.get(key + '_id') and row.get(key + '_name')}
+        by_id = set()
+        if ids:
+            by_id = {id for id, in db.session.query(model.id).filter(
+                model.id.in_(ids))}
+        by_name = {}
+        if names:
+            for id, name in db.session.query(model.id, model.name).filter(
+                    model.name.in_(names)):
+                # Ambiguous names resolve to nothing.
+                by_name[name] = None if name in by_name else id
+        lookups[key] = (by_id, by_name)
+
+    resolved_rows = []
+    for row, start_time, duration in parsed:
+        resolved = {}
+        errors = {}
+        for key in ('venue', 'artist'):
+            by_id, by_name = lookups[key]
+            value = row.get(key + '_id')
+            if value:
+                id = int(value) if str(value).isdigit() else None
+                if id not in by_id:
+                    errors[key + '_id'] = ['Unknown %s id.' % key]
+            else:
+                id = by_name.get(row.get(key + '_name'))
+                if id is None:
+                    errors[key + '_name'] = ['Unknown or ambiguous %s name.'
+                                             % key]
+            resolved[key + '_id'] = id
+        if errors:
+            rejected.append((row, errors))
+        else:
+            resolved['start_time'] = start_time
+            resolved['duration_minutes'] = duration
+            resolved['is_past'] = start_time <= now
+            resolved_rows.append((row, resolved))
+
+    valid = []
+    conflicts = find_conflicts([resolved for _, resolved in resolved_rows])
+    for (row, resolved), errors in zip(resolved_rows, conflicts):
+        if errors:
+            rejected.append((row, errors))
+        else:
+            valid.append(resolved)
+    return valid, rejected
+
+
+# Loading
+# ----------------------------------------------------------------------------
+
+
+def _copy_value(value, null):
+    if value is None:
+        return null
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{%s}' % ','.join(
+            '"%s"' % item.replace('\\', '\\\\').replace('"', '\\"')
+            for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def copy_rows(table, columns, rows):
+    """Load rows through Postgres COPY on the session's connection.
+
+    CSV COPY reads an unquoted empty field as NULL, whereas the insert path
+    stores ''. Every string is therefore quoted, and NULL is spelled with a
+    marker no value can equal, so both paths store the same values.
+    """
+    null = uuid.uuid4().hex
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([_copy_value(row[column], null)
+                         for column in columns])
+    buffer.seek(0)
+    names = ', '.join(columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '%s', "
+            "FORCE_NULL (%s))" % (table.name, names, null, names), buffer)
+    finally:
+        cursor.close()
+
+
+def insert_rows(table, columns, rows):
+    db.session.execute(table.insert(), [
+        {column: row[column] for column in columns} for row in rows])
+
+
+def write_batch(table, columns, rows):
+    if db.engine.dialect.name == 'postgresql':
+        copy_rows(table, columns, rows)
+    else:
+        insert_rows(table, columns, rows)
+
+
+ENTITIES = {
+    'venues': (Venue.__table__, VENUE_COLUMNS + VENUE_DERIVED,
+               validate_with(VenueForm, VENUE_COLUMNS, geohash=True)),
+    'artists': (Artist.__table__, ARTIST_COLUMNS + ARTIST_DERIVED,
+                validate_with(ArtistForm, ARTIST_COLUMNS)),
+    'shows': (Show.__table__, SHOW_COLUMNS, None),
+}
+
+
+def import_file(entity, path, rejects_path=None, batch_size=BATCH_SIZE,
+                progress=None):
+    """Import ``path`` into ``entity`` ('venues', 'artists' or 'shows'),
+    committing once per batch. Returns ImportStats.
+    """
+    table, columns, validate = ENTITIES[entity]
+    format = file_format(path)
+    if rejects_path is None:
+        root, extension = os.path.splitext(path)
+        rejects_path = root + '.rejects' + extension
+    rejects = RejectWriter(rejects_path, format)
+    stats = ImportStats()
+    schedule = get_schedule() if entity == 'shows' else None
+    # Core inserts bypass the session hooks that keep an in-memory schedule
+    # current, so loaded shows are recorded by hand and the schedule is
+    # rebuilt (with their ids) after the import.
+    in_memory = isinstance(schedule, InMemorySchedule)
+
+    def flush(batch):
+        if entity == 'shows':
+            valid, rejected = resolve_show_batch(batch)
+        else:
+            valid, rejected = [], []
+            for row in batch:
+                values, errors = validate(row)
+                if errors:
+                    rejected.append((row, errors))
+                else:
+                    valid.append(values)
+        for row, errors in rejected:
+            rejects.write(row, errors)
+        try:
+            if valid:
+                write_batch(table, columns, valid)
+                if entity == 'shows':
+                    counters.count_inserted(valid)
+            db.session.commit()
+        except Exception:
+            # Earlier batches stay committed; leave the session usable.
+            db.session.rollback()
+            raise
+        if in_memory:
+            schedule.record(valid)
+        stats.loaded += len(valid)
+        stats.rejected += len(rejected)
+        if progress is not None:
+            progress(stats)
+
+    try:
+        with open(path, newline='') as stream:
+            batch = []
+            for row, errors in read_rows(stream, format):
+                stats.read += 1
+                if errors:
+                    rejects.write(row, errors)
+                    stats.rejected += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        rejects.close()
+        if in_memory:
+            schedule.reset()
+    stats.rejects_path = rejects_path if stats.rejected else None
+    return stats
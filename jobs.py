@@ -0,0 +1,322 @@
+import threading
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from models import db, Job
+
+# ----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Work that need not hold up the response, such as refreshing suggested
+# matches, runs as a job. Handlers register under a name with
+# ``@queue.handler(name)``; ``enqueue(session, name, **payload)`` writes a
+# jobs row in the session's transaction, so a job exists exactly when the
+# write that asked for it was committed, and survives a restart. The
+# session's after_commit hook then wakes this process's workers.
+#
+# Each serving process starts a dispatcher thread on its first request. It
+# claims due jobs (queued, run_after passed) with a conditional UPDATE, so
+# several processes can share the table, and hands them to a pool of
+# JOBS_WORKERS threads, never claiming more than the pool has free. It also
+# polls every JOBS_POLL_SECONDS for jobs queued by other processes or due
+# for a retry. A failed job is retried after JOBS_BACKOFF_SECONDS, doubling
+# per attempt up to JOBS_MAX_BACKOFF_SECONDS, and is left failed after
+# JOBS_MAX_ATTEMPTS. Jobs still running after JOBS_TIMEOUT_SECONDS (their
+# process died) are queued again.
+#
+# With JOBS_WORKERS = 0, jobs are only run by `flask jobs work`.
+# ----------------------------------------------------------------------------#
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+STATES = (QUEUED, RUNNING, DONE, FAILED)
+
+# Finished jobs summarized by stats()
+STATS_WINDOW = timedelta(hours=1)
+
+jobs = Job.__table__
+
+ClaimedJob = namedtuple('ClaimedJob', 'id name payload attempts')
+
+
+class JobQueue(object):
+
+    def __init__(self, app=None):
+        self.handlers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_POLL_SECONDS', 5)
+        app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOBS_BACKOFF_SECONDS', 2)
+        app.config.setdefault('JOBS_MAX_BACKOFF_SECONDS', 600)
+        app.config.setdefault('JOBS_TIMEOUT_SECONDS', 600)
+        app.extensions['jobs'] = WorkerPool(app, self.handlers)
+        # Started per process, after any fork, rather than at import.
+        app.before_request(self._start)
+
+    def _start(self):
+        current_app.extensions['jobs'].start()
+
+    def handler(self, name):
+        """Register the decorated function to run jobs called ``name``; it
+        is called with the job's payload as keyword arguments."""
+        def register(function):
+            self.handlers[name] = function
+            return function
+        return register
+
+
+queue = JobQueue()
+
+
+def enqueue(session, name, **payload):
+    """Queue job ``name`` in ``session``'s transaction. ``payload`` must
+    be JSON serializable. Safe to call from flush hooks."""
+    now = datetime.utcnow()
+    session.connection().execute(jobs.insert().values(
+        name=name, payload=payload, state=QUEUED, attempts=0,
+        created_at=now, run_after=now))
+    session.info['jobs_queued'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_queued', None) and has_app_context() and \
+            'jobs' in current_app.extensions:
+        current_app.extensions['jobs'].wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_jobs(session):
+    session.info.pop('jobs_queued', None)
+
+
+# Running
+# ----------------------------------------------------------------------------
+
+
+def claim(limit, now=None):
+    """Mark up to ``limit`` due jobs as running and return them, oldest
+    first. Jobs another process claims first are skipped."""
+    if now is None:
+        now = datetime.utcnow()
+    timeout = timedelta(seconds=current_app.config['JOBS_TIMEOUT_SECONDS'])
+    claimed = []
+    with db.engine.begin() as connection:
+        connection.execute(jobs.update().where(
+            jobs.c.state == RUNNING,
+            jobs.c.started_at < now - timeout
+        ).values(state=QUEUED, run_after=now))
+        due = connection.execute(select(
+            jobs.c.id, jobs.c.name, jobs.c.payload, jobs.c.attempts
+        ).where(
+            jobs.c.state == QUEUED,
+            jobs.c.run_after <= now
+        ).order_by(jobs.c.run_after, jobs.c.id).limit(limit)).all()
+        for job in due:
+            taken = connection.execute(jobs.update().where(
+                jobs.c.id == job.id,
+                jobs.c.state == QUEUED
+            ).values(state=RUNNING, started_at=now,
+                     attempts=jobs.c.attempts + 1))
+            if taken.rowcount:
+                claimed.append(ClaimedJob(job.id, job.name, job.payload,
+                                          job.attempts + 1))
+    return claimed
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts``
+    times."""
+    config = current_app.config
+    return min(config['JOBS_BACKOFF_SECONDS'] * 2 ** (attempts - 1),
+               config['JOBS_MAX_BACKOFF_SECONDS'])
+
+
+def perform(job, handlers):
+    """Run a claimed job and record the outcome. Returns True if it
+    succeeded."""
+    handler = handlers.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError('No handler for job %r' % job.name)
+        handler(**job.payload)
+    except Exception:
+        current_app.logger.exception('Job %d (%s) failed', job.id, job.name)
+        error = traceback.format_exc()
+        succeeded = False
+        db.session.rollback()
+    else:
+        succeeded = True
+
+    now = datetime.utcnow()
+    if succeeded:
+        values = dict(state=DONE, finished_at=now, last_error=None)
+    elif handler is None or \
+            job.attempts >= current_app.config['JOBS_MAX_ATTEMPTS']:
+        values = dict(state=FAILED, finished_at=now, last_error=error)
+    else:
+        values = dict(state=QUEUED, last_error=error,
+                      run_after=now + timedelta(seconds=backoff(job.attempts)))
+    with db.engine.begin() as connection:
+        # A run that overstayed JOBS_TIMEOUT_SECONDS has lost its claim;
+        # only the current holder may record the outcome
+        connection.execute(jobs.update().where(
+            jobs.c.id == job.id, jobs.c.state == RUNNING,
+            jobs.c.attempts == job.attempts).values(**values))
+    return succeeded
+
+
+def run_pending(handlers=None):
+    """Run every due job in this thread, one at a time. Returns
+    ``(succeeded, failed)`` counts."""
+    if handlers is None:
+        handlers = queue.handlers
+    succeeded = failed = 0
+    while True:
+        claimed = claim(1)
+        if not claimed:
+            return succeeded, failed
+        if perform(claimed[0], handlers):
+            succeeded += 1
+        else:
+            failed += 1
+
+
+class WorkerPool(object):
+    """A process's dispatcher thread and job threads for one app."""
+
+    def __init__(self, app, handlers):
+        self.app = app
+        self.handlers = handlers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._dispatcher = None
+        self._executor = None
+        self._busy = 0
+        self._size = 0
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        with self._lock:
+            size = self.app.config['JOBS_WORKERS']
+            if self._dispatcher is not None or not size:
+                return
+            self._size = size
+            self._executor = ThreadPoolExecutor(
+                size, thread_name_prefix='fyyur-job')
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name='fyyur-jobs', daemon=True)
+            self._dispatcher.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _dispatch(self):
+        while True:
+            self._wakeup.wait(self.app.config['JOBS_POLL_SECONDS'])
+            self._wakeup.clear()
+            with self._lock:
+                free = self._size - self._busy
+            if not free:
+                continue
+            try:
+                with self.app.app_context():
+                    claimed = claim(free)
+            except Exception:
+                self.app.logger.exception('Claiming jobs failed')
+                continue
+            with self._lock:
+                self._busy += len(claimed)
+            for job in claimed:
+                self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            with self.app.app_context():
+                perform(job, self.handlers)
+        except Exception:
+            self.app.logger.exception('Recording job %d failed', job.id)
+        finally:
+            with self._lock:
+                self._busy -= 1
+            # More may be due; a free thread is the cue to look.
+            self._wakeup.set()
+
+
+# Inspection
+# ----------------------------------------------------------------------------
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _summary(seconds):
+    seconds = sorted(seconds)
+    if not seconds:
+        return None
+    return {'mean': sum(seconds) / len(seconds),
+            'p50': _percentile(seconds, 0.5),
+            'p95': _percentile(seconds, 0.95),
+            'max': seconds[-1]}
+
+
+def stats(now=None):
+    """Queue depth by state and name, the age of the oldest due job, and
+    wait (queued to last started) and run times of the jobs finished in the
+    last STATS_WINDOW."""
+    if now is None:
+        now = datetime.utcnow()
+    depth = {state: {} for state in STATES}
+    for state, name, count in db.session.query(
+            Job.state, Job.name, func.count()).group_by(Job.state, Job.name):
+        depth.setdefault(state, {})[name] = count
+    oldest = db.session.query(func.min(Job.run_after)).filter(
+        Job.state == QUEUED, Job.run_after <= now).scalar()
+    finished = db.session.query(
+        Job.created_at, Job.started_at, Job.finished_at
+    ).filter(
+        Job.state.in_((DONE, FAILED)),
+        Job.finished_at >= now - STATS_WINDOW
+    ).all()
+    return {
+        'depth': depth,
+        'oldest_due_seconds': (now - oldest).total_seconds()
+        if oldest else None,
+        'finished': len(finished),
+        'wait': _summary([(started - created).total_seconds()
+                          for created, started, _ in finished]),
+        'run': _summary([(done - started).total_seconds()
+                         for _, started, done in finished]),
+    }
+
+
+def purge(older_than):
+    """Delete done jobs that finished more than ``older_than`` ago. Failed
+    jobs are kept for inspection. Returns the number deleted."""
+    deleted = db.session.execute(jobs.delete().where(
+        jobs.c.state == DONE,
+        jobs.c.finished_at < datetime.utcnow() - older_than)).rowcount
+    db.session.commit()
+    return deleted
+
+
+def retry_failed():
+    """Queue every failed job again with a fresh set of attempts."""
+    retried = db.session.execute(jobs.update().where(
+        jobs.c.state == FAILED
+    ).values(state=QUEUED, attempts=0, run_after=datetime.utcnow(),
+             finished_at=None)).rowcount
+    db.session.commit()
+    return retried
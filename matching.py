@@ -0,0 +1,627 @@
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+from enums import Genres, States
+from jobs import enqueue, queue
+from models import db, Venue, Artist, Show, Match
+
+# ----------------------------------------------------------------------------#
+# Artist-venue matching.
+#
+# Suggests venues to artists seeking one (seeking_venue) and artists to
+# venues seeking talent (seeking_talent). Each side is encoded as a NumPy
+# feature matrix whose rows are laid out so that one matrix product scores
+# every artist against every venue:
+#
+#   score = GENRE_WEIGHT * cos(artist genres, venue genres)
+#         + STATE_WEIGHT * (same state)
+#         + HISTORY_WEIGHT * (cos(artist history, venue genres)
+#                             + cos(artist genres, venue history)) / 2
+#
+# where an entity's history is the genre mix of the counterparts it has
+# shows with. Scores fall between 0 and 1. Artists are scored MATCH_BLOCK_SIZE
+# rows at a time, so memory stays bounded however large both sides are.
+# The best MATCHES_PER_ENTITY of each side are kept in the matches table.
+#
+# Commits that add, delete or edit (genres, state, seeking flag) artists or
+# venues, or that add or remove shows, queue a background job (see jobs.py)
+# that recomputes the lists of the entities involved, and of their show
+# partners when their genres changed, and merges their new scores into the
+# lists they are in or may enter. Show histories are read only for the
+# entities whose exact scores it needs.
+# Core writes such as `flask import-data` bypass the hooks; run `flask
+# matches rebuild` after them.
+# ----------------------------------------------------------------------------#
+
+GENRE_WEIGHT = 0.5
+STATE_WEIGHT = 0.3
+HISTORY_WEIGHT = 0.2
+
+# Others read to bound a row's k-th best score before selecting (see
+# score_all)
+SAMPLE = 4096
+
+# The most a score can grow once the history of one of its two entities is
+# read (see _Catalog), with a margin for float32 rounding
+SLACK = HISTORY_WEIGHT / 2 + 1e-6
+
+GENRE_BITS = len(Genres)
+STATE_INDEX = {state.value: i for i, state in enumerate(States)}
+
+matches = Match.__table__
+
+
+class _Side(object):
+
+    def __init__(self, model, seeking, own_key, other, other_key, column,
+                 flag, matched_on):
+        self.model = model
+        self.seeking = seeking
+        self.own_key = own_key
+        self.other = other
+        self.other_key = other_key
+        # The side's id column and list flag in the matches table.
+        self.column = column
+        self.flag = flag
+        self.matched_on = matched_on
+
+
+ARTISTS = _Side(Artist, Artist.seeking_venue, Show.artist_id, Venue,
+                Show.venue_id, matches.c.artist_id, matches.c.for_artist,
+                ('genres', 'state', 'seeking_venue'))
+VENUES = _Side(Venue, Venue.seeking_talent, Show.venue_id, Artist,
+               Show.artist_id, matches.c.venue_id, matches.c.for_venue,
+               ('genres', 'state', 'seeking_talent'))
+
+
+# Features
+# ----------------------------------------------------------------------------
+
+
+def _unpack(np, masks):
+    """genre_mask values as rows of 0/1 per genre."""
+    return ((masks[:, None] >> np.arange(GENRE_BITS)) & 1).astype(np.float32)
+
+
+def _normalize(np, matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def encode(masks, states, history, artists):
+    """Feature rows for entities with genre ``masks``, indexes into States
+    (-1 for none) and ``history`` (genre counts of their counterparts).
+    Artist rows carry the weights, so ``artist_rows @ venue_rows.T`` is the
+    score matrix."""
+    import numpy as np
+    genres = _normalize(np, _unpack(np, masks))
+    history = _normalize(np, history)
+    state = np.zeros((len(states), len(STATE_INDEX)), np.float32)
+    known = np.nonzero(states >= 0)[0]
+    state[known, states[known]] = 1
+    if artists:
+        blocks = (GENRE_WEIGHT * genres, STATE_WEIGHT * state,
+                  HISTORY_WEIGHT / 2 * history, HISTORY_WEIGHT / 2 * genres)
+    else:
+        blocks = (genres, state, genres, history)
+    return np.hstack(blocks).astype(np.float32)
+
+
+class _Catalog(object):
+    """The seeking entities of one side: ids in order and feature rows.
+
+    Genres and states are read for every entity, histories (an aggregate
+    over shows) for all of them or only for the rows passed to
+    ``complete``. Until then a row's history block is zero, so its scores
+    are short by at most SLACK.
+    """
+
+    def __init__(self, connection, side, histories=False):
+        import numpy as np
+        self.connection = connection
+        self.side = side
+        model = side.model
+        rows = connection.execute(
+            select(model.id, model.genre_mask, model.state)
+            .where(side.seeking).order_by(model.id)).all()
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.masks = np.array([row[1] for row in rows], dtype=np.int64)
+        self.states = np.array([STATE_INDEX.get(row[2], -1) for row in rows],
+                               dtype=np.int64)
+        if histories:
+            history = self._history(self.ids, everyone=True)
+        else:
+            history = np.zeros((len(rows), GENRE_BITS), np.float32)
+        self.features = encode(self.masks, self.states, history,
+                               side is ARTISTS)
+        self.known = np.full(len(rows), histories)
+
+    def _history(self, ids, everyone=False):
+        """Genre counts of the show partners of ``ids`` (sorted), read for
+        all seeking entities or only for ``ids``."""
+        import numpy as np
+        side = self.side
+        history = np.zeros((len(ids), GENRE_BITS), np.float32)
+        if not len(ids):
+            return history
+        statement = select(
+            side.own_key, side.other.genre_mask, func.count()
+        ).select_from(Show).join(
+            side.other, side.other_key == side.other.id
+        ).join(
+            side.model, side.own_key == side.model.id
+        ).where(side.seeking).group_by(side.own_key, side.other.genre_mask)
+        if not everyone:
+            statement = statement.where(side.own_key.in_(ids.tolist()))
+        counts = self.connection.execute(statement).all()
+        if counts:
+            owners = np.searchsorted(ids, [row[0] for row in counts])
+            other_masks = np.array([row[1] for row in counts],
+                                   dtype=np.int64)
+            weights = np.array([row[2] for row in counts], dtype=np.float32)
+            np.add.at(history, owners,
+                      _unpack(np, other_masks) * weights[:, None])
+        return history
+
+    def rows(self, ids):
+        """Sorted row indexes of those of ``ids`` that are seeking."""
+        import numpy as np
+        ids = np.fromiter(ids, np.int64)
+        ids = ids[np.isin(ids, self.ids)]
+        return np.unique(np.searchsorted(self.ids, ids))
+
+    def complete(self, rows):
+        """Read the histories of ``rows`` (sorted) not read yet."""
+        rows = rows[~self.known[rows]]
+        if not len(rows):
+            return
+        self.features[rows] = encode(
+            self.masks[rows], self.states[rows],
+            self._history(self.ids[rows]), self.side is ARTISTS)
+        self.known[rows] = True
+
+
+def load(connection, side):
+    """``(ids, features)`` of the seeking entities of ``side``, in id
+    order, from two queries."""
+    catalog = _Catalog(connection, side, histories=True)
+    return catalog.ids, catalog.features
+
+
+# Scoring
+# ----------------------------------------------------------------------------
+
+
+def _top_per_group(groups, others, scores, k):
+    """The ``k`` best ``(group, other, score)`` rows of each group, ordered
+    by group and best first; tied scores keep their input order."""
+    import numpy as np
+    # Scores lie between 0 and 1, so one float key sorts by group, then
+    # score.
+    order = np.argsort(groups * 2.0 - scores, kind='stable')
+    groups, others, scores = groups[order], others[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(groups)])
+    rank = np.arange(len(groups)) - np.repeat(starts, sizes)
+    keep = rank < k
+    return groups[keep], others[keep], scores[keep]
+
+
+def _kth(scores, k, axis):
+    """The ``k``-th highest score along ``axis``; a lower bound of nothing
+    (the smallest positive score) where there are fewer than ``k``."""
+    import numpy as np
+    floor = np.finfo(np.float32).tiny
+    size = scores.shape[axis]
+    if size < k:
+        return np.full(scores.shape[1 - axis], floor, np.float32)
+    kth = np.partition(scores, size - k, axis=axis).take(size - k, axis=axis)
+    return np.maximum(kth, floor)
+
+
+def _empty():
+    import numpy as np
+    return (np.empty(0, np.int64), np.empty(0, np.int64),
+            np.empty(0, np.float32))
+
+
+def _concat(*parts):
+    import numpy as np
+    return tuple(np.concatenate(arrays) for arrays in zip(_empty(), *parts))
+
+
+def best(catalog, rows, others, k, block):
+    """The ``k`` best ``others`` (a _Catalog) with a positive score for
+    each of ``rows`` of ``catalog``, as ``(row, other, score)`` arrays of
+    catalog indexes.
+
+    Scores against others whose histories are not read are lower bounds,
+    so each row's k-th best of them bounds its k-th best overall. Only the
+    histories of others within SLACK of that bound are read, and only
+    their scores are ranked.
+    """
+    import numpy as np
+    catalog.complete(rows)
+    slack = np.where(others.known, 0, SLACK).astype(np.float32)
+    candidates = np.zeros(len(others.ids), bool)
+    for start in range(0, len(rows), block):
+        low = catalog.features[rows[start:start + block]] @ others.features.T
+        bound = _kth(low, k, axis=1)
+        candidates |= (low + slack >= bound[:, None]).any(axis=0)
+    columns = np.flatnonzero(candidates)
+    others.complete(columns)
+    others_t = np.ascontiguousarray(others.features[columns].T)
+    parts = []
+    for start in range(0, len(rows), block):
+        scores = catalog.features[rows[start:start + block]] @ others_t
+        bound = _kth(scores, k, axis=1)
+        row, other = np.nonzero(scores >= bound[:, None])
+        parts.append(_top_per_group(rows[row + start], columns[other],
+                                    scores[row, other], k))
+    return _concat(*parts)
+
+
+def score_all(artists, venues, k, block):
+    """Both sides' best ``k`` from one pass over the score matrix:
+    ``(artist, venue, score)`` rows for the artists' lists and
+    ``(venue, artist, score)`` rows for the venues'.
+
+    Selecting from every row of a block would cost more than scoring it,
+    so each artist's k-th best score among the first SAMPLE venues is
+    taken as a bound (the k-th best overall can only be higher) and only
+    the scores above it are ranked. Each venue's list is kept as a running
+    selection, and its k-th score so far bounds the next block, so after
+    the first blocks very few scores are ranked.
+    """
+    import numpy as np
+    venues_t = np.ascontiguousarray(venues.T)
+    for_artists = []
+    for_venues = _empty()
+    bound = None
+    for start in range(0, len(artists), block):
+        scores = artists[start:start + block] @ venues_t
+        row_bound = _kth(scores[:, :SAMPLE], k, axis=1)
+        if bound is None:
+            bound = _kth(scores[:SAMPLE], k, axis=0)
+        candidates = scores >= row_bound[:, None]
+        candidates |= scores >= bound
+        artist, venue = np.nonzero(candidates)
+        score = scores[artist, venue]
+        rows = score >= row_bound[artist]
+        for_artists.append(_top_per_group(artist[rows] + start, venue[rows],
+                                          score[rows], k))
+        rows = score >= bound[venue]
+        for_venues = _top_per_group(*_concat(
+            for_venues, (venue[rows], artist[rows] + start, score[rows])), k)
+        venue, _, score = for_venues
+        full = np.bincount(venue, minlength=len(venues)) >= k
+        # Lists are ordered best first, so a full list's last row holds its
+        # k-th score.
+        last = np.flatnonzero(np.diff(venue, append=-1))
+        kth = np.zeros(len(venues), np.float32)
+        kth[venue[last]] = score[last]
+        bound = np.where(full, np.maximum(bound, kth), bound)
+    return _concat(*for_artists), for_venues
+
+
+# Storage
+# ----------------------------------------------------------------------------
+
+
+def _pairs(artist_ids, venue_ids, scores, for_artist, for_venue):
+    """Flatten broadcastable id and score arrays into candidate rows,
+    dropping pairs with nothing in common."""
+    import numpy as np
+    artist_ids, venue_ids, scores = (
+        array.ravel() for array in np.broadcast_arrays(artist_ids, venue_ids,
+                                                       scores))
+    keep = scores > 0
+    count = int(keep.sum())
+    return (artist_ids[keep], venue_ids[keep], scores[keep],
+            np.full(count, for_artist), np.full(count, for_venue))
+
+
+def _merge(*parts):
+    """Unique rows from several ``_pairs`` results, or-ing their flags."""
+    import numpy as np
+    artist_ids, venue_ids, scores, for_artist, for_venue = (
+        np.concatenate(arrays) for arrays in zip(*parts))
+    keys, first, inverse = np.unique((artist_ids << 32) | venue_ids,
+                                     return_index=True, return_inverse=True)
+    merged_artist = np.zeros(len(keys), bool)
+    merged_venue = np.zeros(len(keys), bool)
+    np.logical_or.at(merged_artist, inverse, for_artist)
+    np.logical_or.at(merged_venue, inverse, for_venue)
+    return [{'artist_id': artist_id, 'venue_id': venue_id, 'score': score,
+             'for_artist': flag_artist, 'for_venue': flag_venue}
+            for artist_id, venue_id, score, flag_artist, flag_venue in zip(
+                artist_ids[first].tolist(), venue_ids[first].tolist(),
+                scores[first].tolist(), merged_artist.tolist(),
+                merged_venue.tolist())]
+
+
+def _insert(connection, rows, batch=5000):
+    for start in range(0, len(rows), batch):
+        connection.execute(matches.insert(), rows[start:start + batch])
+
+
+def rebuild(connection, k, block):
+    """Recompute every match. Returns the number of rows stored."""
+    artist_ids, artists = load(connection, ARTISTS)
+    venue_ids, venues = load(connection, VENUES)
+    (artist, venue, score), (venue_v, artist_v, score_v) = score_all(
+        artists, venues, k, block)
+    rows = _merge(
+        _pairs(artist_ids[artist], venue_ids[venue], score, True, False),
+        _pairs(artist_ids[artist_v], venue_ids[venue_v], score_v, False,
+               True))
+    connection.execute(matches.delete())
+    _insert(connection, rows)
+    return len(rows)
+
+
+def _thresholds(connection, side, catalog, k):
+    """For each row of ``catalog``, the score an entry must beat to enter
+    its list: the lowest score of a full list, 0 otherwise."""
+    import numpy as np
+    threshold = np.zeros(len(catalog.ids), np.float32)
+    listed = connection.execute(
+        select(side.column, func.count(), func.min(matches.c.score))
+        .where(side.flag).group_by(side.column)).all()
+    if listed:
+        ids, counts, lowest = (np.array(column) for column in zip(*listed))
+        full = (counts >= k) & np.isin(ids, catalog.ids)
+        threshold[np.searchsorted(catalog.ids, ids[full])] = lowest[full]
+    return threshold
+
+
+def _counterparts(connection, side, ids):
+    """Ids on the other side with shows with ``side``'s ``ids``."""
+    if not ids:
+        return set()
+    return {id for id, in connection.execute(
+        select(side.other_key).where(side.own_key.in_(ids)).distinct())}
+
+
+def _affected(connection, side, catalog, others, changed, changed_others,
+              k, block):
+    """The lists of ``side`` that change when its ``changed`` entities
+    and the other side's ``changed_others`` were edited, as
+    ``(redo, merge, threshold)``: rows of ``catalog`` whose lists are
+    recomputed (the changed entities'), rows whose lists are merged with
+    the new scores (those that held a changed entity or that one may now
+    enter) and every row's threshold (see _thresholds).
+    """
+    import numpy as np
+    redo = catalog.rows(changed)
+    if not changed_others:
+        return redo, redo[:0], None
+    other = VENUES if side is ARTISTS else ARTISTS
+    held = {id for id, in connection.execute(
+        select(side.column).where(
+            side.flag, other.column.in_(changed_others)).distinct())}
+    entering = others.rows(changed_others)
+    others.complete(entering)
+    threshold = _thresholds(connection, side, catalog, k)
+    slack = np.where(catalog.known, 0, SLACK).astype(np.float32)
+    candidates = np.zeros(len(catalog.ids), bool)
+    for start in range(0, len(entering), block):
+        low = others.features[entering[start:start + block]] @ \
+            catalog.features.T
+        candidates |= (low + slack > threshold).any(axis=0)
+    candidates[catalog.rows(held)] = True
+    candidates[redo] = False
+    merge = np.flatnonzero(candidates)
+    catalog.complete(merge)
+    return redo, merge, threshold
+
+
+def _updated_lists(catalog, others, changed_others, affected, entries, k,
+                   block):
+    """The new entries ``(owner, other, score)``, by id, of the lists
+    picked by _affected, given the stored ``entries`` of the lists to
+    merge.
+
+    Merged lists keep their entries on unchanged entities and take the
+    changed ones with their new scores. A full list is recomputed instead
+    if an entry dropped out of it, as an entity it never held may then
+    belong in it.
+    """
+    import numpy as np
+    redo, merge, threshold = affected
+    merged = _empty()
+    if len(merge):
+        owner, other_id, score = entries
+        keep = ~np.isin(other_id, list(changed_others))
+        parts = [(np.searchsorted(catalog.ids, owner[keep]), other_id[keep],
+                  score[keep])]
+        # A new score at or below a full list's lowest cannot enter it.
+        entering = others.rows(changed_others)
+        merge_t = np.ascontiguousarray(catalog.features[merge].T)
+        for start in range(0, len(entering), block):
+            scores = others.features[entering[start:start + block]] @ \
+                merge_t
+            entity, row = np.nonzero(scores > threshold[merge])
+            parts.append((merge[row], others.ids[entering[entity + start]],
+                          scores[entity, row]))
+        merged = _top_per_group(*_concat(*parts), k)
+
+        group, _, score = merged
+        count = np.bincount(group, minlength=len(catalog.ids))
+        # Lists are ordered best first, so the last row of each holds its
+        # lowest score.
+        last = np.flatnonzero(np.diff(group, append=-1))
+        lowest = np.zeros(len(catalog.ids), np.float32)
+        lowest[group[last]] = score[last]
+        full = threshold[merge] > 0
+        short = merge[full & ((count[merge] < k) |
+                              (lowest[merge] < threshold[merge]))]
+        keep = ~np.isin(group, short)
+        merged = tuple(array[keep] for array in merged)
+        redo = np.union1d(redo, short)
+
+    row, other_row, score = best(catalog, redo, others, k, block)
+    group, other_id, merged_score = merged
+    return _concat((catalog.ids[group], other_id, merged_score),
+                   (catalog.ids[row], others.ids[other_row], score))
+
+
+def _differs(stored, row):
+    return stored is None or abs(stored[0] - row['score']) > 1e-6 or \
+        stored[1:] != (row['for_artist'], row['for_venue'])
+
+
+def refresh(connection, artist_ids=(), venue_ids=(), k=10, block=1024,
+            artist_genres=None, venue_genres=None):
+    """Bring matches up to date after the given artists and venues were
+    added, edited or deleted: their own lists, the lists that held them
+    and the lists they now enter are updated (see _affected). Only
+    the genres and states of the two sides are read in full; histories are
+    read for the entities whose exact scores are needed, and only rows
+    that differ are written. Returns the number of lists updated.
+
+    An entity's history is its counterparts' genres, so the counterparts
+    of ``artist_genres`` and ``venue_genres``, the entities whose genres
+    changed, are updated too. They default to all the given ids.
+    """
+    import numpy as np
+    if artist_genres is None:
+        artist_genres = artist_ids
+    if venue_genres is None:
+        venue_genres = venue_ids
+    changed = {
+        ARTISTS: set(artist_ids) | _counterparts(connection, VENUES,
+                                                 venue_genres),
+        VENUES: set(venue_ids) | _counterparts(connection, ARTISTS,
+                                               artist_genres),
+    }
+    if not changed[ARTISTS] and not changed[VENUES]:
+        return 0
+    catalogs = {side: _Catalog(connection, side) for side in changed}
+    other_side = {ARTISTS: VENUES, VENUES: ARTISTS}
+    affected = {}
+    updated = {}
+    for side, other in other_side.items():
+        affected[side] = _affected(
+            connection, side, catalogs[side], catalogs[other], changed[side],
+            changed[other], k, block)
+        updated[side] = changed[side] | set(
+            catalogs[side].ids[affected[side][1]].tolist())
+
+    # Every stored row of the updated lists, read once: the merged lists'
+    # entries come from them, and rows shared with lists that are not
+    # updated keep their flag there.
+    touched = or_(matches.c.artist_id.in_(updated[ARTISTS]),
+                  matches.c.venue_id.in_(updated[VENUES]))
+    rows = connection.execute(
+        select(matches.c.artist_id, matches.c.venue_id, matches.c.score,
+               matches.c.for_artist, matches.c.for_venue)
+        .where(touched)).all()
+    stored = {(row[0], row[1]): tuple(row[2:]) for row in rows}
+    columns = list(zip(*rows)) or [()] * 5
+    artist, venue, score, for_artist, for_venue = (
+        np.array(column, dtype) for column, dtype in zip(
+            columns, (np.int64, np.int64, np.float32, bool, bool)))
+
+    parts = []
+    for side, other in other_side.items():
+        catalog = catalogs[side]
+        if side is ARTISTS:
+            owner, other_id, flag = artist, venue, for_artist
+        else:
+            owner, other_id, flag = venue, artist, for_venue
+        listed = flag & np.isin(owner, catalog.ids[affected[side][1]])
+        owner, other_id, list_score = _updated_lists(
+            catalog, catalogs[other], changed[other], affected[side],
+            (owner[listed], other_id[listed], score[listed]), k, block)
+        if side is ARTISTS:
+            parts.append(_pairs(owner, other_id, list_score, True, False))
+        else:
+            parts.append(_pairs(other_id, owner, list_score, False, True))
+    for_artist &= ~np.isin(artist, list(updated[ARTISTS]))
+    for_venue &= ~np.isin(venue, list(updated[VENUES]))
+    keep = for_artist | for_venue
+    parts.append((artist[keep], venue[keep], score[keep], for_artist[keep],
+                  for_venue[keep]))
+
+    written = []
+    gone = []
+    for row in _merge(*parts):
+        key = (row['artist_id'], row['venue_id'])
+        before = stored.pop(key, None)
+        if _differs(before, row):
+            if before is not None:
+                gone.append(key)
+            written.append(row)
+    gone.extend(stored)
+    if gone:
+        connection.execute(matches.delete().where(
+            matches.c.artist_id == bindparam('gone_artist'),
+            matches.c.venue_id == bindparam('gone_venue')
+        ), [{'gone_artist': artist_id, 'gone_venue': venue_id}
+            for artist_id, venue_id in gone])
+    _insert(connection, written)
+    return len(updated[ARTISTS]) + len(updated[VENUES])
+
+
+# Running
+# ----------------------------------------------------------------------------
+
+
+def _settings():
+    config = current_app.config
+    return config['MATCHES_PER_ENTITY'], config['MATCH_BLOCK_SIZE']
+
+
+def rebuild_matches():
+    """Recompute every match in one transaction."""
+    k, block = _settings()
+    with db.engine.begin() as connection:
+        return rebuild(connection, k, block)
+
+
+@queue.handler('matches.refresh')
+def refresh_matches(artist_ids=(), venue_ids=(), artist_genres=None,
+                    venue_genres=None):
+    k, block = _settings()
+    with db.engine.begin() as connection:
+        return refresh(connection, artist_ids, venue_ids, k, block,
+                       artist_genres, venue_genres)
+
+
+# ----------------------------------------------------------------------------#
+# Refresh after commits.
+# ----------------------------------------------------------------------------#
+
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _queue_refresh(session, flush_context):
+    if not has_app_context() or not current_app.config.get('MATCH_REFRESH'):
+        return
+    ids = {ARTISTS: set(), VENUES: set()}
+    genres = {ARTISTS: set(), VENUES: set()}
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Show):
+            # Shows change both sides' history.
+            if obj in session.new or obj in session.deleted:
+                ids[ARTISTS].add(obj.artist_id)
+                ids[VENUES].add(obj.venue_id)
+        elif isinstance(obj, (Artist, Venue)):
+            side = ARTISTS if isinstance(obj, Artist) else VENUES
+            if obj in session.dirty and not _changed(obj, side.matched_on):
+                continue
+            ids[side].add(obj.id)
+            # Its show partners' histories change with its genres.
+            if obj in session.dirty and _changed(obj, ('genres',)):
+                genres[side].add(obj.id)
+    if ids[ARTISTS] or ids[VENUES]:
+        enqueue(session, 'matches.refresh',
+                artist_ids=sorted(ids[ARTISTS]),
+                venue_ids=sorted(ids[VENUES]),
+                artist_genres=sorted(genres[ARTISTS]),
+                venue_genres=sorted(genres[VENUES]))
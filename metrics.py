@@ -0,0 +1,170 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ----------------------------------------------------------------------------#
+# Request metrics.
+#
+# For every request we record the number of SQL statements, time spent in
+# the database, time spent rendering templates and wall time, and keep them
+# as per-endpoint histograms exposed in Prometheus text format at /metrics.
+# Histograms are per process; scrape each worker or aggregate upstream.
+# ----------------------------------------------------------------------------#
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+
+class Histogram(object):
+    """Cumulative-bucket histogram keyed by endpoint."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, endpoint, value):
+        with self.lock:
+            series = self.series.get(endpoint)
+            if series is None:
+                series = self.series[endpoint] = \
+                    [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s histogram' % self.name]
+        with self.lock:
+            for endpoint in sorted(self.series):
+                counts, total = self.series[endpoint]
+                label = 'endpoint="%s"' % endpoint
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append('%s_bucket{%s,le="%s"} %d'
+                                 % (self.name, label, bound, cumulative))
+                cumulative += counts[-1]
+                lines.append('%s_bucket{%s,le="+Inf"} %d'
+                             % (self.name, label, cumulative))
+                lines.append('%s_sum{%s} %r' % (self.name, label, total))
+                lines.append('%s_count{%s} %d'
+                             % (self.name, label, cumulative))
+        return lines
+
+
+class RequestMetrics(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+
+def _current():
+    if has_request_context():
+        return g.get('request_metrics')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context,
+                   executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context,
+                    executemany):
+    started = conn.info['query_started'].pop()
+    current = _current()
+    if current is not None:
+        current.queries += 1
+        current.db_time += time.perf_counter() - started
+
+
+@event.listens_for(Engine, 'handle_error')
+def _query_failed(context):
+    if context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
+class TimedTemplate(Template):
+    """Template that adds its top-level render time to the request."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+            current = _current()
+            if current is not None:
+                current.render_time += time.perf_counter() - started
+
+
+class Metrics(object):
+
+    def __init__(self, app=None):
+        self.request_duration = Histogram(
+            'fyyur_request_duration_seconds',
+            'Wall time per request.', SECONDS_BUCKETS)
+        self.db_duration = Histogram(
+            'fyyur_db_duration_seconds',
+            'Time spent executing SQL per request.', SECONDS_BUCKETS)
+        self.render_duration = Histogram(
+            'fyyur_render_duration_seconds',
+            'Time spent rendering templates per request.', SECONDS_BUCKETS)
+        self.db_queries = Histogram(
+            'fyyur_db_queries',
+            'SQL statements executed per request.', QUERY_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_SERVER_TIMING', False)
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+
+    def before_request(self):
+        g.request_metrics = RequestMetrics()
+
+    def after_request(self, response):
+        current = g.pop('request_metrics', None)
+        if current is None:
+            return response
+        wall_time = time.perf_counter() - current.started
+        endpoint = request.endpoint or 'unmatched'
+
+        self.request_duration.observe(endpoint, wall_time)
+        self.db_duration.observe(endpoint, current.db_time)
+        self.render_duration.observe(endpoint, current.render_time)
+        self.db_queries.observe(endpoint, current.queries)
+
+        if current_app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = ', '.join([
+                'db;dur=%.2f;desc="%d queries"' % (current.db_time * 1000,
+                                                   current.queries),
+                'render;dur=%.2f' % (current.render_time * 1000),
+                'total;dur=%.2f' % (wall_time * 1000),
+            ])
+        return response
+
+    def expose(self):
+        lines = []
+        for histogram in (self.request_duration, self.db_duration,
+                          self.render_duration, self.db_queries):
+            lines.extend(histogram.expose())
+        return Response('\n'.join(lines) + '\n',
+                        mimetype='text/plain; version=0.0.4')
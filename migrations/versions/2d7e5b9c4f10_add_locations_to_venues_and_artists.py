@@ -0,0 +1,40 @@
+"""Add locations to venues and artists
+
+Revision ID: 2d7e5b9c4f10
+Revises: 8f3a2c61d0b4
+Create Date: 2026-10-18 22:05:51.730846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7e5b9c4f10'
+down_revision = '8f3a2c61d0b4'
+branch_labels = None
+depends_on = None
+
+# Existing rows are located from the bundled city table afterwards, with
+# `flask geo geocode`.
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('latitude', sa.Float(),
+                                       nullable=True))
+        op.add_column(table, sa.Column('longitude', sa.Float(),
+                                       nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12),
+                                      nullable=True))
+    op.create_index('ix_venues_geohash', 'venues',
+                    ['geohash', 'latitude', 'longitude'], unique=False,
+                    postgresql_include=['id'])
+
+
+def downgrade():
+    op.drop_index('ix_venues_geohash', table_name='venues')
+    op.drop_column('venues', 'geohash')
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'longitude')
+        op.drop_column(table, 'latitude')
@@ -0,0 +1,51 @@
+"""Add upcoming/past show counters to Venue and Artist
+
+Revision ID: 3e1d6a0c9b47
+Revises: b9ff42ea293e
+Create Date: 2026-10-18 10:14:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e1d6a0c9b47'
+down_revision = 'b9ff42ea293e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('is_past', sa.Boolean(),
+                                     server_default=sa.false(),
+                                     nullable=False))
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+
+    op.execute('UPDATE shows SET is_past = start_time <= now()')
+    for table, foreign_key in (('venues', 'venue_id'),
+                               ('artists', 'artist_id')):
+        op.execute("""
+            UPDATE {table} SET
+                upcoming_shows_count = (
+                    SELECT count(*) FROM shows
+                    WHERE shows.{fk} = {table}.id AND NOT shows.is_past),
+                past_shows_count = (
+                    SELECT count(*) FROM shows
+                    WHERE shows.{fk} = {table}.id AND shows.is_past)
+        """.format(table=table, fk=foreign_key))
+
+    op.create_index('ix_shows_upcoming_start_time', 'shows', ['start_time'],
+                    unique=False, postgresql_where=sa.text('NOT is_past'))
+
+
+def downgrade():
+    op.drop_index('ix_shows_upcoming_start_time', table_name='shows')
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_column('shows', 'is_past')
@@ -0,0 +1,43 @@
+"""Add duration to shows and exclude overlapping venue/artist bookings
+
+Revision ID: 5c9e04b7d2a1
+Revises: d3b8e6f2a19c
+Create Date: 2026-10-18 18:22:40.163504
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9e04b7d2a1'
+down_revision = 'd3b8e6f2a19c'
+branch_labels = None
+depends_on = None
+
+# Must match Show.end_time's SQL expression so conflict checks (schedule.py)
+# can use the constraints' GiST indexes.
+BOOKED = ("tsrange(start_time, "
+          "start_time + duration_minutes * interval '1 minute')")
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(),
+                                     server_default='120', nullable=False))
+    op.create_check_constraint('ck_shows_duration_minutes_positive',
+                               'shows', 'duration_minutes > 0')
+    # For plain equality on the id columns inside a GiST index.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # Fails, naming one conflicting pair, if existing shows already overlap.
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE shows ADD CONSTRAINT ex_shows_{column}_booked '
+            'EXCLUDE USING gist ({column} WITH =, {booked} WITH &&)'
+            .format(column=column, booked=BOOKED))
+
+
+def downgrade():
+    for column in ('artist_id', 'venue_id'):
+        op.drop_constraint('ex_shows_%s_booked' % column, 'shows')
+    op.drop_constraint('ck_shows_duration_minutes_positive', 'shows')
+    op.drop_column('shows', 'duration_minutes')
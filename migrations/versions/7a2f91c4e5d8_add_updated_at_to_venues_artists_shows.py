@@ -0,0 +1,32 @@
+"""Add updated_at to venues, artists and shows
+
+Revision ID: 7a2f91c4e5d8
+Revises: 3e1d6a0c9b47
+Create Date: 2026-10-18 14:02:51.318260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2f91c4e5d8'
+down_revision = '3e1d6a0c9b47'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists', 'shows')
+
+
+def upgrade():
+    # Existing rows take the migration time; the server default stays for
+    # rows loaded with COPY, the application sets it on every other write.
+    for table in TABLES:
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("timezone('utc', now())")))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
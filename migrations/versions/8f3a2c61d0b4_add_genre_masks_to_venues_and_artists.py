@@ -0,0 +1,45 @@
+"""Add genre bitmasks to venues and artists
+
+Revision ID: 8f3a2c61d0b4
+Revises: 5c9e04b7d2a1
+Create Date: 2026-10-18 20:41:09.518226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a2c61d0b4'
+down_revision = '5c9e04b7d2a1'
+branch_labels = None
+depends_on = None
+
+# enums.Genres as of this revision, in bit order. Later genres are appended
+# to the enum, so this list stays a valid prefix of it.
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic',
+          'Folk', 'Funk', 'HipHop', 'Heavy_Metal', 'Instrumental', 'Jazz',
+          'Musical_Theatre', 'Pop', 'Punk', 'RnB', 'Reggae', 'Rock_n_Roll',
+          'Soul', 'Other')
+
+
+def upgrade():
+    names = 'ARRAY[%s]::varchar[]' % ', '.join("'%s'" % name
+                                                for name in GENRES)
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('genre_mask', sa.Integer(),
+                                       server_default='0', nullable=False))
+        # Unknown names have no position and drop out of bit_or.
+        op.execute("""
+            UPDATE {table} SET genre_mask = coalesce((
+                SELECT bit_or(1 << (array_position({names}, genre) - 1))
+                FROM unnest({table}.genres) AS genre), 0)
+        """.format(table=table, names=names))
+        op.create_index('ix_%s_state_genre_mask' % table, table,
+                        ['state', 'genre_mask'], unique=False)
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index('ix_%s_state_genre_mask' % table, table_name=table)
+        op.drop_column(table, 'genre_mask')
@@ -0,0 +1,43 @@
+"""Add jobs
+
+Revision ID: a4b8d2e6c913
+Revises: e7c1f4a9b352
+Create Date: 2026-10-18 23:58:07.194528
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4b8d2e6c913'
+down_revision = 'e7c1f4a9b352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('state', sa.String(length=16), server_default='queued',
+              nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_state_run_after', 'jobs',
+                    ['state', 'run_after'], unique=False)
+    op.create_index('ix_jobs_state_finished_at', 'jobs',
+                    ['state', 'finished_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_state_finished_at', table_name='jobs')
+    op.drop_index('ix_jobs_state_run_after', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,67 @@
+"""Add search vectors and trigram indexes to Venue and Artist
+
+Revision ID: b9ff42ea293e
+Revises: f60d37d23cd6
+Create Date: 2026-10-18 09:02:11.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9ff42ea293e'
+down_revision = 'f60d37d23cd6'
+branch_labels = None
+depends_on = None
+
+# Weights match search.NAME_WEIGHT / PLACE_WEIGHT / GENRE_WEIGHT.
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                        coalesce(NEW.state, '')), 'B') ||
+        setweight(to_tsvector('simple',
+                              coalesce(array_to_string(NEW.genres, ' '), '')),
+                  'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER {table}_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update();
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('search_vector',
+                                       postgresql.TSVECTOR(), nullable=True))
+        op.execute(SEARCH_VECTOR_FUNCTION.format(table=table))
+        op.execute(SEARCH_VECTOR_TRIGGER.format(table=table))
+        # Fire the trigger once for existing rows.
+        op.execute('UPDATE {table} SET name = name'.format(table=table))
+        op.create_index('ix_%s_search_vector' % table, table,
+                        ['search_vector'], unique=False,
+                        postgresql_using='gin')
+        op.create_index('ix_%s_name_trgm' % table, table, ['name'],
+                        unique=False, postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index('ix_%s_name_trgm' % table, table_name=table)
+        op.drop_index('ix_%s_search_vector' % table, table_name=table)
+        op.execute('DROP TRIGGER IF EXISTS {table}_search_vector_trigger '
+                   'ON {table}'.format(table=table))
+        op.execute('DROP FUNCTION IF EXISTS '
+                   '{table}_search_vector_update()'.format(table=table))
+        op.drop_column(table, 'search_vector')
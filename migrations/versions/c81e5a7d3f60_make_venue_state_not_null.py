@@ -0,0 +1,32 @@
+"""Make venue state not null
+
+Revision ID: c81e5a7d3f60
+Revises: a4b8d2e6c913
+Create Date: 2026-10-18 09:41:26.305817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81e5a7d3f60'
+down_revision = 'a4b8d2e6c913'
+branch_labels = None
+depends_on = None
+
+# The venue directory is paged on (state, city, name, id); a NULL state
+# falls outside every keyset comparison, so such venues were never listed.
+
+
+def upgrade():
+    op.execute("UPDATE venues SET state = '' WHERE state IS NULL")
+    op.alter_column('venues', 'state',
+               existing_type=sa.VARCHAR(length=120),
+               nullable=False)
+
+
+def downgrade():
+    op.alter_column('venues', 'state',
+               existing_type=sa.VARCHAR(length=120),
+               nullable=True)
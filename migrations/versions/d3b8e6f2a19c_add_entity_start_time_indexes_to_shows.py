@@ -0,0 +1,28 @@
+"""Add (venue_id, start_time) and (artist_id, start_time) indexes to shows
+
+Revision ID: d3b8e6f2a19c
+Revises: 7a2f91c4e5d8
+Create Date: 2026-10-18 16:41:09.527183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3b8e6f2a19c'
+down_revision = '7a2f91c4e5d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
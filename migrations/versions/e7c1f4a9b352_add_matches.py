@@ -0,0 +1,42 @@
+"""Add matches
+
+Revision ID: e7c1f4a9b352
+Revises: 2d7e5b9c4f10
+Create Date: 2026-10-18 23:12:40.518214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c1f4a9b352'
+down_revision = '2d7e5b9c4f10'
+branch_labels = None
+depends_on = None
+
+# The table is filled afterwards, with `flask matches rebuild`.
+
+
+def upgrade():
+    op.create_table('matches',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('for_artist', sa.Boolean(), nullable=False),
+    sa.Column('for_venue', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'],
+                            ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['venues.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'venue_id')
+    )
+    op.create_index('ix_matches_artist_id_score', 'matches',
+                    ['artist_id', 'score'], unique=False)
+    op.create_index('ix_matches_venue_id_score', 'matches',
+                    ['venue_id', 'score'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_matches_venue_id_score', table_name='matches')
+    op.drop_index('ix_matches_artist_id_score', table_name='matches')
+    op.drop_table('matches')
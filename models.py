@@ -1,5 +1,63 @@
-from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.hybrid import hybrid_property
+from database import RoutingSQLAlchemy
+from enums import Genres
+db = RoutingSQLAlchemy()
+
+# Postgres stores genres natively as an array; SQLite (used by the
+# benchmarks) falls back to a JSON column with the same Python value.
+GenreList = db.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
+
+# Maintained by a trigger in Postgres (see migrations); unused elsewhere.
+SearchVector = TSVECTOR().with_variant(db.Text, 'sqlite')
+
+
+def search_indexes(table):
+    return (
+        db.Index('ix_%s_search_vector' % table, 'search_vector',
+                 postgresql_using='gin'),
+        db.Index('ix_%s_name_trgm' % table, 'name',
+                 postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
+
+def updated_at_column():
+    # Naive UTC. ``onupdate`` applies to Core update() statements as well as
+    # ORM flushes, so counter adjustments bump it too. The server default
+    # covers rows loaded with COPY (the migration pins it to UTC on
+    # Postgres; CURRENT_TIMESTAMP is already UTC on SQLite).
+    return db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                     onupdate=datetime.utcnow,
+                     server_default=db.func.current_timestamp())
+
+
+def genre_mask(genres):
+    # Names the forms reject are skipped rather than raised on, as the edit
+    # views populate an object before validating the form.
+    return Genres.mask(name for name in genres or ()
+                       if name in Genres.__members__)
+
+
+def _genre_mask_default(context):
+    return genre_mask(context.get_current_parameters().get('genres'))
+
+
+def genre_mask_column():
+    # Bit i is set for the i-th member of enums.Genres, so listings filter on
+    # genres with a bitwise AND (see queries.py). The default covers Core
+    # inserts that only pass ``genres``; ORM objects keep it in step through
+    # their ``genres`` validator. COPY writers must pass it themselves.
+    return db.Column(db.Integer, nullable=False, default=_genre_mask_default,
+                     server_default='0')
+
+
+def facet_indexes(table):
+    # Serves the state filter and, read index-only, the facet counts.
+    return (
+        db.Index('ix_%s_state_genre_mask' % table, 'state', 'genre_mask'),
+    )
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -8,22 +66,44 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = search_indexes('venues') + facet_indexes('venues') + (
+        # Radius searches read ranges of geohash prefixes and filter them
+        # on the coordinates without visiting the table.
+        db.Index('ix_venues_geohash', 'geohash', 'latitude', 'longitude',
+                 postgresql_include=['id']),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
+    genre_mask = genre_mask_column()
     address = db.Column(db.String(120), nullable=False)
     city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120))
+    state = db.Column(db.String(120), nullable=False)
+    # The centre of the venue's city and its geohash; see geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
     phone = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venues', lazy='joined',
+    search_vector = db.deferred(db.Column(SearchVector))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    updated_at = updated_at_column()
+    shows = db.relationship('Show', backref='venues', lazy='select',
                             cascade='all, delete')
 
+    @db.validates('genres')
+    def _set_genre_mask(self, key, genres):
+        self.genre_mask = genre_mask(genres)
+        return genres
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -32,21 +112,36 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = search_indexes('artists') + facet_indexes('artists')
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList, nullable=False)
+    genre_mask = genre_mask_column()
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     phone = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artists', lazy='joined',
+    search_vector = db.deferred(db.Column(SearchVector))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    updated_at = updated_at_column()
+    shows = db.relationship('Show', backref='artists', lazy='select',
                             cascade='all, delete')
 
+    @db.validates('genres')
+    def _set_genre_mask(self, key, genres):
+        self.genre_mask = genre_mask(genres)
+        return genres
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
@@ -56,6 +151,17 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('NOT is_past')),
+        # Detail pages read one entity's shows as a start_time range.
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.CheckConstraint('duration_minutes > 0',
+                           name='ck_shows_duration_minutes_positive'),
+        # The exclusion constraints against overlapping bookings are
+        # Postgres-specific and live in the migrations; see schedule.py.
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
@@ -63,10 +169,81 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'),
                          nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=120,
+                                 server_default='120')
+    # Which counter this show is in; see counters.py
+    is_past = db.Column(db.Boolean, nullable=False, default=False,
+                        server_default=db.false())
+    updated_at = updated_at_column()
+
+    @hybrid_property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration_minutes)
+
+    @end_time.expression
+    def end_time(cls):
+        # Postgres only; the exclusion constraints (see migrations) index
+        # tsrange(start_time, end_time) with this same expression.
+        return cls.start_time + \
+            cls.duration_minutes * db.literal_column("interval '1 minute'")
 
     def __repr__(self):
         return f'< Show {self.id}, Artist'
         +'{self.artist_id},Venue {self.venue_id} >'
 
+
+class Match(db.Model):
+    """A suggested booking between a seeking artist and a seeking venue.
+
+    A row is kept while the venue is among the artist's best matches
+    (``for_artist``) or the artist among the venue's (``for_venue``); see
+    matching.py.
+    """
+    __tablename__ = 'matches'
+    __table_args__ = (
+        db.Index('ix_matches_artist_id_score', 'artist_id', 'score'),
+        db.Index('ix_matches_venue_id_score', 'venue_id', 'score'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'artists.id', ondelete='CASCADE'), primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey(
+        'venues.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    for_artist = db.Column(db.Boolean, nullable=False)
+    for_venue = db.Column(db.Boolean, nullable=False)
+
+    def __repr__(self):
+        return f'<Match artist {self.artist_id} venue {self.venue_id}>'
+
+
+class Job(db.Model):
+    """Work queued by a commit to run in the background; see jobs.py."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_state_run_after', 'state', 'run_after'),
+        db.Index('ix_jobs_state_finished_at', 'state', 'finished_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # queued, running, done or failed
+    state = db.Column(db.String(16), nullable=False, default='queued',
+                      server_default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0,
+                         server_default='0')
+    # Naive UTC, like updated_at.
+    created_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow)
+    run_after = db.Column(db.DateTime, nullable=False,
+                          default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.state}>'
+
 # TODO Implement Show and Artist models, and complete all model relationships
 # and properties, as a database migration.
@@ -0,0 +1,176 @@
+import base64
+import json
+from datetime import datetime
+from flask import abort, current_app, request
+from sqlalchemy import and_, or_
+
+# ----------------------------------------------------------------------------#
+# Keyset pagination.
+# ----------------------------------------------------------------------------#
+
+
+class Page(object):
+    """One page of keyset-paginated rows plus opaque cursors to its
+    neighbours. A cursor is None when there is no page in that direction.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    payload = [value.isoformat() if isinstance(value, datetime) else value
+               for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that was not produced by encode_cursor for the
+    same columns."""
+
+
+def _check_type(column, value):
+    if value is None:
+        return value
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError) as error:
+            raise InvalidCursor('Invalid cursor') from error
+    if python_type is float:
+        python_type = (int, float)
+    # bool is an int, but never a valid key for an integer column.
+    if isinstance(value, bool) and python_type is not bool or \
+            not isinstance(value, python_type):
+        raise InvalidCursor('Invalid cursor')
+    return value
+
+
+def decode_cursor(token, columns=None):
+    """Turn a cursor back into values typed like ``columns``. Without
+    ``columns`` the raw JSON values are returned.
+
+    Raises InvalidCursor if the token is malformed or a value does not fit
+    its column's type.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError) as error:
+        raise InvalidCursor('Invalid cursor') from error
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor')
+    if columns is None:
+        return values
+    if len(values) != len(columns):
+        raise InvalidCursor('Invalid cursor')
+    return [_check_type(column, value)
+            for column, value in zip(columns, values)]
+
+
+def _seek(columns, values, forward):
+    """Row-value comparison ``(a, b) > (x, y)`` expanded into plain boolean
+    terms so every backend can drive it from a composite index.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        terms = [columns[j] == values[j] for j in range(i)]
+        terms.append(column > values[i] if forward else column < values[i])
+        clauses.append(and_(*terms))
+    return or_(*clauses)
+
+
+def keyset_window(query, columns, per_page, after=None, before=None):
+    """The query for the rows ``keyset_page`` fetches: up to
+    ``per_page + 1`` rows past the cursor, the extra one telling whether
+    there is a further page. With ``before`` the rows come back in reverse.
+    """
+    if before is not None:
+        values = decode_cursor(before, columns)
+        return query.filter(_seek(columns, values, forward=False)) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(per_page + 1)
+    if after is not None:
+        values = decode_cursor(after, columns)
+        query = query.filter(_seek(columns, values, forward=True))
+    return query.order_by(*columns).limit(per_page + 1)
+
+
+def keyset_result(rows, columns, per_page, after=None, before=None):
+    """Turn the rows of a ``keyset_window`` into a Page."""
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    if before is not None:
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    if not items:
+        return Page(items)
+    return Page(items,
+                next_cursor=cursor_for(items[-1]) if has_next else None,
+                prev_cursor=cursor_for(items[0]) if has_prev else None)
+
+
+def keyset_page(query, columns, per_page, after=None, before=None):
+    """Fetch one page of ``query`` ordered by ``columns``.
+
+    ``columns`` must end in a unique column (usually the primary key) so the
+    ordering is total. ``after``/``before`` are cursors taken from a previous
+    page; each page costs one indexed range scan regardless of depth.
+    ``query`` is a Query; to page a ``select()``, execute its
+    ``keyset_window`` and pass the rows to ``keyset_result``.
+    """
+    rows = keyset_window(query, columns, per_page, after=after,
+                         before=before).all()
+    return keyset_result(rows, columns, per_page, after=after, before=before)
+
+
+def keyset_older(query, columns, per_page, before=None):
+    """Fetch up to ``per_page`` rows of ``query`` newest first, i.e. in
+    descending ``columns`` order, starting below the ``before`` cursor.
+    The page's ``next_cursor`` continues towards older rows; there is no
+    ``prev_cursor``, as the rows are meant to be appended ("load more").
+    """
+    if before is not None:
+        values = decode_cursor(before, columns)
+        query = query.filter(_seek(columns, values, forward=False))
+    rows = query.order_by(*[column.desc() for column in columns]) \
+        .limit(per_page + 1).all()
+    items = rows[:per_page]
+    if len(rows) <= per_page:
+        return Page(items)
+    return Page(items, next_cursor=encode_cursor(
+        [getattr(items[-1], column.key) for column in columns]))
+
+
+def paginate(query_func, *args):
+    """Call a keyset-paginated query with the page size and cursors from
+    the request, answering 400 for a malformed cursor."""
+    config = current_app.config
+    per_page = request.args.get('per_page', config['PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, config['MAX_PER_PAGE']))
+    try:
+        return query_func(*args, per_page=per_page,
+                          after=request.args.get('after'),
+                          before=request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
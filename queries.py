@@ -0,0 +1,517 @@
+from itertools import groupby
+from sqlalchemy import case, func, select
+from facets import facet_counts, filter_directory
+from geo import bounding_box, covering_prefixes, distance_km, prefix_ranges
+from models import db, Venue, Artist, Show, Match
+from pagination import keyset_older, keyset_page, keyset_result, keyset_window
+from search import get_backend
+
+# ----------------------------------------------------------------------------#
+# Read queries.
+# ----------------------------------------------------------------------------#
+
+
+def venue_directory(genre_mask, state, per_page, after=None, before=None):
+    """Return a page of venues grouped by city and state for
+    pages/venues.html, limited to those with every genre in ``genre_mask``
+    and in ``state`` if given.
+
+    Upcoming show counts are read from the maintained counter column, so
+    the page costs one query no matter how many venues or shows exist. The
+    page is keyed on (state, city, name, id) so areas stay contiguous.
+    """
+    query = filter_directory(db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ), Venue, genre_mask, state)
+    page = keyset_page(query, [Venue.state, Venue.city, Venue.name, Venue.id],
+                       per_page, after=after, before=before)
+
+    areas = []
+    for (city, state), venues in groupby(page.items,
+                                         key=lambda row: (row.city,
+                                                          row.state)):
+        areas.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.num_upcoming_shows
+            } for venue in venues]
+        })
+    page.items = areas
+    return page
+
+
+def artist_directory(genre_mask, state, per_page, after=None,
+                     before=None):
+    """Return a page of artist ids and names ordered by name, limited to
+    those with every genre in ``genre_mask`` and in ``state`` if given."""
+    query = filter_directory(db.session.query(Artist.id, Artist.name),
+                             Artist, genre_mask, state)
+    return keyset_page(query, [Artist.name, Artist.id], per_page,
+                       after=after, before=before)
+
+
+def venue_facets(genre_mask, state):
+    """Genre and state counts for the venue directory's filters."""
+    return facet_counts(Venue, genre_mask, state)
+
+
+def artist_facets(genre_mask, state):
+    """Genre and state counts for the artist directory's filters."""
+    return facet_counts(Artist, genre_mask, state)
+
+
+def venues_near(latitude, longitude, radius_km, limit):
+    """Return the number of venues within ``radius_km`` of a point and the
+    nearest ``limit`` of them, as dicts with their distance.
+
+    Candidates come from the geohash index ranges covering the circle's
+    bounding box (see geo.py), read index-only, so the cost follows the
+    venues in the area rather than the table. Only the nearest ``limit``
+    rows are then fetched.
+    """
+    south, west, north, east = bounding_box(latitude, longitude, radius_km)
+    candidates = db.session.query(
+        Venue.id, Venue.latitude, Venue.longitude
+    ).filter(
+        prefix_ranges(Venue.geohash,
+                      covering_prefixes(south, west, north, east)),
+        Venue.latitude.between(south, north),
+        Venue.longitude.between(west, east)
+    )
+    hits = []
+    for id, venue_latitude, venue_longitude in candidates:
+        distance = distance_km(latitude, longitude, venue_latitude,
+                               venue_longitude)
+        if distance <= radius_km:
+            hits.append((distance, id))
+    hits.sort()
+    nearest = hits[:limit]
+
+    rows = {}
+    if nearest:
+        rows = {row.id: row for row in db.session.query(
+            Venue.id, Venue.name, Venue.city, Venue.state,
+            Venue.upcoming_shows_count
+        ).filter(Venue.id.in_([id for _, id in nearest]))}
+    return len(hits), [{
+        'id': id,
+        'name': rows[id].name,
+        'city': rows[id].city,
+        'state': rows[id].state,
+        'distance_km': distance,
+        'num_upcoming_shows': rows[id].upcoming_shows_count
+    } for distance, id in nearest if id in rows]
+
+
+def search_rows_statement(model, ids):
+    return select(model.id, model.name, model.upcoming_shows_count).where(
+        model.id.in_(ids))
+
+
+def search_items(ids, rows):
+    """Search result dicts for ``ids`` in order, from rows of
+    ``search_rows_statement``."""
+    rows = {row.id: row for row in rows}
+    return [{
+        'id': rows[id].id,
+        'name': rows[id].name,
+        'num_upcoming_shows': rows[id].upcoming_shows_count
+    } for id in ids if id in rows]
+
+
+def search_version_statement(model, ids):
+    """Version of the search results for ``ids``; see "Page versions"."""
+    return select(func.count(), func.max(model.updated_at)).where(
+        model.id.in_(ids))
+
+
+def search_hits(model, search_term, per_page, after=None, before=None):
+    """Return the total number of ``model`` rows matching ``search_term``
+    and one page of their hits, best match first. ``search_page`` turns
+    the hits into results."""
+    return get_backend().search(model, search_term, per_page, after=after,
+                                before=before)
+
+
+def search_version(model, ids):
+    return db.session.execute(search_version_statement(model, ids)).one()
+
+
+def search_page(model, page):
+    """Replace the hits on ``page`` with search result dicts."""
+    ids = [hit.id for hit in page.items]
+    rows = []
+    if ids:
+        rows = db.session.execute(search_rows_statement(model, ids))
+    page.items = search_items(ids, rows)
+    return page
+
+
+def _search(model, search_term, per_page, after, before):
+    count, page = search_hits(model, search_term, per_page, after, before)
+    return count, search_page(model, page)
+
+
+def venue_search(search_term, per_page, after=None, before=None):
+    """Return the total number of venues matching ``search_term`` and one
+    page of them, best match first.
+    """
+    return _search(Venue, search_term, per_page, after, before)
+
+
+def artist_search(search_term, per_page, after=None, before=None):
+    """Return the total number of artists matching ``search_term`` and one
+    page of them, best match first.
+    """
+    return _search(Artist, search_term, per_page, after, before)
+
+
+def shows_feed(per_page, after=None, before=None):
+    """Return a page of shows ordered by start time, with the venue name,
+    artist name and artist image joined in, so rendering needs no further
+    lookups.
+    """
+    return _page(SHOWS_FEED, per_page, after, before)
+
+
+# Detail pages
+# ----------------------------------------------------------------------------
+#
+# show_venue/show_artist split an entity's shows at a single ``now`` taken
+# by the caller. Each part is a range over the (venue_id, start_time) or
+# (artist_id, start_time) index, so a venue's history does not slow down
+# its page: past shows are fetched newest first in batches of ``per_page``.
+
+SHOWS_ORDER = [Show.start_time, Show.id]
+
+
+def _venue_shows(venue_id):
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ).filter(Show.venue_id == venue_id)
+
+
+def _artist_shows(artist_id):
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link')
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).filter(Show.artist_id == artist_id)
+
+
+def _past_count(foreign_key, id, now):
+    # count(*) reads only the index.
+    return db.session.query(func.count()).select_from(Show).filter(
+        foreign_key == id, Show.start_time <= now).scalar()
+
+
+def _show_split(shows, foreign_key, id, now, per_page):
+    upcoming = shows.filter(Show.start_time > now) \
+        .order_by(*SHOWS_ORDER).all()
+    past = keyset_older(shows.filter(Show.start_time <= now), SHOWS_ORDER,
+                        per_page)
+    return upcoming, past, _past_count(foreign_key, id, now)
+
+
+def venue_shows(venue_id, now, per_page):
+    """Return the venue's upcoming shows in start time order, a Page of its
+    latest ``per_page`` past shows and its total number of past shows."""
+    return _show_split(_venue_shows(venue_id), Show.venue_id, venue_id, now,
+                       per_page)
+
+
+def artist_shows(artist_id, now, per_page):
+    """Return the artist's upcoming shows in start time order, a Page of
+    its latest ``per_page`` past shows and its total number of past
+    shows."""
+    return _show_split(_artist_shows(artist_id), Show.artist_id, artist_id,
+                       now, per_page)
+
+
+def venue_past_shows(venue_id, now, per_page, before):
+    """The next ``per_page`` past shows of the venue, older than the
+    ``before`` cursor."""
+    return keyset_older(_venue_shows(venue_id).filter(Show.start_time <= now),
+                        SHOWS_ORDER, per_page, before=before)
+
+
+def artist_past_shows(artist_id, now, per_page, before):
+    """The next ``per_page`` past shows of the artist, older than the
+    ``before`` cursor."""
+    return keyset_older(
+        _artist_shows(artist_id).filter(Show.start_time <= now),
+        SHOWS_ORDER, per_page, before=before)
+
+
+# Page versions
+# ----------------------------------------------------------------------------
+#
+# One aggregate row per HTML page or API response, changing whenever
+# anything shown in it does: counts and id sums catch rows entering or
+# leaving a window, max(updated_at) catches edits (including counter
+# updates). See freshness.py and api.py.
+
+
+def window_version_statement(query, columns, per_page, after=None,
+                             before=None):
+    """Version of the rows ``keyset_window`` would fetch from ``query``,
+    which selects the id and the updated_at columns to aggregate."""
+    window = keyset_window(query, columns, per_page, after=after,
+                           before=before).subquery()
+    stamps = [func.max(column) for column in window.c if column.name != 'id']
+    return select(func.count(), func.sum(window.c.id), *stamps)
+
+
+def _window_version(query, columns, per_page, after, before):
+    return db.session.execute(window_version_statement(
+        query, columns, per_page, after=after, before=before)).one()
+
+
+def venue_directory_version(genre_mask, state, per_page, after=None,
+                            before=None):
+    query = filter_directory(db.session.query(Venue.id, Venue.updated_at),
+                             Venue, genre_mask, state)
+    return _window_version(query,
+                           [Venue.state, Venue.city, Venue.name, Venue.id],
+                           per_page, after, before)
+
+
+def artist_directory_version(genre_mask, state, per_page, after=None,
+                             before=None):
+    query = filter_directory(db.session.query(Artist.id, Artist.updated_at),
+                             Artist, genre_mask, state)
+    return _window_version(query, [Artist.name, Artist.id], per_page, after,
+                           before)
+
+
+def shows_feed_version(per_page, after=None, before=None):
+    """Version of a shows_feed page, as listed by both the shows page and
+    the API."""
+    return _window_version(*SHOWS_FEED_VERSION, per_page, after, before)
+
+
+def venue_list_version(per_page, after=None, before=None):
+    return _window_version(*VENUE_LIST_VERSION, per_page, after, before)
+
+
+def artist_list_version(per_page, after=None, before=None):
+    return _window_version(*ARTIST_LIST_VERSION, per_page, after, before)
+
+
+def _detail_version_statement(model, foreign_key, other, other_key, id,
+                              now):
+    # Shows move from upcoming to past as time passes, before the counters
+    # roll forward, so the number already started is part of the version.
+    return select(
+        model.updated_at,
+        func.count(Show.id),
+        func.sum(case([(Show.start_time <= now, 1)], else_=0)),
+        func.max(Show.updated_at),
+        func.max(other.updated_at)
+    ).select_from(model).outerjoin(
+        Show, foreign_key == model.id
+    ).outerjoin(
+        other, other_key == other.id
+    ).where(
+        model.id == id
+    ).group_by(model.id, model.updated_at)
+
+
+def venue_version_statement(venue_id, now):
+    return _detail_version_statement(Venue, Show.venue_id, Artist,
+                                     Show.artist_id, venue_id, now)
+
+
+def artist_version_statement(artist_id, now):
+    return _detail_version_statement(Artist, Show.artist_id, Venue,
+                                     Show.venue_id, artist_id, now)
+
+
+def venue_page_version(venue_id, now):
+    """Version of show_venue's page and of the venue's API detail, or None
+    if the venue does not exist."""
+    return db.session.execute(venue_version_statement(venue_id, now)).first()
+
+
+def artist_page_version(artist_id, now):
+    """Version of show_artist's page and of the artist's API detail, or
+    None if the artist does not exist."""
+    return db.session.execute(
+        artist_version_statement(artist_id, now)).first()
+
+
+def _matches(model, key, other, other_key, flag, id):
+    return db.session.query(
+        other.id,
+        other.name,
+        other.image_link,
+        Match.score
+    ).join(
+        other, other_key == other.id
+    ).filter(
+        key == id, flag
+    ).order_by(Match.score.desc(), other.id).all()
+
+
+def venue_matches(venue_id):
+    """Suggested artists for show_venue, best first (see matching.py)."""
+    return _matches(Venue, Match.venue_id, Artist, Match.artist_id,
+                    Match.for_venue, venue_id)
+
+
+def artist_matches(artist_id):
+    """Suggested venues for show_artist, best first (see matching.py)."""
+    return _matches(Artist, Match.artist_id, Venue, Match.venue_id,
+                    Match.for_artist, artist_id)
+
+
+# API projections
+# ----------------------------------------------------------------------------
+#
+# Built as select() statements so the async repository (repository.py) runs
+# exactly the same SQL.
+
+VENUE_SUMMARY = (Venue.id, Venue.name, Venue.city, Venue.state,
+                 Venue.upcoming_shows_count, Venue.past_shows_count)
+VENUE_DETAIL = VENUE_SUMMARY + (
+    Venue.genres, Venue.address, Venue.phone, Venue.website_link,
+    Venue.facebook_link, Venue.seeking_talent, Venue.seeking_description,
+    Venue.image_link)
+ARTIST_SUMMARY = (Artist.id, Artist.name, Artist.city, Artist.state,
+                  Artist.upcoming_shows_count, Artist.past_shows_count)
+ARTIST_DETAIL = ARTIST_SUMMARY + (
+    Artist.genres, Artist.phone, Artist.website_link, Artist.facebook_link,
+    Artist.seeking_venue, Artist.seeking_description, Artist.image_link)
+
+# (statement, keyset columns) for each paginated listing.
+VENUE_LIST = (select(*VENUE_SUMMARY), [Venue.id])
+ARTIST_LIST = (select(*ARTIST_SUMMARY), [Artist.id])
+SHOWS_FEED = (
+    select(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ),
+    [Show.start_time, Show.id]
+)
+
+# The same windows narrowed to the columns their versions aggregate (see
+# "Page versions"); every projected column is covered by an updated_at.
+VENUE_LIST_VERSION = (select(Venue.id, Venue.updated_at), [Venue.id])
+ARTIST_LIST_VERSION = (select(Artist.id, Artist.updated_at), [Artist.id])
+SHOWS_FEED_VERSION = (
+    select(
+        Show.id,
+        Show.updated_at,
+        Venue.updated_at.label('venue_updated_at'),
+        Artist.updated_at.label('artist_updated_at')
+    ).join(
+        Venue, Show.venue_id == Venue.id
+    ).join(
+        Artist, Show.artist_id == Artist.id
+    ),
+    [Show.start_time, Show.id]
+)
+
+
+def _page(listing, per_page, after, before):
+    statement, columns = listing
+    rows = db.session.execute(keyset_window(
+        statement, columns, per_page, after=after, before=before)).all()
+    return keyset_result(rows, columns, per_page, after=after, before=before)
+
+
+def venue_list(per_page, after=None, before=None):
+    """Return a page of venue summaries in id order."""
+    return _page(VENUE_LIST, per_page, after, before)
+
+
+def artist_list(per_page, after=None, before=None):
+    """Return a page of artist summaries in id order."""
+    return _page(ARTIST_LIST, per_page, after, before)
+
+
+def _detail_show_statements(shows, now, past_limit):
+    # Split at ``now`` as the HTML pages do; the stored is_past flag lags
+    # until counters.roll_forward next runs.
+    return (shows.where(Show.start_time > now).order_by(*SHOWS_ORDER),
+            shows.where(Show.start_time <= now).order_by(
+                Show.start_time.desc(), Show.id.desc()).limit(past_limit))
+
+
+def venue_detail_statements(venue_id, now, past_limit):
+    """The venue's columns, its upcoming shows in start time order and its
+    latest ``past_limit`` past shows, newest first, each with the artist
+    name and image."""
+    return (select(*VENUE_DETAIL).where(Venue.id == venue_id),) + \
+        _detail_show_statements(select(
+            Show.id,
+            Show.start_time,
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        ).join(
+            Artist, Show.artist_id == Artist.id
+        ).where(Show.venue_id == venue_id), now, past_limit)
+
+
+def artist_detail_statements(artist_id, now, past_limit):
+    """The artist's columns, its upcoming shows in start time order and its
+    latest ``past_limit`` past shows, newest first, each with the venue
+    name and image."""
+    return (select(*ARTIST_DETAIL).where(Artist.id == artist_id),) + \
+        _detail_show_statements(select(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link')
+        ).join(
+            Venue, Show.venue_id == Venue.id
+        ).where(Show.artist_id == artist_id), now, past_limit)
+
+
+def _detail(statements):
+    entity_statement, upcoming_statement, past_statement = statements
+    entity = db.session.execute(entity_statement).first()
+    if entity is None:
+        return None, [], []
+    return (entity, db.session.execute(upcoming_statement).all(),
+            db.session.execute(past_statement).all())
+
+
+def venue_detail(venue_id, now, past_limit):
+    """Return the venue's columns (None if it does not exist), its
+    upcoming shows and its latest ``past_limit`` past shows."""
+    return _detail(venue_detail_statements(venue_id, now, past_limit))
+
+
+def artist_detail(artist_id, now, past_limit):
+    """Return the artist's columns (None if it does not exist), its
+    upcoming shows and its latest ``past_limit`` past shows."""
+    return _detail(artist_detail_statements(artist_id, now, past_limit))
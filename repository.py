@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import os
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from database import REPLICA, engine_options
+from pagination import keyset_result, keyset_window
+from queries import (
+    VENUE_LIST,
+    ARTIST_LIST,
+    SHOWS_FEED,
+    VENUE_LIST_VERSION,
+    ARTIST_LIST_VERSION,
+    SHOWS_FEED_VERSION,
+    venue_detail_statements,
+    artist_detail_statements,
+    venue_version_statement,
+    artist_version_statement,
+    window_version_statement,
+    search_rows_statement,
+    search_version_statement,
+    search_items
+)
+from search import InMemorySearch, PostgresSearch, document_statement
+
+# ----------------------------------------------------------------------------#
+# Async read repository.
+#
+# Runs the API's read statements (queries.py) on SQLAlchemy's asyncio
+# extension, with asyncpg for Postgres and aiosqlite for SQLite. Every
+# statement gets its own session, and so its own pooled connection, which
+# lets independent sub-queries of one response (an entity and its shows, a
+# search count and its page) run concurrently. Served by asgi.py.
+# ----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(uri, root_path):
+    """``uri`` with its async driver; relative SQLite paths resolve against
+    ``root_path`` as Flask-SQLAlchemy resolves them."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError('No async driver for %s' % backend)
+    if backend == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            raise ValueError('An in-memory SQLite database cannot be shared '
+                             'with the async engine')
+        url = url.set(database=os.path.join(root_path, url.database))
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+class AsyncRepository(object):
+    """Async counterparts of the read functions behind the JSON API.
+
+    Reads go to the replica bind when one is configured, unless the caller
+    passes ``pinned=True`` (the visitor wrote recently; see database.py).
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.engines = {}
+        self.sessions = {}
+        uris = {None: config['SQLALCHEMY_DATABASE_URI']}
+        binds = config['SQLALCHEMY_BINDS'] or {}
+        if REPLICA in binds:
+            uris[REPLICA] = binds[REPLICA]
+        for key, uri in uris.items():
+            url = async_url(uri, app.root_path)
+            options = engine_options(config, url.drivername)
+            if url.drivername == 'sqlite+aiosqlite':
+                # aiosqlite runs each connection on its own thread; the
+                # dialect's default NullPool would start one per statement.
+                options.update(poolclass=AsyncAdaptedQueuePool,
+                               pool_size=config['DB_POOL_SIZE'],
+                               max_overflow=config['DB_MAX_OVERFLOW'])
+            engine = create_async_engine(url, **options)
+            self.engines[key] = engine
+            self.sessions[key] = sessionmaker(engine, class_=AsyncSession)
+
+        if make_url(uris[None]).get_backend_name() == 'postgresql':
+            self.search_backend = PostgresSearch()
+        else:
+            # Shared with the Flask app, whose commit hooks keep it current.
+            self.search_backend = app.extensions.setdefault(
+                'search', InMemorySearch())
+
+    async def dispose(self):
+        for engine in self.engines.values():
+            await engine.dispose()
+
+    async def _all(self, statement, pinned):
+        key = REPLICA if REPLICA in self.sessions and not pinned else None
+        async with self.sessions[key]() as session:
+            result = await session.execute(statement)
+            return result.all()
+
+    async def _first(self, statement, pinned):
+        rows = await self._all(statement, pinned)
+        return rows[0] if rows else None
+
+    async def _page(self, listing, per_page, after, before, pinned):
+        statement, columns = listing
+        rows = await self._all(keyset_window(
+            statement, columns, per_page, after=after, before=before), pinned)
+        return keyset_result(rows, columns, per_page, after=after,
+                             before=before)
+
+    async def _window_version(self, listing, per_page, after, before,
+                              pinned):
+        return await self._first(window_version_statement(
+            *listing, per_page, after=after, before=before), pinned)
+
+    async def _detail(self, statements, pinned):
+        entity, upcoming, past = await asyncio.gather(
+            *[self._all(statement, pinned) for statement in statements])
+        if not entity:
+            return None, [], []
+        return entity[0], upcoming, past
+
+    async def venue_list(self, per_page, after=None, before=None,
+                         pinned=False):
+        return await self._page(VENUE_LIST, per_page, after, before, pinned)
+
+    async def artist_list(self, per_page, after=None, before=None,
+                          pinned=False):
+        return await self._page(ARTIST_LIST, per_page, after, before, pinned)
+
+    async def shows_feed(self, per_page, after=None, before=None,
+                         pinned=False):
+        return await self._page(SHOWS_FEED, per_page, after, before, pinned)
+
+    async def venue_detail(self, venue_id, now, past_limit, pinned=False):
+        return await self._detail(
+            venue_detail_statements(venue_id, now, past_limit), pinned)
+
+    async def artist_detail(self, artist_id, now, past_limit, pinned=False):
+        return await self._detail(
+            artist_detail_statements(artist_id, now, past_limit), pinned)
+
+    async def venue_list_version(self, per_page, after=None, before=None,
+                                 pinned=False):
+        return await self._window_version(VENUE_LIST_VERSION, per_page,
+                                          after, before, pinned)
+
+    async def artist_list_version(self, per_page, after=None, before=None,
+                                  pinned=False):
+        return await self._window_version(ARTIST_LIST_VERSION, per_page,
+                                          after, before, pinned)
+
+    async def shows_feed_version(self, per_page, after=None, before=None,
+                                 pinned=False):
+        return await self._window_version(SHOWS_FEED_VERSION, per_page,
+                                          after, before, pinned)
+
+    async def venue_page_version(self, venue_id, now, pinned=False):
+        return await self._first(venue_version_statement(venue_id, now),
+                                 pinned)
+
+    async def artist_page_version(self, artist_id, now, pinned=False):
+        return await self._first(artist_version_statement(artist_id, now),
+                                 pinned)
+
+    async def search_hits(self, model, search_term, per_page, after=None,
+                          before=None, pinned=False):
+        backend = self.search_backend
+        if isinstance(backend, PostgresSearch):
+            count, (listing, columns) = backend.statements(model,
+                                                           search_term)
+            count, rows = await asyncio.gather(
+                self._all(count, pinned),
+                self._all(keyset_window(listing, columns, per_page,
+                                        after=after, before=before), pinned))
+            return count[0][0], keyset_result(rows, columns, per_page,
+                                              after=after, before=before)
+        # Building and matching are CPU work on a shared index; keep them
+        # off the event loop.
+        loop = asyncio.get_running_loop()
+        if model not in backend.indexes:
+            rows = await self._all(document_statement(model), pinned)
+            await loop.run_in_executor(None, backend.index_for, model, rows)
+        return await loop.run_in_executor(
+            None, functools.partial(backend.search, model, search_term,
+                                    per_page, after=after, before=before))
+
+    async def search_version(self, model, ids, pinned=False):
+        return await self._first(search_version_statement(model, ids),
+                                 pinned)
+
+    async def search_page(self, model, page, pinned=False):
+        ids = [hit.id for hit in page.items]
+        rows = []
+        if ids:
+            rows = await self._all(search_rows_statement(model, ids), pinned)
+        page.items = search_items(ids, rows)
+        return page
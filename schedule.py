@@ -0,0 +1,401 @@
+import random
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import DateTime, Integer, column, event, func, select, values
+from sqlalchemy.orm import Session
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Booking conflicts.
+#
+# A show holds its venue and its artist for [start_time, start_time +
+# duration_minutes). No two shows may overlap on the same venue or the same
+# artist. On Postgres two exclusion constraints on tsrange enforce this (see
+# migrations) and checks are range queries on their GiST indexes. Other
+# backends keep an interval tree per venue and per artist, built lazily from
+# the database and kept current by session commit hooks. Either way a check
+# costs O(log n) in the number of shows already booked.
+# ----------------------------------------------------------------------------#
+
+# (resource, booking key) pairs a show occupies.
+RESOURCES = (('venue', 'venue_id'), ('artist', 'artist_id'))
+
+# Treap priorities; only the tree shapes depend on them.
+_priorities = random.Random(0)
+
+
+def end_time(booking):
+    return booking['start_time'] + \
+        timedelta(minutes=booking['duration_minutes'])
+
+
+class _Node(object):
+    __slots__ = ('key', 'start', 'end', 'value', 'priority', 'max_end',
+                 'left', 'right')
+
+    def __init__(self, key, start, end, value, priority):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.value = value
+        self.priority = priority
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _split(node, key):
+    """Split into the nodes with keys below ``key`` and the rest."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    """Join two treaps where every key in ``left`` is below ``right``."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class IntervalTree(object):
+    """Half-open ``[start, end)`` intervals, each carrying a value.
+
+    A treap ordered by start, where every node also records the latest end
+    in its subtree, so a query skips each subtree that ends before the
+    query starts. Adding, removing and finding an overlap take O(log n)
+    expected time.
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted(intervals, key=lambda item: item[0])
+        self.serial = len(items)
+        self.size = len(items)
+        self.root = self._build(items, 0, len(items))[0]
+
+    def _build(self, items, low, high):
+        # Balanced from sorted input. Priorities grow with height and stay
+        # at or above 1, above the random priorities of later inserts.
+        if low >= high:
+            return None, 0
+        middle = (low + high) // 2
+        start, end, value = items[middle]
+        left, left_height = self._build(items, low, middle)
+        right, right_height = self._build(items, middle + 1, high)
+        height = max(left_height, right_height) + 1
+        node = _Node((start, middle + 1), start, end, value, float(height))
+        node.left, node.right = left, right
+        _update(node)
+        return node, height
+
+    def __len__(self):
+        return self.size
+
+    def add(self, start, end, value):
+        self.serial += 1
+        node = _Node((start, self.serial), start, end, value,
+                     _priorities.random())
+        left, right = _split(self.root, node.key)
+        self.root = _merge(_merge(left, node), right)
+        self.size += 1
+
+    def remove(self, start, value):
+        """Remove one interval starting at ``start`` with ``value``."""
+        key = self._find(start, value)
+        if key is None:
+            return
+        left, rest = _split(self.root, key)
+        found, right = _split(rest, (key[0], key[1] + 1))
+        self.root = _merge(left, right)
+        self.size -= 1
+
+    def _find(self, start, value):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if node.start < start:
+                stack.append(node.right)
+            elif node.start > start:
+                stack.append(node.left)
+            elif node.value == value:
+                return node.key
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+        return None
+
+    def overlapping(self, start, end):
+        """Return ``(start, end, value)`` for every interval overlapping
+        ``[start, end)``, earliest first."""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            if node.start < end:
+                if node.end > start:
+                    found.append((node.start, node.end, node.value))
+                stack.append(node.right)
+            stack.append(node.left)
+        return sorted(found, key=lambda item: item[0])
+
+
+def booking_statement():
+    """The columns the in-memory schedule is built from."""
+    return select(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                  Show.duration_minutes)
+
+
+class InMemorySchedule(object):
+    """Fallback backend for SQLite and tests: one IntervalTree per venue
+    and per artist, holding show ids."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.trees = None
+        self.shows = {}
+
+    def _trees(self):
+        with self.lock:
+            if self.trees is None:
+                intervals = defaultdict(list)
+                for id, venue_id, artist_id, start_time, duration in \
+                        db.session.execute(booking_statement()):
+                    end = start_time + timedelta(minutes=duration)
+                    self.shows[id] = (venue_id, artist_id, start_time, end)
+                    intervals['venue', venue_id].append(
+                        (start_time, end, id))
+                    intervals['artist', artist_id].append(
+                        (start_time, end, id))
+                self.trees = defaultdict(IntervalTree)
+                for resource, items in intervals.items():
+                    self.trees[resource] = IntervalTree(items)
+            return self.trees
+
+    def conflicts(self, bookings):
+        """For each booking, ``{key: [(show id, start, end), ...]}`` of the
+        booked shows it overlaps."""
+        found = []
+        with self.lock:
+            trees = self._trees()
+            for booking in bookings:
+                start, end = booking['start_time'], end_time(booking)
+                overlaps = {}
+                for resource, key in RESOURCES:
+                    tree = trees.get((resource, booking[key]))
+                    hits = tree.overlapping(start, end) if tree else []
+                    if hits:
+                        overlaps[key] = [(id, booked_start, booked_end)
+                                         for booked_start, booked_end, id
+                                         in hits]
+                found.append(overlaps)
+        return found
+
+    def add(self, id, venue_id, artist_id, start_time, end):
+        with self.lock:
+            if self.trees is None:
+                return
+            self.remove(id)
+            self.shows[id] = (venue_id, artist_id, start_time, end)
+            self.trees['venue', venue_id].add(start_time, end, id)
+            self.trees['artist', artist_id].add(start_time, end, id)
+
+    def remove(self, id):
+        with self.lock:
+            if self.trees is None or id not in self.shows:
+                return
+            venue_id, artist_id, start_time, end = self.shows.pop(id)
+            self.trees['venue', venue_id].remove(start_time, id)
+            self.trees['artist', artist_id].remove(start_time, id)
+
+    def record(self, bookings):
+        """Add bookings written without the session (bulk imports). They
+        have no show id, so ``reset`` once the writes are done."""
+        with self.lock:
+            if self.trees is None:
+                return
+            for booking in bookings:
+                start, end = booking['start_time'], end_time(booking)
+                for resource, key in RESOURCES:
+                    self.trees[resource, booking[key]].add(start, end, None)
+
+    def reset(self):
+        """Forget the schedule; it is rebuilt on next use."""
+        with self.lock:
+            self.trees = None
+            self.shows = {}
+
+
+class PostgresSchedule(object):
+    """Checks against the GiST indexes behind the exclusion constraints:
+    one query per resource for a whole batch."""
+
+    def conflicts(self, bookings):
+        found = [{} for booking in bookings]
+        if not bookings:
+            return found
+        for resource, key in RESOURCES:
+            proposed = values(
+                column('batch_index', Integer),
+                column('resource_id', Integer),
+                column('start_time', DateTime),
+                column('end_time', DateTime),
+                name='proposed'
+            ).data([(position, booking[key], booking['start_time'],
+                     end_time(booking))
+                    for position, booking in enumerate(bookings)])
+            # The same expression as the constraint, so its index applies.
+            booked = func.tsrange(Show.start_time, Show.end_time)
+            rows = db.session.execute(select(
+                proposed.c.batch_index, Show.id, Show.start_time,
+                Show.end_time
+            ).join_from(
+                proposed, Show, getattr(Show, key) == proposed.c.resource_id
+            ).where(
+                booked.op('&&')(func.tsrange(proposed.c.start_time,
+                                             proposed.c.end_time))
+            ).order_by(proposed.c.batch_index, Show.start_time))
+            for position, id, start, end in rows:
+                found[position].setdefault(key, []).append((id, start, end))
+        return found
+
+
+def get_schedule():
+    schedule = current_app.extensions.get('schedule')
+    if schedule is None:
+        if db.engine.dialect.name == 'postgresql':
+            schedule = PostgresSchedule()
+        else:
+            schedule = InMemorySchedule()
+        current_app.extensions['schedule'] = schedule
+    return schedule
+
+
+def _describe(resource, id, start, end, show_id=None):
+    taken = '%s %s is booked from %s to %s' % (
+        resource.capitalize(), id, start.strftime('%Y-%m-%d %H:%M'),
+        end.strftime('%Y-%m-%d %H:%M'))
+    if show_id is None:
+        return taken + ' by an earlier row.'
+    return taken + ' (show %d).' % show_id
+
+
+def find_conflicts(bookings):
+    """Validate a proposed schedule in one pass.
+
+    ``bookings`` are dicts with venue_id, artist_id, start_time and
+    duration_minutes. Returns a list with, for each booking, None if it can
+    be booked or a form-style ``{field: [messages]}`` dict naming what it
+    overlaps: a show already booked, or an earlier booking in the batch
+    (earlier rows win).
+    """
+    booked = get_schedule().conflicts(bookings)
+    accepted = defaultdict(IntervalTree)
+    results = []
+    for position, (booking, overlaps) in enumerate(zip(bookings, booked)):
+        start, end = booking['start_time'], end_time(booking)
+        errors = {}
+        for resource, key in RESOURCES:
+            messages = [_describe(resource, booking[key], *overlap[1:],
+                                  show_id=overlap[0])
+                        for overlap in overlaps.get(key, [])]
+            messages.extend(
+                _describe(resource, booking[key], other_start, other_end)
+                for other_start, other_end, other in
+                accepted[resource, booking[key]].overlapping(start, end))
+            if messages:
+                errors[key] = messages
+        if errors:
+            results.append(errors)
+            continue
+        for resource, key in RESOURCES:
+            accepted[resource, booking[key]].add(start, end, position)
+        results.append(None)
+    return results
+
+
+def check_bookings(bookings):
+    """Like ``find_conflicts``, but first reject bookings whose venue or
+    artist does not exist (one query per table)."""
+    errors = [{} for booking in bookings]
+    for model, (resource, key) in zip((Venue, Artist), RESOURCES):
+        ids = {booking[key] for booking in bookings}
+        known = {id for id, in db.session.query(model.id).filter(
+            model.id.in_(ids))} if ids else set()
+        for booking, error in zip(bookings, errors):
+            if booking[key] not in known:
+                error[key] = ['Unknown %s id.' % resource]
+
+    referenced = [position for position, error in enumerate(errors)
+                  if not error]
+    conflicts = find_conflicts([bookings[position]
+                                for position in referenced])
+    for position, conflict in zip(referenced, conflicts):
+        if conflict:
+            errors[position] = conflict
+    return [error or None for error in errors]
+
+
+# ----------------------------------------------------------------------------#
+# Schedule maintenance for the in-memory backend.
+# ----------------------------------------------------------------------------#
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_bookings(session, flush_context):
+    pending = session.info.setdefault('schedule_changes', {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Show):
+            pending[obj.id] = (obj.venue_id, obj.artist_id, obj.start_time,
+                               obj.end_time)
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_bookings(session):
+    pending = session.info.pop('schedule_changes', None)
+    if not pending or not has_app_context():
+        return
+    schedule = current_app.extensions.get('schedule')
+    if isinstance(schedule, InMemorySchedule):
+        for id, booking in pending.items():
+            if booking is None:
+                schedule.remove(id)
+            else:
+                schedule.add(id, *booking)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_bookings(session):
+    session.info.pop('schedule_changes', None)
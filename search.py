@@ -0,0 +1,310 @@
+import re
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict, namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import (
+    Integer, cast, event, func, literal, or_, select, true
+)
+from sqlalchemy.orm import Session
+from models import db, Venue, Artist
+from pagination import (
+    InvalidCursor, Page, encode_cursor, decode_cursor, keyset_result,
+    keyset_window
+)
+
+# ----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# Postgres matches against the ``search_vector`` tsvector column (name,
+# city, state and genres) and the pg_trgm index on ``name``. Other backends
+# use an in-process inverted index that mirrors the same matching and
+# ranking rules. Both return ``(count, Page)`` where the page holds
+# ``(relevance, id)`` rows, best match first.
+# ----------------------------------------------------------------------------#
+
+# ts_rank weights for the A/B/C labels set by the search_vector trigger.
+NAME_WEIGHT = 1.0
+PLACE_WEIGHT = 0.4
+GENRE_WEIGHT = 0.2
+
+# Same default as pg_trgm.similarity_threshold.
+SIMILARITY_THRESHOLD = 0.3
+
+# Relevance is stored as a negated, scaled integer so it sorts ascending
+# and survives a round trip through a pagination cursor exactly.
+SCORE_SCALE = 1000000
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+Hit = namedtuple('Hit', ['relevance', 'id'])
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(text):
+    """Trigrams of ``text`` padded per word the way pg_trgm does."""
+    grams = set()
+    for word in tokenize(text):
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _relevance(score):
+    return -int(score * SCORE_SCALE + 0.5)
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearch(object):
+    """Full-text plus trigram search backed by the GIN indexes."""
+
+    def statements(self, model, term):
+        """The count statement, and the (statement, keyset columns) listing
+        to page through, for ``term``."""
+        term = term.strip()
+        if term:
+            tsquery = func.plainto_tsquery('simple', term)
+            match = or_(
+                model.search_vector.op('@@')(tsquery),
+                model.name.ilike('%' + _escape_like(term) + '%',
+                                 escape='\\'),
+                model.name.op('%')(term)
+            )
+            score = func.ts_rank(model.search_vector, tsquery) + \
+                func.similarity(model.name, term)
+            relevance = cast(score * -SCORE_SCALE, Integer)
+        else:
+            match = true()
+            relevance = literal(0, Integer)
+        relevance = relevance.label('relevance')
+
+        count = select(func.count(model.id)).where(match)
+        listing = select(model.id, relevance).where(match)
+        return count, (listing, [relevance, model.id])
+
+    def search(self, model, term, per_page, after=None, before=None):
+        count, (listing, columns) = self.statements(model, term)
+        count = db.session.execute(count).scalar()
+        rows = db.session.execute(keyset_window(
+            listing, columns, per_page, after=after, before=before)).all()
+        return count, keyset_result(rows, columns, per_page, after=after,
+                                    before=before)
+
+
+class InvertedIndex(object):
+    """Token and trigram postings for one model, kept in memory."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.names = {}
+        self.name_trigrams = {}
+        self.document_tokens = {}
+        self.tokens = defaultdict(dict)
+        self.trigrams = defaultdict(set)
+
+    def add(self, id, name, city, state, genres):
+        with self.lock:
+            self.remove(id)
+            weights = {}
+            for token in tokenize(' '.join(genres or [])):
+                weights[token] = GENRE_WEIGHT
+            for token in tokenize('%s %s' % (city or '', state or '')):
+                weights[token] = PLACE_WEIGHT
+            for token in tokenize(name):
+                weights[token] = NAME_WEIGHT
+            # Per-document entries are tuples of interned strings, which
+            # the cyclic collector stops tracking, so a large index does
+            # not make every collection slower.
+            tokens = tuple(sys.intern(token) for token in weights)
+            for token in tokens:
+                self.tokens[token][id] = weights[token]
+            self.document_tokens[id] = tokens
+
+            grams = tuple(sys.intern(gram) for gram in trigrams(name))
+            for gram in grams:
+                self.trigrams[gram].add(id)
+            self.names[id] = (name or '').lower()
+            self.name_trigrams[id] = grams
+
+    def remove(self, id):
+        with self.lock:
+            if id not in self.names:
+                return
+            for gram in self.name_trigrams.pop(id):
+                self.trigrams[gram].discard(id)
+            del self.names[id]
+            for token in self.document_tokens.pop(id):
+                del self.tokens[token][id]
+
+    def search(self, term):
+        """Return every matching ``Hit`` ordered by relevance, then id."""
+        term = term.strip().lower()
+        with self.lock:
+            if not term:
+                return [Hit(0, id) for id in sorted(self.names)]
+
+            # Full-text: every query token must appear in some field.
+            text_scores = {}
+            tokens = tokenize(term)
+            postings = sorted((self.tokens.get(token, {}) for token in tokens),
+                              key=len)
+            if postings and postings[0]:
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    candidates.intersection_update(posting)
+                for id in candidates:
+                    text_scores[id] = sum(posting[id]
+                                          for posting in postings) / \
+                        len(postings)
+            matched = set(text_scores)
+
+            # Trigram similarity on the name, as pg_trgm's % operator.
+            term_grams = trigrams(term)
+            shared = Counter()
+            for gram in term_grams:
+                shared.update(self.trigrams.get(gram, ()))
+            similarity = {}
+            for id, common in shared.items():
+                total = len(self.name_trigrams[id]) + len(term_grams) - common
+                similarity[id] = float(common) / total
+                if similarity[id] >= SIMILARITY_THRESHOLD:
+                    matched.add(id)
+
+            # Substring match on the name, as ILIKE '%term%'. Names must
+            # hold every interior trigram of the term before they are
+            # compared; terms too short to have one scan all names.
+            interior = set()
+            for token in tokens:
+                interior.update(token[i:i + 3]
+                                for i in range(len(token) - 2))
+            if interior:
+                candidates = set.intersection(
+                    *[self.trigrams.get(gram, set()) for gram in interior])
+            else:
+                candidates = self.names
+            matched.update(id for id in candidates if term in self.names[id])
+
+            return sorted(Hit(_relevance(text_scores.get(id, 0.0) +
+                                         similarity.get(id, 0.0)), id)
+                          for id in matched)
+
+
+class InMemorySearch(object):
+    """Fallback backend for SQLite and tests, one index per model, built
+    lazily from the database and kept current by session commit hooks.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = {}
+
+    def index_for(self, model, rows=None):
+        """Return the index for ``model``, building it on first use from
+        ``rows`` of ``document_statement(model)``, or from db.session when
+        no rows are given."""
+        with self.lock:
+            index = self.indexes.get(model)
+            if index is None:
+                index = InvertedIndex()
+                if rows is None:
+                    rows = db.session.execute(document_statement(model))
+                for row in rows:
+                    index.add(*row)
+                self.indexes[model] = index
+        return index
+
+    def apply(self, model, changes):
+        index = self.indexes.get(model)
+        if index is None:
+            return
+        for id, document in changes.items():
+            if document is None:
+                index.remove(id)
+            else:
+                index.add(id, *document)
+
+    def search(self, model, term, per_page, after=None, before=None):
+        hits = self.index_for(model).search(term)
+
+        if before is not None:
+            key = _hit_key(before)
+            end = bisect_left(hits, key)
+            start = max(0, end - per_page)
+            items = hits[start:end]
+            has_prev, has_next = start > 0, True
+        else:
+            start = bisect_right(hits, _hit_key(after)) if after else 0
+            items = hits[start:start + per_page]
+            has_prev, has_next = after is not None, \
+                start + per_page < len(hits)
+
+        if not items:
+            return len(hits), Page(items)
+        return len(hits), Page(
+            items,
+            next_cursor=encode_cursor(items[-1]) if has_next else None,
+            prev_cursor=encode_cursor(items[0]) if has_prev else None)
+
+
+def document_statement(model):
+    """The columns the in-memory index is built from."""
+    return select(model.id, model.name, model.city, model.state,
+                  model.genres)
+
+
+def _hit_key(cursor):
+    values = decode_cursor(cursor)
+    if len(values) != 2 or not all(isinstance(v, int) for v in values):
+        raise InvalidCursor('Invalid cursor')
+    return Hit(*values)
+
+
+def get_backend():
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        if db.engine.dialect.name == 'postgresql':
+            backend = PostgresSearch()
+        else:
+            backend = InMemorySearch()
+        current_app.extensions['search'] = backend
+    return backend
+
+
+# ----------------------------------------------------------------------------#
+# Index maintenance for the in-memory backend.
+# ----------------------------------------------------------------------------#
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('search_changes', defaultdict(dict))
+    for obj in session.new | session.dirty:
+        if isinstance(obj, (Venue, Artist)):
+            pending[type(obj)][obj.id] = (obj.name, obj.city, obj.state,
+                                          obj.genres)
+    for obj in session.deleted:
+        if isinstance(obj, (Venue, Artist)):
+            pending[type(obj)][obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    pending = session.info.pop('search_changes', None)
+    if not pending or not has_app_context():
+        return
+    backend = current_app.extensions.get('search')
+    if isinstance(backend, InMemorySearch):
+        for model, changes in pending.items():
+            backend.apply(model, changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('search_changes', None)
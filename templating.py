@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+from jinja2 import FileSystemBytecodeCache
+
+# ----------------------------------------------------------------------------#
+# Template compilation.
+#
+# Jinja compiles a template to Python the first time it is loaded, which
+# each new worker pays on the first request to every page. Both steps are
+# opt-in, so by default the app writes nothing and reads no template at
+# startup. With JINJA_BYTECODE_CACHE_DIR set, compiled bytecode is kept on
+# disk there, shared by every worker on the host. Entries are keyed by
+# template name and checked against a hash of the source, so an edited
+# template simply recompiles. With TEMPLATE_WARMUP every template is loaded
+# when the app starts, before it takes requests.
+# ----------------------------------------------------------------------------#
+
+
+class SharedBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache whose writes are atomic, so a worker never
+    reads a file another worker is still writing."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        super(SharedBytecodeCache, self).__init__(directory)
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                bucket.write_bytecode(stream)
+            os.replace(path, filename)
+        except BaseException:
+            os.unlink(path)
+            raise
+
+
+def warm_up(app):
+    """Load every template so it is compiled (or read from the bytecode
+    cache) now. Returns ``(templates, seconds)``."""
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names), time.perf_counter() - started
+
+
+class TemplateCache(object):
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', None)
+        app.config.setdefault('TEMPLATE_WARMUP', False)
+        directory = app.config['JINJA_BYTECODE_CACHE_DIR']
+        if directory:
+            app.jinja_env.bytecode_cache = SharedBytecodeCache(directory)
+        if app.config['TEMPLATE_WARMUP']:
+            warm_up(app)